@@ -0,0 +1,540 @@
+"""Benchmark the scrapers offline and check the in-memory pipeline executor"""
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import re
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable
+
+from pymongo import MongoClient
+from pymongo.collection import Collection
+
+from database.contexts.columnar import Snapshot, Unsupported
+from database.contexts.database import COLLECTIONS, DB
+from scraper.base import BaseScraper, ParserBackend
+from scraper.cache import MemoryCache
+from scraper.metrics import Metrics
+from scraper.recording import ReplayTransport
+from scraper.scheduler import CrawlScheduler
+from scraper.scrapers.buildings import BuildingsScraper
+from scraper.scrapers.colleges import CollegesScraper
+from scraper.scrapers.courses import CoursesScraper
+from scraper.scrapers.instructors import InstructorsScraper
+from scraper.scrapers.rooms import RoomsScraper
+from scraper.scrapers.sections import SectionsScraper
+from scraper.scrapers.subjects import SubjectsScraper
+from scraper.scrapers.terms import TermsScraper
+
+# Placeholder ids passed to the scrapers' `fetch` when they parse pages alone
+BENCH_TERM = "0000"
+BENCH_COLLEGE = f"{BENCH_TERM}-00-BENCH"
+BENCH_SUBJECT = f"{BENCH_TERM}-BENCH"
+BENCH_COURSE = f"{BENCH_SUBJECT}-000"
+
+# Which scrapers parse which pages (by page name prefix), and how to call them
+PAGE_SCRAPERS: list[tuple[str, type[BaseScraper], Callable[[Any, str], Any]]] = [
+    (r"/index_", TermsScraper, lambda s, path: s.fetch_term(path)),
+    (r"/index_", CollegesScraper, lambda s, path: s.fetch(BENCH_TERM, path)),
+    (r"/all_location_", BuildingsScraper, lambda s, path: s.fetch(BENCH_TERM, path)),
+    (r"/all_location_", RoomsScraper, lambda s, path: s.fetch(BENCH_TERM, path)),
+    (
+        r"/all_subject_",
+        SubjectsScraper,
+        lambda s, path: s.fetch(BENCH_TERM, BENCH_COLLEGE, path),
+    ),
+    (
+        r"/all_person_",
+        InstructorsScraper,
+        lambda s, path: s.fetch(BENCH_TERM, BENCH_COLLEGE, path),
+    ),
+    (
+        r"/courses_",
+        CoursesScraper,
+        lambda s, path: s.fetch(BENCH_TERM, BENCH_COLLEGE, BENCH_SUBJECT, path),
+    ),
+    (
+        r"/classes_",
+        SectionsScraper,
+        lambda s, path: s.fetch(
+            BENCH_TERM, BENCH_COLLEGE, BENCH_SUBJECT, BENCH_COURSE, path
+        ),
+    ),
+]
+
+BENCH_DBNAME = "cpsync_bench"
+
+# Pipelines run both in memory and by MongoDB, as (collection, pipeline) with
+# TERM standing for the latest term of the served data
+PIPELINES: list[tuple[str, list[dict]]] = [
+    ("courses", [{"$match": {"term_id": "TERM"}}, {"$project": {"_id": 0}}]),
+    ("courses", [{"$match": {"term_id": "TERM"}}, {"$project": {"_id": 1}}]),
+    ("courses", [{"$match": {"term_id": "TERM"}}, {"$project": {"_id": "$code"}}]),
+    (
+        "courses",
+        [{"$match": {"term_id": "TERM"}}, {"$project": {"code": 1, "name": 1}}],
+    ),
+    (
+        "courses",
+        [{"$match": {"term_id": "TERM"}}, {"$project": {"_id": 0, "url": 0}}],
+    ),
+    (
+        "courses",
+        [
+            {"$match": {"term_id": "TERM"}},
+            {"$project": {"_id": 0, "label": "$name", "term": {"$literal": "TERM"}}},
+        ],
+    ),
+    (
+        "sections",
+        [
+            {"$match": {"term_id": "TERM", "enrolled": {"$gte": 20}}},
+            {"$count": "sections"},
+        ],
+    ),
+    (
+        "sections",
+        [
+            {"$match": {"term_id": "TERM"}},
+            {
+                "$group": {
+                    "_id": "$course_id",
+                    "sections": {"$sum": 1},
+                    "enrolled": {"$sum": "$enrolled"},
+                    "largest": {"$max": "$enrolled"},
+                }
+            },
+            {"$sort": {"sections": -1, "_id": 1}},
+            {"$limit": 20},
+        ],
+    ),
+    (
+        "sections",
+        [
+            {"$match": {"term_id": "TERM", "days": {"$regex": "^M"}}},
+            {"$sort": {"start": 1, "_id": 1}},
+            {"$skip": 5},
+            {"$limit": 10},
+            {"$project": {"code": 1, "days": 1, "start": 1, "room_id": 1}},
+        ],
+    ),
+    (
+        "sections",
+        [
+            {"$match": {"term_id": "TERM"}},
+            {"$limit": 50},
+            {
+                "$lookup": {
+                    "from": "courses",
+                    "localField": "course_id",
+                    "foreignField": "_id",
+                    "as": "course",
+                }
+            },
+            {"$unwind": "$course"},
+            {"$project": {"_id": 1, "name": "$course.name"}},
+        ],
+    ),
+    (
+        "sections",
+        [
+            {"$match": {"term_id": "TERM"}},
+            {"$limit": 50},
+            {
+                "$lookup": {
+                    "from": "courses",
+                    "localField": "course_id",
+                    "foreignField": "_id",
+                    "as": "course",
+                }
+            },
+            {"$project": {"course": {"name": 1}}},
+        ],
+    ),
+]
+
+# Collection methods that write to the database
+WRITE_METHODS = ("insert_one", "insert_many", "bulk_write", "replace_one", "update_one")
+
+
+class NullDB:
+    """Stands in for `DB` so that scrapers only parse (every call is dropped)"""
+
+    def __getattr__(self, name: str) -> Callable[..., None]:
+        return lambda *args, **kwargs: None
+
+
+class NullScheduler(CrawlScheduler):
+    """Drops the dependent work scrapers enqueue, so each page is parsed alone"""
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> None:
+        pass
+
+
+def group_paths(urls: list[str]) -> dict[type[BaseScraper], list[str]]:
+    """Group the paths of recorded pages by the scrapers that parse them"""
+    grouped: dict[type[BaseScraper], list[str]] = {}
+    for url in urls:
+        for pattern, scraper, _ in PAGE_SCRAPERS:
+            if re.search(pattern, url):
+                path = url.removeprefix(scraper.base_url.value)
+                grouped.setdefault(scraper, []).append(path)
+    return grouped
+
+
+def bench_parsers(args: argparse.Namespace) -> None:
+    """Compare parser backends by running each scraper's `fetch` on recorded pages"""
+    transport = ReplayTransport(args.archive)
+    grouped = group_paths(transport.urls())
+    if not grouped:
+        print(f"No scraped pages found in {args.archive}", file=sys.stderr)
+        sys.exit(1)
+    fetches = {scraper: fetch for _, scraper, fetch in PAGE_SCRAPERS}
+    scheduler = NullScheduler(rate=0)
+    backends = [ParserBackend(b) for b in args.backends]
+    print(
+        f"{'scraper':<20}{'backend':<13}{'pages':>7}{'pages/s':>11}"
+        f"{'rows/s':>12}{'speedup':>9}"
+    )
+    for scraper, paths in grouped.items():
+        # Replay every page once into memory, so the timed passes only parse
+        cache = MemoryCache(sys.maxsize)
+        warmup = scraper(NullDB(), cache, scheduler, None, transport)  # type: ignore[arg-type]
+        parsed = []
+        for path in paths:
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    fetches[scraper](warmup, path)
+                parsed.append(path)
+            except Exception as e:  # pylint: disable=broad-except
+                print(f"Skipping {path} ({scraper.name}): {e!r}", file=sys.stderr)
+        if not parsed:
+            continue
+        baseline = None
+        for backend in backends:
+            metrics = Metrics()
+            instance = scraper(NullDB(), cache, scheduler, None, transport, metrics)  # type: ignore[arg-type]
+            instance.parser = backend
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for path in parsed:
+                    fetches[scraper](instance, path)
+            elapsed = time.perf_counter() - start
+            rows = sum(
+                value
+                for (name, _), value in metrics.counters.items()
+                if name == "rows_total"
+            )
+            count = len(parsed) * args.repeat
+            baseline = baseline or elapsed
+            print(
+                f"{scraper.name:<20}{backend.value:<13}{len(parsed):>7}"
+                f"{count / elapsed:>11.1f}{rows / elapsed:>12.0f}"
+                f"{baseline / elapsed:>8.2f}x"
+            )
+    transport.close()
+
+
+class Timings:
+    """Thread-safe accumulator of elapsed times and counts by key"""
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def add(self, key: str, seconds: float) -> None:
+        """Record one timed call"""
+        with self.lock:
+            self.seconds[key] = self.seconds.get(key, 0.0) + seconds
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def wrap(self, owner: type, method: str, key: Callable[..., str]) -> None:
+        """
+        Time every call of a method
+
+        Args:
+            - owner (type): The class defining the method
+            - method (str): The name of the method
+            - key (Callable[..., str]): Maps the call's `self` to the key to record under
+        """
+        original = getattr(owner, method)
+
+        @functools.wraps(original)
+        def timed(this, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(this, *args, **kwargs)
+            finally:
+                self.add(key(this), time.perf_counter() - start)
+
+        setattr(owner, method, timed)
+
+
+def start_mongod(binary: str) -> tuple[subprocess.Popen, int, str]:
+    """
+    Start a throwaway mongod on a free port and a temporary data directory
+
+    Returns:
+        - tuple[subprocess.Popen, int, str]: The process, its port and its data directory
+    """
+    if shutil.which(binary) is None:
+        print(
+            f"{binary} not found, pass --port to use a running mongod", file=sys.stderr
+        )
+        sys.exit(1)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    dbpath = tempfile.mkdtemp(prefix="cpsync-bench-")
+    process = subprocess.Popen(
+        [binary, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    client = MongoClient("127.0.0.1", port, serverSelectionTimeoutMS=30000)
+    try:
+        client.admin.command("ping")
+    except Exception:
+        process.terminate()
+        shutil.rmtree(dbpath, ignore_errors=True)
+        raise
+    finally:
+        client.close()
+    return process, port, dbpath
+
+
+def bench_crawl(args: argparse.Namespace) -> None:
+    """Replay a recorded crawl through the scrapers into a throwaway database"""
+    BaseScraper.parser = ParserBackend(args.parser)
+    mongod = None
+    host, port = "127.0.0.1", args.port
+    if port is None:
+        mongod, port, dbpath = start_mongod(args.mongod)
+
+    # Page time is the whole `soup` call; parse time is what remains once
+    # the (replayed) download is subtracted
+    pages, downloads, writes = Timings(), Timings(), Timings()
+    pages.wrap(BaseScraper, "soup", lambda this: this.name)
+    downloads.wrap(BaseScraper, "download", lambda this: this.name)
+    for method in WRITE_METHODS:
+        writes.wrap(Collection, method, lambda this: this.name)
+
+    db = DB(BENCH_DBNAME, host, port)
+    try:
+        db.reset()
+        if args.batch_size > 0:
+            db.buffered(batch_size=args.batch_size)
+        transport = ReplayTransport(args.archive)
+        scheduler = CrawlScheduler(workers=args.workers, rate=0)
+        scraper = TermsScraper(db, scheduler=scheduler, transport=transport)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            scheduler.submit(scraper.fetch, "index_curr.htm", args.term_history)
+            failures = scheduler.join()
+            db.flush()
+        elapsed = time.perf_counter() - start
+        scheduler.close()
+        transport.close()
+        counts = {name: db.db[name].count_documents({}) for name in COLLECTIONS}
+    finally:
+        db.client.drop_database(BENCH_DBNAME)
+        db.close()
+        if mongod is not None:
+            mongod.terminate()
+            mongod.wait()
+            shutil.rmtree(dbpath, ignore_errors=True)
+
+    fetched = sum(downloads.counts.values())
+    write_time = sum(writes.seconds.values())
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"archive      {args.archive} ({len(transport.index)} pages)")
+    print(
+        f"settings     {args.parser}, {args.workers} workers, batch {args.batch_size}"
+    )
+    print(f"wall time    {elapsed:.2f}s")
+    print(f"pages        {fetched} ({fetched / elapsed:.1f} pages/s)")
+    print(f"db writes    {write_time:.2f}s in {sum(writes.counts.values())} calls")
+    print(f"peak memory  {peak:.0f} MiB (max RSS)")
+    print(f"failures     {len(failures)}")
+    print(f"documents    {', '.join(f'{k} {v}' for k, v in counts.items())}")
+    print()
+    print(f"{'scraper':<20}{'pages':>7}{'parse s':>10}{'ms/page':>10}")
+    for name, seconds in sorted(pages.seconds.items(), key=lambda i: -i[1]):
+        parse = seconds - downloads.seconds.get(name, 0.0)
+        count = pages.counts[name]
+        print(f"{name:<20}{count:>7}{parse:>10.2f}{parse / count * 1000:>10.2f}")
+    if failures:
+        sys.exit(1)
+
+
+def canonical(docs: list[dict], ordered: bool) -> list[str]:
+    """Get comparable JSON of a pipeline's documents (sorted unless order matters)"""
+    texts = [json.dumps(doc, sort_keys=True, default=str) for doc in docs]
+    return texts if ordered else sorted(texts)
+
+
+def check_pipelines(args: argparse.Namespace) -> None:
+    """Run pipelines in memory and by MongoDB on the served data, and compare them"""
+    db = DB(host=args.host, port=args.port)
+    pipelines: list[tuple[str, list[dict]]] = list(PIPELINES)
+    if args.file is not None:
+        with open(args.file) as f:
+            for line in f:
+                if line.strip():
+                    entry: dict[str, Any] = json.loads(line)
+                    pipelines.append((entry["collection"], entry["pipeline"]))
+    term = db.db["terms"].find_one(sort=[("start", -1)], projection={})
+    term_id = term["_id"] if term is not None else ""
+    start = time.perf_counter()
+    snapshot = Snapshot(db.db)
+    print(f"loaded {db.db.name} in {time.perf_counter() - start:.2f}s")
+    print(
+        f"{'#':>3} {'collection':<12}{'result':<12}{'docs':>7}{'mongo ms':>10}{'memory ms':>11}"
+    )
+    mismatches = 0
+    for number, (collection, pipeline) in enumerate(pipelines, 1):
+        pipeline = json.loads(json.dumps(pipeline).replace("TERM", term_id))
+        start = time.perf_counter()
+        expected = list(db.db[collection].aggregate(pipeline))
+        mongo_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        try:
+            found = snapshot.run(collection, pipeline)
+        except Unsupported as e:
+            result, memory, note = "fallback", "", f"  {e}"
+        else:
+            note = ""
+            memory = f"{(time.perf_counter() - start) * 1000:.2f}"
+            ordered = any("$sort" in stage for stage in pipeline)
+            if canonical(found, ordered) == canonical(expected, ordered):
+                result = "match"
+            else:
+                result = "MISMATCH"
+                mismatches += 1
+        print(
+            f"{number:>3} {collection:<12}{result:<12}{len(expected):>7}"
+            f"{mongo_ms:>10.2f}{memory:>11}{note}"
+        )
+        if result == "MISMATCH" and args.verbose:
+            print(f"    pipeline {json.dumps(pipeline)}")
+            print(f"    mongo    {canonical(expected, False)[:3]}")
+            print(f"    memory   {canonical(found, False)[:3]}")
+    db.close()
+    if mismatches:
+        print(f"{mismatches} pipeline(s) differ", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scrapers offline and check the in-memory pipeline executor"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parsers = commands.add_parser(
+        "parsers", help="Compare HTML parser backends on the pages of a recorded crawl"
+    )
+    parsers.add_argument(
+        "-a",
+        "--archive",
+        default=".cache/crawl.zip",
+        help="Archive recorded by scrape.py --record (default: .cache/crawl.zip)",
+    )
+    parsers.add_argument(
+        "-b",
+        "--backends",
+        nargs="+",
+        default=[ParserBackend.HTML.value, ParserBackend.LXML.value],
+        choices=[b.value for b in ParserBackend],
+        help="Parser backends to compare, the first is the baseline",
+    )
+    parsers.add_argument(
+        "-n",
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of passes over the pages (default: 3)",
+    )
+    parsers.set_defaults(run=bench_parsers)
+
+    crawl = commands.add_parser(
+        "crawl", help="Replay a recorded crawl end to end into a throwaway database"
+    )
+    crawl.add_argument(
+        "-a",
+        "--archive",
+        default=".cache/crawl.zip",
+        help="Archive recorded by scrape.py --record (default: .cache/crawl.zip)",
+    )
+    crawl.add_argument(
+        "-t",
+        "--term-history",
+        type=int,
+        default=0,
+        help="Term history the archive was recorded with (default: 0)",
+    )
+    crawl.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of concurrent crawl workers, 0 crawls serially (default: 8)",
+    )
+    crawl.add_argument(
+        "-p",
+        "--parser",
+        default=ParserBackend.LXML.value,
+        choices=[b.value for b in ParserBackend],
+        help="HTML parser backend (default: lxml)",
+    )
+    crawl.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Number of documents per bulk insert, 0 inserts one at a time (default: 1000)",
+    )
+    crawl.add_argument(
+        "--mongod",
+        default="mongod",
+        help="mongod binary to start a throwaway server with (default: mongod)",
+    )
+    crawl.add_argument(
+        "--port",
+        type=int,
+        help=f"Port of a running mongod to use instead (the {BENCH_DBNAME} database is dropped)",
+    )
+    crawl.set_defaults(run=bench_crawl)
+
+    pipelines = commands.add_parser(
+        "pipelines",
+        help="Check the in-memory pipeline executor against MongoDB on the served data",
+    )
+    pipelines.add_argument(
+        "-f",
+        "--file",
+        help='Also run these pipelines, one {"collection": ..., "pipeline": [...]} per line',
+    )
+    pipelines.add_argument(
+        "--host", default="localhost", help="MongoDB host (default: localhost)"
+    )
+    pipelines.add_argument(
+        "--port", type=int, default=27017, help="MongoDB port (default: 27017)"
+    )
+    pipelines.add_argument(
+        "-v", "--verbose", action="store_true", help="Show the documents that differ"
+    )
+    pipelines.set_defaults(run=check_pipelines)
+
+    args = parser.parse_args()
+    args.run(args)
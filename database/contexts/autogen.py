@@ -46,7 +46,7 @@ class AutoGenDatabase:
         "functions": [
             {
                 "name": "aggregate",
-                "description": "Run an aggregation pipeline in the Schedules database, given a pipeline and a collection name, and return a list of documents that match the pipeline.",
+                "description": "Run an aggregation pipeline in the Schedules database, given a pipeline and a collection name, and return the documents that match the pipeline. Long fields (url, ics_download_url, schedule_url, catalog_url, requirement_message(s)) are omitted unless the pipeline names them, and if there are too many documents only the first ones are returned with a summary of all of them.",
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -62,6 +62,8 @@ class AutoGenDatabase:
                                 "courses",
                                 "sections",
                                 "instructors",
+                                "section_details",
+                                "rollups",
                             ],
                         },
                         "pipeline": {
@@ -71,7 +73,140 @@ class AutoGenDatabase:
                     },
                     "required": ["collection_name", "pipeline"],
                 },
-            }
+            },
+            {
+                "name": "build_schedule",
+                "description": "Build ranked schedules of non-conflicting sections for a set of courses in a term, optionally constrained by times of day, days off and open seats. Use this instead of a pipeline whenever the user wants a schedule built from a list of courses.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "term_id": {
+                            "type": "string",
+                            "description": "The id of the term to build schedules for.",
+                        },
+                        "courses": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "The course codes to take (ex. 'CSC-357', 'MATH-248').",
+                        },
+                        "earliest_start": {
+                            "type": "string",
+                            "description": "No class may start before this time (ex. '09:00 AM').",
+                        },
+                        "latest_end": {
+                            "type": "string",
+                            "description": "No class may end after this time (ex. '05:00 PM').",
+                        },
+                        "days_off": {
+                            "type": "string",
+                            "description": "The days to keep free of classes, as day letters (M, T, W, R, F, S, U).",
+                        },
+                        "open_only": {
+                            "type": "boolean",
+                            "description": "Only use sections with open seats.",
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "The maximum number of schedules to return (default 5).",
+                        },
+                    },
+                    "required": ["term_id", "courses"],
+                },
+            },
+            {
+                "name": "free_rooms",
+                "description": "Find the rooms that are free (no section meets in them) for a whole time window on some days of a term, optionally in one building and with a minimum capacity. Use this instead of a pipeline for free or available room questions.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "term_id": {
+                            "type": "string",
+                            "description": "The id of the term.",
+                        },
+                        "days": {
+                            "type": "string",
+                            "description": "The days the room must be free, as day letters (M, T, W, R, F, S, U).",
+                        },
+                        "start": {
+                            "type": "string",
+                            "description": "The start of the window (ex. '02:00 PM').",
+                        },
+                        "end": {
+                            "type": "string",
+                            "description": "The end of the window (ex. '03:00 PM').",
+                        },
+                        "building": {
+                            "type": "string",
+                            "description": "Only search this building number (ex. '014').",
+                        },
+                        "min_capacity": {
+                            "type": "integer",
+                            "description": "The minimum registered capacity of the room.",
+                        },
+                    },
+                    "required": ["term_id", "days", "start", "end"],
+                },
+            },
+            {
+                "name": "room_utilization",
+                "description": "Get the share of a time window that each building's rooms are in use during a term. Use this instead of a pipeline for room or building utilization questions.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "term_id": {
+                            "type": "string",
+                            "description": "The id of the term.",
+                        },
+                        "days": {
+                            "type": "string",
+                            "description": "The days of the window, as day letters (default 'MTWRF').",
+                        },
+                        "start": {
+                            "type": "string",
+                            "description": "The start of the window on each day (default '08:00 AM').",
+                        },
+                        "end": {
+                            "type": "string",
+                            "description": "The end of the window on each day (default '10:00 PM').",
+                        },
+                        "building": {
+                            "type": "string",
+                            "description": "Only report this building number (ex. '014').",
+                        },
+                    },
+                    "required": ["term_id"],
+                },
+            },
+            {
+                "name": "find_names",
+                "description": "Find the ids of instructors, courses, subjects and buildings of a term by name, tolerating partial names and typos. Use this to resolve a name from the question (ex. 'foaad', 'systems programming', 'pilling') to an _id before writing a pipeline, instead of matching names with $regex.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "term_id": {
+                            "type": "string",
+                            "description": "The id of the term.",
+                        },
+                        "query": {
+                            "type": "string",
+                            "description": "The name to look up, as written in the question (ex. 'Foaad', 'CSC 357', 'computer science').",
+                        },
+                        "kinds": {
+                            "type": "array",
+                            "items": {
+                                "type": "string",
+                                "enum": ["instructor", "course", "subject", "building"],
+                            },
+                            "description": "Only find these kinds of entities.",
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "The maximum number of matches to return (default 5).",
+                        },
+                    },
+                    "required": ["term_id", "query"],
+                },
+            },
         ],
     }
 
@@ -84,6 +219,16 @@ class AutoGenDatabase:
 
     Ensure to keep it simple and only use operations appropriate for reading data. Remember, the database is in READ-ONLY mode. Keep the pipeline as straightforward as possible.
 
+    To answer questions about sections together with their course, instructor, room or building, use the section_details collection instead of joining sections with $lookup.
+
+    To answer questions about enrollment statistics (numbers of sections, average, median or maximum enrollment, how full sections are, waitlists) of a term, subject, course, instructor or building, match the rollups collection on term_id, scope and key instead of grouping sections.
+
+    To build a schedule from a list of courses, call build_schedule with the course codes and any constraints instead of constructing a pipeline.
+
+    To find free rooms or how much rooms are used, call free_rooms or room_utilization instead of constructing a pipeline.
+
+    To find an instructor, course, subject or building by name, first call find_names to get its _id, then match on the _id in your pipeline instead of using $regex on names.
+
     Below you can find the schemas for each collection. Follow the descriptions and examples to construct your pipeline.
 
     No code is allowed. Only provide the parameters. Unless otherwise specified, assume the user is asking about the current term, {current_term}, whose ID is {current_term_id}.
@@ -127,11 +272,19 @@ class AutoGenDatabase:
         self.user_proxy.register_function(
             function_map={
                 "aggregate": self.functions.aggregate,
+                "build_schedule": self.functions.build_schedule,
+                "free_rooms": self.functions.free_rooms,
+                "room_utilization": self.functions.room_utilization,
+                "find_names": self.functions.find_names,
             }
         )
         self.assistant.register_function(
             function_map={
                 "aggregate": self.functions.aggregate,
+                "build_schedule": self.functions.build_schedule,
+                "free_rooms": self.functions.free_rooms,
+                "room_utilization": self.functions.room_utilization,
+                "find_names": self.functions.find_names,
             }
         )
 
@@ -0,0 +1,51 @@
+"""Per-term structures cached in the server process"""
+
+import threading
+import time
+from typing import Callable, Generic, TypeVar
+
+from pymongo.database import Database
+
+from database.contexts.database import DB
+
+STAMP_TTL = 30.0  # Seconds between checks for new data
+
+T = TypeVar("T")
+
+
+class TermCache(Generic[T]):
+    """
+    Structures built from a term's data, cached in the server process
+
+    A term's structure is built on first use and rebuilt once the scraped
+    data changes (a new database version or scrape generation), which is
+    checked at most every `STAMP_TTL` seconds. Enrollment refreshes do not
+    cause a rebuild.
+    """
+
+    def __init__(self, database: DB, build: Callable[[Database, str], T]) -> None:
+        """
+        Initialize the term cache
+
+        Args:
+            - database (DB): The database instance
+            - build (Callable[[Database, str], T]): Builds the structure of a term from a database
+        """
+        self.database = database
+        self.build = build
+        self.built: dict[str, tuple[tuple, T]] = {}
+        self.stamp: tuple = ()
+        self.checked = 0.0
+        self.lock = threading.Lock()
+
+    def get(self, term_id: str) -> T:
+        """Get the structure of a term"""
+        with self.lock:
+            if time.time() - self.checked >= STAMP_TTL:
+                self.stamp = self.database.stamp()[:2]
+                self.checked = time.time()
+            cached = self.built.get(term_id, None)
+            if cached is None or cached[0] != self.stamp:
+                cached = (self.stamp, self.build(self.database.db, term_id))
+                self.built[term_id] = cached
+            return cached[1]
@@ -0,0 +1,827 @@
+"""In-memory columnar snapshot of the served data and a pipeline executor"""
+
+import bisect
+import copy
+import json
+import re
+import threading
+import time
+from typing import Any, Callable
+
+import numpy as np
+from pymongo.database import Database
+
+from database.contexts.database import COLLECTIONS, DB, VIEWS
+from database.contexts.partitions import archived_terms
+from database.contexts.views import ROLLUPS, SECTION_DETAILS
+
+STAMP_TTL = 5.0  # Seconds between checks for new data
+# Documents `$lookup`, `$unwind` and `$group` may build before a pipeline is
+# left to MongoDB, which runs it within the guard's cost and time budgets
+MAX_ROWS = 200_000
+# The fields an enrollment refresh changes (see `DB.update_enrollment`), and
+# the collections that hold them; the rollups are rebuilt from them
+ENROLLMENT_FIELDS = ("enrollment_capacity", "enrolled", "waitlisted")
+ENROLLMENT_COLLECTIONS = ("sections", SECTION_DETAILS)
+MISSING = object()  # A field a document does not have
+
+COMPARISONS: dict[str, Callable[[Any, Any], Any]] = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+ACCUMULATORS = {
+    "$sum",
+    "$avg",
+    "$min",
+    "$max",
+    "$first",
+    "$last",
+    "$push",
+    "$addToSet",
+    "$count",
+}
+REGEX_FLAGS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}
+
+
+class Unsupported(Exception):
+    """A pipeline the executor cannot run (it is run by MongoDB instead)"""
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def comparable(a: Any, b: Any) -> bool:
+    """Whether two values are of the same type bracket (MongoDB only compares those)"""
+    return (is_number(a) and is_number(b)) or (
+        isinstance(a, str) and isinstance(b, str)
+    )
+
+
+def sort_key(value: Any) -> tuple:
+    """Order values like MongoDB: null, numbers, strings, documents, arrays, booleans"""
+    if value is None or value is MISSING:
+        return (0, 0)
+    if is_number(value):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, dict):
+        return (3, json.dumps(value, sort_keys=True, default=str))
+    if isinstance(value, list):
+        return (4, json.dumps(value, default=str))
+    if isinstance(value, bool):
+        return (5, value)
+    return (6, str(value))
+
+
+def regex_of(spec: dict) -> re.Pattern:
+    """Compile a `$regex` condition with its `$options`"""
+    options = spec.get("$options", "")
+    if not isinstance(spec["$regex"], str) or not isinstance(options, str):
+        raise Unsupported("$regex or $options that is not a string")
+    flags = 0
+    for option in options:
+        if option not in REGEX_FLAGS:
+            raise Unsupported(f"$regex option {option}")
+        flags |= REGEX_FLAGS[option]
+    return re.compile(spec["$regex"], flags)
+
+
+def check_query(query: Any) -> None:
+    """Raise `Unsupported` for a `$match` filter MongoDB rejects or the executor cannot run exactly"""
+    if not isinstance(query, dict):
+        raise Unsupported(f"$match of {query!r}, not a document")
+    for key, condition in query.items():
+        if key in ("$and", "$or", "$nor"):
+            for clause in clauses(key, condition):
+                check_query(clause)
+        elif key.startswith("$"):
+            raise Unsupported(f"$match on {key}")
+        elif isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            check_condition(condition)
+
+
+def check_condition(condition: dict) -> None:
+    """Raise `Unsupported` for the operators of a field's condition that are not run exactly"""
+    for op, arg in condition.items():
+        if op in ("$in", "$nin"):
+            if not isinstance(arg, list):
+                raise Unsupported(f"{op} of {arg!r}, not an array")
+        elif op in COMPARISONS:
+            # Comparisons to null match null and missing fields, and other
+            # types are compared by type bracket; only numbers and strings are run
+            if not (is_number(arg) or isinstance(arg, str)):
+                raise Unsupported(f"{op} of {arg!r}")
+        elif op == "$regex":
+            regex_of(condition)
+        elif op == "$options":
+            if "$regex" not in condition:
+                raise Unsupported("$options without $regex")
+        elif op == "$not":
+            if not isinstance(arg, dict) or not all(k.startswith("$") for k in arg):
+                raise Unsupported(f"$not of {arg!r}")
+            check_condition(arg)
+        elif op not in ("$eq", "$ne", "$exists"):
+            raise Unsupported(f"{op} in $match")
+
+
+def clauses(key: str, condition: Any) -> list[dict]:
+    """Get the clauses of an `$and`, `$or` or `$nor` condition"""
+    if (
+        not isinstance(condition, list)
+        or not condition
+        or not all(isinstance(c, dict) for c in condition)
+    ):
+        raise Unsupported(f"{key} of {condition!r}, not an array of documents")
+    return condition
+
+
+def is_integer(value: Any) -> bool:
+    """Whether a value is an integer (booleans are not)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class Column:
+    """
+    A field of every document of a collection
+
+    Strings are dictionary encoded (codes into the sorted distinct values,
+    -1 for null), integers and floats are NumPy arrays with a null mask, and
+    anything else (arrays, documents, mixed types) is kept as objects.
+    """
+
+    def __init__(self, values: list[Any]) -> None:
+        self.present = np.array([v is not MISSING for v in values], dtype=bool)
+        self.null = np.array([v is None or v is MISSING for v in values], dtype=bool)
+        scalars = [v for v in values if v is not None and v is not MISSING]
+        if all(isinstance(v, str) for v in scalars):
+            self.kind = "str"
+            self.dictionary = sorted(set(scalars))
+            codes = {v: i for i, v in enumerate(self.dictionary)}
+            self.codes = np.array(
+                [codes.get(v, -1) if isinstance(v, str) else -1 for v in values],
+                dtype=np.int32,
+            )
+        elif all(is_number(v) for v in scalars):
+            self.kind = "int" if all(isinstance(v, int) for v in scalars) else "float"
+            self.values = np.array(
+                [0 if v is None or v is MISSING else v for v in values],
+                dtype=np.int64 if self.kind == "int" else np.float64,
+            )
+        else:
+            self.kind = "object"
+            self.objects = [None if v is MISSING else v for v in values]
+
+    def value(self, row: int) -> Any:
+        """Get a document's value (MISSING if it does not have the field)"""
+        if not self.present[row]:
+            return MISSING
+        if self.null[row]:
+            return None
+        if self.kind == "str":
+            return self.dictionary[self.codes[row]]
+        if self.kind == "object":
+            return self.objects[row]
+        return self.values[row].item()
+
+    def where(self, test: Callable[[Any], bool]) -> np.ndarray:
+        """Test every document's value in Python (arrays match by any element)"""
+        return np.array(
+            [
+                any(test(e) for e in v) if isinstance(v, list) else test(v)
+                for v in self.objects
+            ],
+            dtype=bool,
+        )
+
+    def equals(self, value: Any) -> np.ndarray:
+        """Get the documents whose value equals (or, for arrays, contains) a value"""
+        if value is None:
+            return self.null.copy()
+        if self.kind == "object":
+            return np.array(
+                [
+                    v == value or (isinstance(v, list) and value in v)
+                    for v in self.objects
+                ],
+                dtype=bool,
+            )
+        if self.kind == "str":
+            if not isinstance(value, str):
+                return np.zeros(len(self.null), dtype=bool)
+            i = self.dictionary_index(value)
+            return self.codes == i if i >= 0 else np.zeros(len(self.null), dtype=bool)
+        if not is_number(value):
+            return np.zeros(len(self.null), dtype=bool)
+        return (self.values == value) & ~self.null
+
+    def compare(self, op: str, value: Any) -> np.ndarray:
+        """Get the documents whose value compares to a value (same type bracket only)"""
+        test = COMPARISONS[op]
+        if self.kind == "object":
+            return self.where(lambda v: comparable(v, value) and test(v, value))
+        if self.kind == "str":
+            if not isinstance(value, str):
+                return np.zeros(len(self.null), dtype=bool)
+            table = np.array([test(v, value) for v in self.dictionary] + [False])
+            return table[self.codes]
+        if not is_number(value):
+            return np.zeros(len(self.null), dtype=bool)
+        return test(self.values, value) & ~self.null
+
+    def matches(self, pattern: re.Pattern) -> np.ndarray:
+        """Get the documents whose string value matches a regex"""
+        if self.kind == "object":
+            return self.where(lambda v: isinstance(v, str) and bool(pattern.search(v)))
+        if self.kind != "str":
+            return np.zeros(len(self.null), dtype=bool)
+        table = np.array([bool(pattern.search(v)) for v in self.dictionary] + [False])
+        return table[self.codes]
+
+    def dictionary_index(self, value: str) -> int:
+        """Get the code of a string (-1 if no document has it)"""
+        i = bisect.bisect_left(self.dictionary, value)
+        return i if i < len(self.dictionary) and self.dictionary[i] == value else -1
+
+
+class Table:
+    """A collection stored by column, with an index of rows by `_id`"""
+
+    def __init__(self, docs: list[dict]) -> None:
+        fields: dict[str, None] = {}
+        for doc in docs:
+            fields.update(dict.fromkeys(doc))
+        self.size = len(docs)
+        self.columns = {f: Column([d.get(f, MISSING) for d in docs]) for f in fields}
+        self.indexes: dict[str, dict[Any, list[int]]] = {
+            "_id": {doc["_id"]: [i] for i, doc in enumerate(docs)}
+        }
+
+    def with_fields(self, docs: list[dict], fields: tuple[str, ...]) -> "Table":
+        """
+        Get a copy of the table with some fields replaced \\
+        The other columns are shared, and documents that are not in the table
+        are ignored
+
+        Args:
+            - docs (list[dict]): Documents with an `_id` and the new values of the fields
+            - fields (tuple[str, ...]): The fields to replace
+
+        Returns:
+            - Table: The new table
+        """
+        table = copy.copy(self)
+        rows = self.indexes["_id"]
+        table.columns = dict(self.columns)
+        for field in fields:
+            column = self.columns.get(field, None)
+            values = [
+                MISSING if column is None else column.value(i) for i in range(self.size)
+            ]
+            for doc in docs:
+                for i in rows.get(doc["_id"], ()):
+                    values[i] = doc.get(field, MISSING)
+            table.columns[field] = Column(values)
+        table.indexes = {k: v for k, v in self.indexes.items() if k not in fields}
+        return table
+
+    def row(self, i: int) -> dict:
+        """Get a document"""
+        doc = {}
+        for field, column in self.columns.items():
+            value = column.value(i)
+            if value is not MISSING:
+                doc[field] = value
+        return doc
+
+    def index(self, field: str) -> dict[Any, list[int]]:
+        """Get the rows by value of a field (built on first use)"""
+        if field not in self.indexes:
+            index: dict[Any, list[int]] = {}
+            column = self.columns.get(field, None)
+            for i in range(self.size):
+                value = None if column is None else column.value(i)
+                keys = value if isinstance(value, list) else [value]
+                for key in keys:
+                    key = None if key is MISSING else key
+                    if isinstance(key, (dict, list)):
+                        continue
+                    index.setdefault(key, []).append(i)
+            self.indexes[field] = index
+        return self.indexes[field]
+
+    def select(self, query: dict) -> np.ndarray:
+        """Get the rows a `$match` filter selects, by column operations"""
+        mask = np.ones(self.size, dtype=bool)
+        for key, condition in query.items():
+            if key in ("$and", "$or", "$nor"):
+                masks = [self.select(clause) for clause in clauses(key, condition)]
+                if key == "$and":
+                    mask &= np.logical_and.reduce(masks)
+                else:
+                    any_mask = np.logical_or.reduce(masks)
+                    mask &= any_mask if key == "$or" else ~any_mask
+            elif key.startswith("$") or "." in key:
+                raise Unsupported(f"$match on {key}")
+            else:
+                mask &= self.condition(key, condition)
+        return mask
+
+    def condition(self, field: str, condition: Any) -> np.ndarray:
+        """Get the rows whose field meets a condition"""
+        column = self.columns.get(field, None)
+        if column is None:
+            column = Column([MISSING] * self.size)
+        if not (
+            isinstance(condition, dict) and any(k.startswith("$") for k in condition)
+        ):
+            return column.equals(condition)
+        mask = np.ones(self.size, dtype=bool)
+        for op, value in condition.items():
+            if op == "$eq":
+                mask &= column.equals(value)
+            elif op == "$ne":
+                mask &= ~column.equals(value)
+            elif op in ("$in", "$nin"):
+                hit = np.zeros(self.size, dtype=bool)
+                for v in value:
+                    hit |= column.equals(v)
+                mask &= hit if op == "$in" else ~hit
+            elif op in COMPARISONS:
+                mask &= column.compare(op, value)
+            elif op == "$exists":
+                mask &= column.present if value else ~column.present
+            elif op == "$regex":
+                mask &= column.matches(regex_of(condition))
+            elif op == "$options":
+                continue
+            elif op == "$not" and isinstance(value, dict):
+                mask &= ~self.condition(field, value)
+            else:
+                raise Unsupported(f"{op} in $match")
+        return mask
+
+
+def resolve(doc: Any, path: str) -> Any:
+    """Get the value of a field path (ex. 'room.number'), through arrays"""
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, list):
+            value = [resolve(v, part) for v in value if isinstance(v, dict)]
+            value = [v for v in value if v is not MISSING]
+        elif isinstance(value, dict):
+            value = value.get(part, MISSING)
+        else:
+            return MISSING
+    return value
+
+
+def evaluate(doc: dict, expression: Any, default: Any = None) -> Any:
+    """Evaluate a field path (`$field`) or constant expression"""
+    if isinstance(expression, str) and expression.startswith("$$"):
+        raise Unsupported(f"variable {expression}")
+    if isinstance(expression, list):
+        raise Unsupported("array expression")
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = resolve(doc, expression[1:])
+        return default if value is MISSING else value
+    if isinstance(expression, dict):
+        if set(expression) == {"$literal"}:
+            return expression["$literal"]
+        if any(k.startswith("$") for k in expression):
+            raise Unsupported(f"expression {next(iter(expression))}")
+        return {k: evaluate(doc, v) for k, v in expression.items()}
+    return expression
+
+
+def candidates(value: Any) -> list[Any]:
+    """Get the values a condition is tested against (an array and its elements)"""
+    if value is MISSING:
+        return [None]
+    if isinstance(value, list):
+        return [value, *value]
+    return [value]
+
+
+def matches(doc: dict, query: dict) -> bool:
+    """Whether a document meets a `$match` filter"""
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, c) for c in condition):
+                return False
+        elif key in ("$or", "$nor"):
+            if any(matches(doc, c) for c in condition) != (key == "$or"):
+                return False
+        elif key.startswith("$"):
+            raise Unsupported(f"$match on {key}")
+        elif not meets(resolve(doc, key), condition):
+            return False
+    return True
+
+
+def meets(value: Any, condition: Any) -> bool:
+    """Whether a value meets the condition of a `$match` field"""
+    values = candidates(value)
+    if not (isinstance(condition, dict) and any(k.startswith("$") for k in condition)):
+        return condition in values
+    for op, arg in condition.items():
+        if op == "$eq":
+            ok = arg in values
+        elif op == "$ne":
+            ok = arg not in values
+        elif op in ("$in", "$nin"):
+            ok = any(a in values for a in arg) == (op == "$in")
+        elif op in COMPARISONS:
+            ok = any(comparable(v, arg) and COMPARISONS[op](v, arg) for v in values)
+        elif op == "$exists":
+            ok = (value is not MISSING) == bool(arg)
+        elif op == "$regex":
+            pattern = regex_of(condition)
+            ok = any(isinstance(v, str) and pattern.search(v) for v in values)
+        elif op == "$options":
+            continue
+        elif op == "$not" and isinstance(arg, dict):
+            ok = not meets(value, arg)
+        else:
+            raise Unsupported(f"{op} in $match")
+        if not ok:
+            return False
+    return True
+
+
+def project(docs: list[dict], spec: dict) -> list[dict]:
+    """Run a `$project` stage of included, excluded and computed fields"""
+    if not isinstance(spec, dict) or not spec:
+        raise Unsupported(f"$project of {spec!r}")
+    spec = dict(spec)
+    keep_id = spec.pop("_id", 1)
+    if any("." in field or field.startswith("$") for field in spec):
+        raise Unsupported("$project of a nested field")
+    for expression in spec.values():
+        # A document without operators projects the fields of an embedded one
+        if isinstance(expression, dict) and not any(
+            k.startswith("$") for k in expression
+        ):
+            raise Unsupported("$project of a nested field")
+    # Only excluding `_id` keeps every other field, like other exclusions
+    excluded = spec or keep_id in (0, False)
+    if excluded and all(v in (0, False) for v in spec.values()):
+        return [
+            {
+                k: v
+                for k, v in doc.items()
+                if k not in spec and (k != "_id" or keep_id not in (0, False))
+            }
+            for doc in docs
+        ]
+    projected = []
+    for doc in docs:
+        out = {}
+        if keep_id not in (0, False) and "_id" in doc:
+            out["_id"] = doc["_id"] if keep_id in (1, True) else evaluate(doc, keep_id)
+        for field, expression in spec.items():
+            if is_number(expression) or isinstance(expression, bool):
+                if not expression:
+                    raise Unsupported("$project mixing inclusion and exclusion")
+                if field in doc:
+                    out[field] = doc[field]
+                continue
+            value = evaluate(doc, expression, MISSING)
+            if value is not MISSING:
+                out[field] = value
+        projected.append(out)
+    return projected
+
+
+def accumulate(op: str, values: list[Any]) -> Any:
+    """Run a `$group` accumulator over the values of a group"""
+    if op == "$sum":
+        return sum(v for v in values if is_number(v))
+    if op == "$avg":
+        numbers = [v for v in values if is_number(v)]
+        return sum(numbers) / len(numbers) if numbers else None
+    if op in ("$min", "$max"):
+        present = [v for v in values if v is not None]
+        if not present:
+            return None
+        return (min if op == "$min" else max)(present, key=sort_key)
+    if op == "$first":
+        return values[0] if values else None
+    if op == "$last":
+        return values[-1] if values else None
+    if op == "$push":
+        return values
+    if op == "$addToSet":
+        unique: dict[str, Any] = {}
+        for v in values:
+            unique.setdefault(json.dumps(v, sort_keys=True, default=str), v)
+        return list(unique.values())
+    raise Unsupported(f"{op} in $group")
+
+
+def check_group(spec: Any) -> None:
+    """Raise `Unsupported` for a `$group` stage MongoDB rejects or the executor does not have"""
+    if not isinstance(spec, dict) or "_id" not in spec:
+        raise Unsupported("$group without an _id")
+    for field, accumulator in spec.items():
+        if field == "_id":
+            continue
+        if "." in field or field.startswith("$"):
+            raise Unsupported(f"$group field {field}")
+        if not isinstance(accumulator, dict) or len(accumulator) != 1:
+            raise Unsupported(f"$group field {field}")
+        op, expression = next(iter(accumulator.items()))
+        if op not in ACCUMULATORS or (op == "$count" and expression != {}):
+            raise Unsupported(f"{op} in $group")
+
+
+def group(docs: list[dict], spec: dict) -> list[dict]:
+    """Run a `$group` stage"""
+    check_group(spec)
+    groups: dict[str, tuple[Any, list[dict]]] = {}
+    for doc in docs:
+        key = evaluate(doc, spec["_id"])
+        groups.setdefault(json.dumps(key, sort_keys=True, default=str), (key, []))[
+            1
+        ].append(doc)
+    results = []
+    for key, members in groups.values():
+        out = {"_id": key}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            op, expression = next(iter(accumulator.items()))
+            if op == "$count":
+                out[field] = len(members)
+                continue
+            values = [evaluate(m, expression, MISSING) for m in members]
+            if op in ("$push", "$addToSet"):
+                values = [v for v in values if v is not MISSING]
+            else:
+                values = [None if v is MISSING else v for v in values]
+            out[field] = accumulate(op, values)
+        results.append(out)
+    return results
+
+
+def sort(docs: list[dict], spec: dict) -> list[dict]:
+    """Run a `$sort` stage (stable, last key first)"""
+    if not isinstance(spec, dict) or not spec:
+        raise Unsupported(f"$sort of {spec!r}")
+    for field, direction in spec.items():
+        if not is_integer(direction) or direction not in (1, -1):
+            raise Unsupported(f"$sort by {direction!r}")
+        if field.startswith("$"):
+            raise Unsupported(f"$sort on {field}")
+    for field, direction in reversed(list(spec.items())):
+        docs = sorted(
+            docs, key=lambda d: sort_key(resolve(d, field)), reverse=direction == -1
+        )
+    return docs
+
+
+def unwind(docs: list[dict], spec: Any, max_rows: int = MAX_ROWS) -> list[dict]:
+    """Run an `$unwind` stage, building at most `max_rows` documents"""
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    if not isinstance(spec, dict) or set(spec) - {"path", "preserveNullAndEmptyArrays"}:
+        raise Unsupported("$unwind options")
+    path = spec.get("path", None)
+    if not isinstance(path, str) or not path.startswith("$") or path.startswith("$$"):
+        raise Unsupported(f"$unwind of {path!r}, not a field path")
+    field = path[1:]
+    if not field or "." in field:
+        raise Unsupported("$unwind of a nested field")
+    preserve = spec.get("preserveNullAndEmptyArrays", False)
+    if not isinstance(preserve, bool):
+        raise Unsupported(f"preserveNullAndEmptyArrays of {preserve!r}")
+    unwound = []
+    for doc in docs:
+        value = doc.get(field, None)
+        if isinstance(value, list) and value:
+            if len(unwound) + len(value) > max_rows:
+                raise Unsupported(f"$unwind of more than {max_rows} documents")
+            unwound.extend({**doc, field: v} for v in value)
+        elif isinstance(value, list) or value is None:
+            if preserve:
+                unwound.append({k: v for k, v in doc.items() if k != field})
+        else:
+            unwound.append(doc)
+    return unwound
+
+
+def limit_of(name: str, spec: Any) -> int:
+    """Get the count of a `$limit` (positive) or `$skip` (not negative) stage"""
+    if not is_integer(spec) or spec < (1 if name == "$limit" else 0):
+        raise Unsupported(f"{name} of {spec!r}")
+    return spec
+
+
+class Snapshot:
+    """
+    Read-only columnar copy of the hot collections (the archives of past
+    terms are left to MongoDB)
+
+    Pipelines made only of `$match`, `$project`, `$group`, `$sort`,
+    `$skip`, `$limit`, `$count`, `$unwind` and `$lookup` (on fields) with
+    field paths and constants as expressions are run in memory: the leading
+    `$match` stages by column operations over the whole collection, the
+    rest over the selected documents. Anything else raises `Unsupported`,
+    and so does a `$lookup`, `$unwind` or `$group` that would build more
+    than `MAX_ROWS` documents, so MongoDB runs it within the guard's budgets.
+    """
+
+    def __init__(self, db: Database) -> None:
+        """
+        Load a database
+
+        Args:
+            - db (Database): The database to load
+        """
+        self.tables = {
+            name: Table(list(db[name].find())) for name in [*COLLECTIONS, *VIEWS]
+        }
+        self.archived = archived_terms(db)
+
+    def with_enrollment(self, db: Database) -> "Snapshot":
+        """
+        Get a copy of the snapshot with the enrollment numbers and rollups \\
+        re-read, sharing every other table
+
+        Args:
+            - db (Database): The database to read them from
+
+        Returns:
+            - Snapshot: The new snapshot
+        """
+        snapshot = copy.copy(self)
+        snapshot.tables = dict(self.tables)
+        projection = dict.fromkeys(ENROLLMENT_FIELDS, 1)
+        for name in ENROLLMENT_COLLECTIONS:
+            docs = list(db[name].find({}, projection))
+            snapshot.tables[name] = self.tables[name].with_fields(
+                docs, ENROLLMENT_FIELDS
+            )
+        snapshot.tables[ROLLUPS] = Table(list(db[ROLLUPS].find()))
+        return snapshot
+
+    def run(
+        self, collection: str, pipeline: list[dict], max_rows: int = MAX_ROWS
+    ) -> list[dict]:
+        """
+        Run a pipeline in memory
+
+        Args:
+            - collection (str): The collection the pipeline runs on
+            - pipeline (list[dict]): The pipeline
+            - max_rows (int): The maximum number of documents a `$lookup`, `$unwind` or `$group` may build
+
+        Returns:
+            - list[dict]: The resulting documents
+
+        Raises:
+            - Unsupported: If the pipeline uses stages or operators the executor does not have, or builds too many documents
+        """
+        if collection not in self.tables:
+            raise Unsupported(f"{collection} is not loaded")
+        table = self.tables[collection]
+        mask = np.ones(table.size, dtype=bool)
+        stages = list(pipeline)
+        for stage in stages:
+            if not isinstance(stage, dict) or len(stage) != 1:
+                raise Unsupported("stage that is not a document with one key")
+        while stages and "$match" in stages[0]:
+            check_query(stages[0]["$match"])
+            try:
+                mask &= table.select(stages[0]["$match"])
+            except Unsupported:
+                break
+            stages.pop(0)
+        rows = np.flatnonzero(mask)
+        # A limit right after the selection spares materializing unused rows
+        if stages and "$limit" in stages[0]:
+            rows = rows[: limit_of("$limit", stages.pop(0)["$limit"])]
+        docs = [table.row(i) for i in rows]
+        for stage in stages:
+            name, spec = next(iter(stage.items()))
+            if name == "$match":
+                check_query(spec)
+                docs = [doc for doc in docs if matches(doc, spec)]
+            elif name == "$project":
+                docs = project(docs, spec)
+            elif name == "$group":
+                docs = group(docs, spec)
+                if len(docs) > max_rows:
+                    raise Unsupported(f"$group into more than {max_rows} documents")
+            elif name == "$sort":
+                docs = sort(docs, spec)
+            elif name in ("$skip", "$limit"):
+                spec = limit_of(name, spec)
+                docs = docs[spec:] if name == "$skip" else docs[:spec]
+            elif name == "$count":
+                if (
+                    not isinstance(spec, str)
+                    or not spec
+                    or spec[0] == "$"
+                    or "." in spec
+                ):
+                    raise Unsupported(f"$count into {spec!r}")
+                docs = [{spec: len(docs)}] if docs else []
+            elif name == "$unwind":
+                docs = unwind(docs, spec, max_rows)
+            elif name == "$lookup":
+                docs = self.lookup(docs, spec, max_rows)
+            else:
+                raise Unsupported(name)
+        return docs
+
+    def lookup(
+        self, docs: list[dict], spec: dict, max_rows: int = MAX_ROWS
+    ) -> list[dict]:
+        """Run a `$lookup` stage on a local and a foreign field, joining at most `max_rows` documents"""
+        if not isinstance(spec, dict) or set(spec) != {
+            "from",
+            "localField",
+            "foreignField",
+            "as",
+        }:
+            raise Unsupported("$lookup with a pipeline")
+        if not all(isinstance(v, str) and v for v in spec.values()):
+            raise Unsupported("$lookup with a field that is not a string")
+        if any(spec[k].startswith("$") for k in ("localField", "foreignField", "as")):
+            raise Unsupported("$lookup on a field path with $")
+        if "." in spec["as"] or "." in spec["foreignField"]:
+            raise Unsupported("$lookup of a nested field")
+        if spec["from"] not in self.tables:
+            raise Unsupported(f"{spec['from']} is not loaded")
+        foreign = self.tables[spec["from"]]
+        index = foreign.index(spec["foreignField"])
+        joined = []
+        built = 0
+        for doc in docs:
+            value = resolve(doc, spec["localField"])
+            keys = value if isinstance(value, list) else [value]
+            rows: dict[int, None] = {}
+            for key in keys:
+                key = None if key is MISSING else key
+                if isinstance(key, (dict, list)):
+                    continue
+                rows.update(dict.fromkeys(index.get(key, ())))
+            built += len(rows)
+            if built > max_rows:
+                raise Unsupported(f"$lookup of more than {max_rows} documents")
+            joined.append({**doc, spec["as"]: [foreign.row(i) for i in rows]})
+        return joined
+
+
+class ColumnarStore:
+    """
+    The columnar snapshot of the served data, kept in the server process
+
+    The snapshot is reloaded once the served data changes (a new version or
+    scrape generation), which is checked at most every `STAMP_TTL` seconds;
+    after an enrollment refresh only the enrollment numbers and rollups are
+    re-read. One reader loads the new snapshot while the others
+    keep using the previous one; only the first load is waited for.
+    """
+
+    def __init__(self, database: DB) -> None:
+        """
+        Initialize the columnar store
+
+        Args:
+            - database (DB): The database instance
+        """
+        self.database = database
+        self.snapshot: Snapshot | None = None
+        self.stamp: tuple = ()
+        self.checked = 0.0
+        self.lock = threading.Lock()
+
+    def get(self) -> Snapshot:
+        """Get the snapshot of the served data"""
+        snapshot = self.snapshot
+        if snapshot is not None:
+            # One reader checks for and loads new data, the others do not wait
+            if time.time() - self.checked < STAMP_TTL or not self.lock.acquire(
+                blocking=False
+            ):
+                return snapshot
+        else:
+            self.lock.acquire()
+        try:
+            if self.snapshot is None or time.time() - self.checked >= STAMP_TTL:
+                stamp = self.database.stamp()
+                # Swapped in once loaded, so readers never see a partial one
+                if self.snapshot is None or stamp[:2] != self.stamp[:2]:
+                    self.snapshot = Snapshot(self.database.db)
+                elif stamp != self.stamp:
+                    self.snapshot = self.snapshot.with_enrollment(self.database.db)
+                self.stamp = stamp
+                self.checked = time.time()
+            return self.snapshot
+        finally:
+            self.lock.release()
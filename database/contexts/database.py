@@ -1,95 +1,720 @@
 """CPSync Database - MongoDB Client and Database"""
 
-from pymongo import MongoClient
+import sys
+import threading
+import time
+from typing import Callable
+
+from pymongo import ASCENDING, IndexModel, InsertOne, MongoClient, UpdateOne
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
 from database import schemas
+from database.contexts.delta import GENERATIONS, DeltaWriter
+from database.contexts.partitions import (
+    PAST,
+    archived,
+    archived_terms,
+    classify_terms,
+    move_terms,
+)
+from database.contexts.views import (
+    ROLLUPS,
+    SECTION_DETAILS,
+    build_rollups,
+    build_section_details,
+)
 
 DBNAME = "cpsync"
+META_DBNAME = "cpsync_meta"
+REFRESH_STATUS = "refresh_status"
+
+# Blue/green versions: scrapes fill a new `cpsync_v{N}` database and a pointer
+# document in the meta database names the version that is served
+VERSION_PREFIX = f"{DBNAME}_v"
+SERVING = "serving"
+POINTER_TTL = 5.0  # Seconds a resolved serving pointer is reused
+
+# Scraped collections and their validators
+COLLECTIONS = {
+    "terms": schemas.term,
+    "buildings": schemas.building,
+    "rooms": schemas.room,
+    "colleges": schemas.college,
+    "subjects": schemas.subject,
+    "courses": schemas.course,
+    "sections": schemas.section,
+    # "ges": schemas.ge,
+    "instructors": schemas.instructor,
+}
+
+# Materialized views built from the scraped collections, and their validators
+VIEWS = {
+    SECTION_DETAILS: schemas.section_detail,
+    ROLLUPS: schemas.rollup,
+}
+
+# Collections whose past terms are moved to archive collections (terms are
+# few and are kept together so every term can be classified)
+PARTITIONED = [name for name in [*COLLECTIONS, *VIEWS] if name != "terms"]
+ARCHIVES = [archived(name) for name in PARTITIONED]
+
+# Secondary indexes of the scraped collections, for the fields pipelines
+# match and join on (equality fields first, so each index also serves the
+# queries on its prefixes)
+INDEXES = {
+    "buildings": [("term_id",)],
+    "rooms": [("term_id", "building_id")],
+    "colleges": [("term_id", "code")],
+    "subjects": [("term_id", "code"), ("college_id",)],
+    "courses": [("term_id", "code"), ("subject_id",), ("college_id",)],
+    "sections": [
+        ("term_id", "code"),
+        ("course_id", "type"),
+        ("instructor_id", "term_id"),
+        ("room_id", "term_id"),
+        ("alias", "term_id"),
+        ("subject_id",),
+    ],
+    "instructors": [("term_id", "last_name"), ("code",)],
+    SECTION_DETAILS: [
+        ("term_id", "alias"),
+        ("course_id", "type"),
+        ("instructor_id", "term_id"),
+        ("building_id", "term_id", "days"),
+        ("room_id", "term_id"),
+        ("instructor_name",),
+    ],
+    ROLLUPS: [("term_id", "scope", "key")],
+    # Past terms are seldom asked about, so their archives are only indexed
+    # to find a term's documents
+    **{name: [("term_id",)] for name in ARCHIVES},
+    archived("sections"): [("term_id", "course_id")],
+    archived(SECTION_DETAILS): [("term_id", "course_id")],
+}
+
+
+def index_models(collection: str) -> list[IndexModel]:
+    """Get the declared secondary indexes of a collection"""
+    return [
+        IndexModel([(field, ASCENDING) for field in fields])
+        for fields in INDEXES.get(collection, [])
+    ]
+
+
+def merge_op(
+    doc: dict, push: tuple[str, ...] = (), add_to_set: tuple[str, ...] = ()
+) -> UpdateOne:
+    """
+    Build an atomic upsert that merges a document into any existing one
+
+    Array fields in `push` are appended to, array fields in `add_to_set` are
+    unioned, and all other fields are only set when the document is created.
+
+    Args:
+        - doc (dict): The document to merge
+        - push (tuple[str, ...]): The array fields to append to
+        - add_to_set (tuple[str, ...]): The array fields to union
+    """
+    merged = {"_id", *push, *add_to_set}
+    update: dict = {"$setOnInsert": {k: v for k, v in doc.items() if k not in merged}}
+    if push:
+        update["$push"] = {k: {"$each": doc[k]} for k in push}
+    if add_to_set:
+        update["$addToSet"] = {k: {"$each": doc[k]} for k in add_to_set}
+    return UpdateOne({"_id": doc["_id"]}, update, upsert=True)
+
+
+def count_partitions(db: Database, collection: str, query: dict) -> int:
+    """Count the documents of a collection and its archive that match a query"""
+    count = db[collection].count_documents(query)
+    if collection in PARTITIONED:
+        count += db[archived(collection)].count_documents(query)
+    return count
+
+
+class WriteBuffer:
+    """
+    Queues writes per collection and runs them in bulk
+
+    A collection's queue is flushed with an unordered `bulk_write` once it
+    holds `batch_size` operations or `flush_interval` seconds have passed
+    since its last flush; a background thread flushes the queues that aged
+    out while no further writes came. Operations that fail (e.g., validation
+    errors) are reported per batch while the rest of the batch is still
+    written.
+    """
+
+    def __init__(
+        self, db: Database, batch_size: int = 1000, flush_interval: float = 5.0
+    ) -> None:
+        """
+        Initialize the write buffer and start its flusher
+
+        Args:
+            - db (Database): The database to write to
+            - batch_size (int): The number of queued operations that triggers a flush
+            - flush_interval (float): The seconds after which a collection's queue is flushed (<= 0 only flushes by size)
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending: dict[str, list[InsertOne | UpdateOne]] = {}
+        self.flushed_at: dict[str, float] = {}
+        self.errors: list[dict] = []
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.flusher: threading.Thread | None = None
+        if flush_interval > 0:
+            self.flusher = threading.Thread(target=self._run, daemon=True)
+            self.flusher.start()
+
+    def add(self, collection: str, op: InsertOne | UpdateOne) -> None:
+        """Queue a write operation"""
+        with self.lock:
+            queue = self.pending.setdefault(collection, [])
+            queue.append(op)
+            age = time.time() - self.flushed_at.setdefault(collection, time.time())
+            if len(queue) >= self.batch_size or 0 < self.flush_interval <= age:
+                self.flush(collection)
+
+    def flush(self, collection: str | None = None) -> None:
+        """
+        Run queued operations
+
+        Args:
+            - collection (str | None): The collection to flush (if not provided, all are flushed)
+        """
+        with self.lock:
+            names = [collection] if collection is not None else list(self.pending)
+            for name in names:
+                ops = self.pending.get(name, [])
+                self.pending[name] = []
+                self.flushed_at[name] = time.time()
+                if not ops:
+                    continue
+                try:
+                    self.db[name].bulk_write(ops, ordered=False)
+                except BulkWriteError as e:
+                    self._report(name, len(ops), e)
+
+    def close(self) -> None:
+        """Stop the flusher and run the operations still queued"""
+        self.stopped.set()
+        if self.flusher is not None:
+            self.flusher.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.flush_interval):
+            with self.lock:
+                now = time.time()
+                for name, ops in self.pending.items():
+                    if ops and now - self.flushed_at[name] >= self.flush_interval:
+                        self.flush(name)
+
+    def _report(self, collection: str, size: int, error: BulkWriteError) -> None:
+        """Record the failed operations of a batch"""
+        failed = []
+        for err in error.details.get("writeErrors", []):
+            op = err.get("op", {})
+            failed.append(
+                {
+                    "_id": op.get("_id", op.get("q", {}).get("_id")),
+                    "code": err.get("code"),
+                    "message": err.get("errmsg"),
+                }
+            )
+        self.errors.append(
+            {
+                "collection": collection,
+                "batch_size": size,
+                "written": size - len(failed),
+                "failed": failed,
+            }
+        )
+        print(
+            f"Warning (DB): {len(failed)} of {size} {collection} writes failed,"
+            f" e.g. {failed[0] if failed else error}",
+            file=sys.stderr,
+        )
 
 
 class DB:
     """Database class for MongoDB client and database"""
 
-    def __init__(self) -> None:
-        self.client = MongoClient("localhost", 27017)
-        self.db = self.client[DBNAME]
+    def __init__(
+        self, name: str | None = None, host: str = "localhost", port: int = 27017
+    ) -> None:
+        """
+        Initialize the database client
+
+        Args:
+            - name (str | None): The database to use (if not provided, the served version is followed)
+            - host (str): The host of the MongoDB server
+            - port (int): The port of the MongoDB server
+        """
+        self.client = MongoClient(host, port)
+        self.meta = self.client[META_DBNAME]
+        self.name = name
+        self.pointer: tuple[dict, float] | None = None
+        self.delta: DeltaWriter | None = None
+        self.buffer: WriteBuffer | None = None
+        # Called with (operation, collection, seconds) after each operation
+        self.observer: Callable[[str, str, float], None] | None = None
+
+    @property
+    def db(self) -> Database:
+        """The database in use (the served version unless pinned to a name)"""
+        return self.client[self.name or self.serving()["name"]]
+
+    def serving(self) -> dict:
+        """
+        Get the serving pointer \\
+        Resolved at most every `POINTER_TTL` seconds, so readers follow a
+        cut-over without a round trip per query
+
+        Returns:
+            - dict: The pointer, with the served `name` and the `previous` one kept for rollback
+        """
+        if self.pointer is None or time.time() - self.pointer[1] >= POINTER_TTL:
+            pointer = self.meta[SERVING].find_one({"_id": SERVING})
+            self.pointer = (pointer or {"name": DBNAME, "previous": None}, time.time())
+        return self.pointer[0]
+
+    def pin(self) -> str:
+        """Pin this instance to the currently served version and return its name"""
+        self.pointer = None
+        self.name = self.serving()["name"]
+        self._rebind()
+        return self.name
+
+    def versions(self) -> list[str]:
+        """Get the names of all blue/green versions, oldest first"""
+        names = [
+            n
+            for n in self.client.list_database_names()
+            if n.startswith(VERSION_PREFIX) and n[len(VERSION_PREFIX) :].isdigit()
+        ]
+        return sorted(names, key=lambda n: int(n[len(VERSION_PREFIX) :]))
+
+    def stage(self, indexes: bool = True) -> str:
+        """
+        Create a new, empty version to scrape into \\
+        Readers keep being served the current version until `promote`
+
+        Args:
+            - indexes (bool): Whether to create the indexes now (bulk loads create them afterward with `setup`)
+
+        Returns:
+            - str: The name of the staged version
+        """
+        versions = self.versions()
+        number = int(versions[-1][len(VERSION_PREFIX) :]) + 1 if versions else 1
+        self.name = f"{VERSION_PREFIX}{number}"
+        self.client.drop_database(self.name)
+        self._rebind()
+        self.setup(indexes)
+        return self.name
+
+    def validate(self, min_ratio: float = 0.9) -> list[str]:
+        """
+        Check a staged version before it is served
+
+        Args:
+            - min_ratio (float): The minimum ratio of the served version's courses and sections (for the same terms) the staged version must have
+
+        Returns:
+            - list[str]: The problems found (empty if the version may be promoted)
+        """
+        assert self.name is not None, "No staged version"
+        staged = self.client[self.name]
+        served = self.client[self.serving()["name"]]
+        problems = []
+        terms = [t["_id"] for t in staged.terms.find({}, {"_id": 1})]
+        if not terms:
+            problems.append("no terms were scraped")
+        for collection in ("courses", "sections"):
+            query = {"term_id": {"$in": terms}}
+            count = count_partitions(staged, collection, query)
+            before = count_partitions(served, collection, query)
+            if count == 0:
+                problems.append(f"no {collection} were scraped")
+            elif served.name != staged.name and count < min_ratio * before:
+                problems.append(
+                    f"only {count} {collection} were scraped, {before} are served"
+                )
+        query = {"term_id": {"$in": terms}}
+        details = count_partitions(staged, SECTION_DETAILS, query)
+        if details != count_partitions(staged, "sections", query):
+            problems.append(f"{SECTION_DETAILS} is out of date, refresh the views")
+        return problems
+
+    def promote(self) -> None:
+        """
+        Serve the staged version (an atomic swap of the serving pointer) \\
+        The previously served version is kept for `rollback`, older and
+        abandoned versions are dropped
+        """
+        assert self.name is not None, "No staged version"
+        current = self.serving()["name"]
+        self.meta[SERVING].replace_one(
+            {"_id": SERVING},
+            {"name": self.name, "previous": current, "promoted_at": time.time()},
+            upsert=True,
+        )
+        self.pointer = None
+        # The legacy unversioned database is never dropped
+        for name in self.versions():
+            if name not in (self.name, current):
+                self.client.drop_database(name)
+
+    def rollback(self) -> str:
+        """
+        Serve the previous version again
+
+        Returns:
+            - str: The name of the version now served
+        """
+        pointer = self.serving()
+        previous = pointer.get("previous")
+        assert previous, "No previous version to roll back to"
+        assert previous in self.client.list_database_names(), f"{previous} is gone"
+        self.meta[SERVING].replace_one(
+            {"_id": SERVING},
+            {"name": previous, "previous": pointer["name"], "promoted_at": time.time()},
+            upsert=True,
+        )
+        self.pointer = None
+        return previous
 
     def __enter__(self) -> "DB":
         return self
 
-    def __exit__(self) -> None:
+    def __exit__(self, *_) -> None:
         self.close()
 
+    def buffered(self, batch_size: int = 1000, flush_interval: float = 5.0) -> "DB":
+        """
+        Queue writes and run them in bulk \\
+        Queued writes are flushed on `flush`, `close` and context exit
+
+        Args:
+            - batch_size (int): The number of queued writes per collection that triggers a flush
+            - flush_interval (float): The seconds after which a collection's queue is flushed
+
+        Returns:
+            - DB: This database instance
+        """
+        if self.buffer is not None:
+            self.buffer.close()
+        self.buffer = WriteBuffer(self.db, batch_size, flush_interval)
+        return self
+
+    def flush(self) -> None:
+        """Run all queued writes"""
+        if self.buffer is not None:
+            start = time.perf_counter()
+            self.buffer.flush()
+            self._observe("flush", "*", start)
+
     def reset(self) -> None:
-        """Reset the database"""
-        self.client.drop_database(DBNAME)
-        self.db = self.client[DBNAME]
-
-        self.db.create_collection("terms", validator=schemas.term)
-        self.db.create_collection("buildings", validator=schemas.building)
-        self.db.create_collection("rooms", validator=schemas.room)
-        self.db.create_collection("colleges", validator=schemas.college)
-        self.db.create_collection("subjects", validator=schemas.subject)
-        self.db.create_collection("courses", validator=schemas.course)
-        self.db.create_collection("sections", validator=schemas.section)
-        # self.db.create_collection("ges", validator=schemas.ge)
-        self.db.create_collection("instructors", validator=schemas.instructor)
+        """Reset the database in place (readers see it empty until refilled)"""
+        self.client.drop_database(self.db.name)
+        self.setup()
+
+    def setup(self, indexes: bool = True) -> None:
+        """Create any missing collections and (unless `indexes` is false) indexes"""
+        existing = set(self.db.list_collection_names())
+        for name, validator in {**COLLECTIONS, **VIEWS}.items():
+            if name not in existing:
+                self.db.create_collection(name, validator=validator)
+            models = index_models(name)
+            if models and indexes:
+                self.db[name].create_indexes(models)
+        if indexes:
+            for name in ARCHIVES:
+                self.db[name].create_indexes(index_models(name))
+
+    def begin_delta(self) -> int:
+        """
+        Start an incremental scrape \\
+        Until `commit_delta`, documents are staged instead of written
+
+        Returns:
+            - int: The generation number of the scrape
+        """
+        self.delta = DeltaWriter(self.db, list(COLLECTIONS))
+        return self.delta.generation
+
+    def commit_delta(self, tombstone: bool = True) -> dict[str, dict[str, int]]:
+        """
+        Write the documents of an incremental scrape that changed
+
+        Args:
+            - tombstone (bool): Whether to remove documents of the scraped terms that were not seen
+
+        Returns:
+            - dict[str, dict[str, int]]: Counts of unchanged, upserted and removed documents per collection
+        """
+        assert self.delta is not None, "No incremental scrape in progress"
+        # Archived terms that were scraped again are compared and updated in
+        # the hot collections, then archived again
+        restored = sorted(
+            set(self.delta.staged.get("terms", {})) & archived_terms(self.db)
+        )
+        if restored:
+            move_terms(self.db, PARTITIONED, restored, archive=False)
+        stats = self.delta.commit(tombstone)
+        if self.delta.changed:
+            self.refresh_views(sorted(self.delta.changed))
+        if restored:
+            move_terms(self.db, PARTITIONED, restored)
+        self.delta = None
+        return stats
+
+    def archive_terms(self, terms: list[str] | None = None) -> dict[str, int]:
+        """
+        Move past terms from the hot collections to the archive collections \\
+        The move is recorded as a scrape generation, so caches of the served
+        data are rebuilt
+
+        Args:
+            - terms (list[str] | None): The terms to archive (the past terms that are not archived yet if not provided)
+
+        Returns:
+            - dict[str, int]: The number of documents moved per collection
+        """
+        self.flush()
+        if terms is None:
+            done = archived_terms(self.db)
+            past = classify_terms(self.get_terms())[PAST]
+            terms = [t["_id"] for t in past if t["_id"] not in done]
+        if not terms:
+            return {}
+        start = time.perf_counter()
+        moved = move_terms(self.db, PARTITIONED, terms)
+        last = self.db[GENERATIONS].find_one(sort=[("_id", -1)], projection={})
+        self.db[GENERATIONS].insert_one(
+            {
+                "_id": (last["_id"] if last else 0) + 1,
+                "mode": "archive",
+                "terms": terms,
+                "finished": time.time(),
+                "stats": moved,
+            }
+        )
+        self._observe("archive", "*", start)
+        return moved
+
+    def refresh_views(self, terms: list[str] | None = None) -> int:
+        """
+        Rebuild the materialized views from the scraped collections
+
+        Args:
+            - terms (list[str] | None): The terms to rebuild (all terms if not provided)
+
+        Returns:
+            - int: The number of section details of the terms
+        """
+        self.flush()
+        start = time.perf_counter()
+        count = build_section_details(self.db, terms)
+        self._observe("build", SECTION_DETAILS, start)
+        self.refresh_rollups(terms)
+        return count
+
+    def refresh_rollups(self, terms: list[str] | None = None) -> int:
+        """
+        Rebuild the rollups from the section details
+
+        Args:
+            - terms (list[str] | None): The terms to rebuild (all terms if not provided)
+
+        Returns:
+            - int: The number of rollups of the terms
+        """
+        self.flush()
+        start = time.perf_counter()
+        count = build_rollups(self.db, terms)
+        self._observe("build", ROLLUPS, start)
+        return count
 
     def add_term(self, term: dict) -> None:
         """Add a term to the database"""
-        self.db.terms.insert_one(term)
+        self._add("terms", term)
+
+    def get_terms(self) -> list[dict]:
+        """Get all terms from the database"""
+        return list(self.db.terms.find())
 
     def add_building(self, building: dict) -> None:
         """Add a building to the database"""
-        self.db.buildings.insert_one(building)
+        self._add("buildings", building)
 
     def add_room(self, room: dict) -> None:
         """Add a room to the database"""
-        self.db.rooms.insert_one(room)
+        self._add("rooms", room)
 
     def add_college(self, college: dict) -> None:
         """Add a college to the database"""
-        self.db.colleges.insert_one(college)
+        self._add("colleges", college)
 
     def add_subject(self, subject: dict) -> None:
         """Add a subject to the database"""
-        self.db.subjects.insert_one(subject)
+        self._add("subjects", subject)
 
     def get_course(self, course_id: str) -> dict | None:
         """Get a course from the database"""
-        return self.db.courses.find_one({"_id": course_id})
+        return self._get("courses", course_id)
 
-    def add_course(self, course: dict) -> None:
-        """Add a course to the database"""
-        self.db.courses.insert_one(course)
+    def merge_course(self, course: dict) -> None:
+        """
+        Add a course to the database, or append its types and requirements
+        to the existing course with the same id
+        """
+        self._merge(
+            "courses",
+            course,
+            push=("types", "requirement_codes", "requirement_messages"),
+        )
 
-    def update_course(self, course: dict) -> None:
-        """Update a course in the database"""
-        self.db.courses.update_one({"_id": course["_id"]}, {"$set": course})
+    def get_course_urls(self, term_id: str) -> list[str]:
+        """Get the urls of the section listings of all courses in a term"""
+        return [
+            c["url"] for c in self.db.courses.find({"term_id": term_id}, {"url": 1})
+        ]
 
     def get_section(self, section_id: str) -> dict | None:
         """Get a section from the database"""
-        return self.db.sections.find_one({"_id": section_id})
+        return self._get("sections", section_id)
 
     def add_section(self, section: dict) -> None:
-        """Add a section to the database"""
-        self.db.sections.insert_one(section)
+        """Add a section to the database, keeping the first one with the same id"""
+        self._merge("sections", section)
+
+    def update_enrollment(self, enrollments: list[dict]) -> int:
+        """
+        Update the enrollment numbers of existing sections and their details \\
+        The rollups are not rebuilt here, but once per refresh of a term (see
+        `refresh_rollups`)
+
+        Args:
+            - enrollments (list[dict]): Documents with a section `_id` and the enrollment fields to set
+
+        Returns:
+            - int: The number of sections whose numbers changed
+        """
+        if not enrollments:
+            return 0
+        start = time.perf_counter()
+        ops = [
+            UpdateOne(
+                {"_id": e["_id"]},
+                {"$set": {k: v for k, v in e.items() if k != "_id"}},
+            )
+            for e in enrollments
+        ]
+        modified = self.db.sections.bulk_write(ops, ordered=False).modified_count
+        if modified:
+            self.db[SECTION_DETAILS].bulk_write(ops, ordered=False)
+        self._observe("update", "sections", start)
+        return modified
 
     # def add_ge(self, ge: dict) -> None:
     #     """Add a GE to the database"""
-    #     self.db.ges.insert_one(ge)
+    #     self._add("ges", ge)
 
     def get_instructor(self, instructor_id: str) -> dict | None:
         """Get an instructor from the database"""
-        return self.db.instructors.find_one({"_id": instructor_id})
+        return self._get("instructors", instructor_id)
+
+    def merge_instructor(self, instructor: dict) -> None:
+        """
+        Add an instructor to the database, or add their colleges and subjects
+        to the existing instructor with the same id
+        """
+        self._merge("instructors", instructor, add_to_set=("colleges", "subjects"))
+
+    def set_refresh_status(self, tier: str, status: dict) -> None:
+        """Record the outcome of a refresh of a tier"""
+        self.db[REFRESH_STATUS].replace_one(
+            {"_id": tier}, {**status, "refreshed_at": time.time()}, upsert=True
+        )
 
-    def add_instructor(self, instructor: dict) -> None:
-        """Add an instructor to the database"""
-        self.db.instructors.insert_one(instructor)
+    def get_refresh_status(self) -> list[dict]:
+        """Get the last refresh outcome of every tier"""
+        return list(self.db[REFRESH_STATUS].find())
 
-    def update_instructor(self, instructor: dict) -> None:
-        """Update an instructor in the database"""
-        self.db.instructors.update_one({"_id": instructor["_id"]}, {"$set": instructor})
+    def stamp(self) -> tuple[str, int, float]:
+        """
+        Identify the state of the served data, which changes whenever the \\
+        data does (a new version, scrape generation or refresh)
+
+        Returns:
+            - tuple[str, int, float]: The served database, last scrape generation and last refresh time
+        """
+        db = self.db
+        generation = db[GENERATIONS].find_one(sort=[("_id", -1)], projection={})
+        refresh = db[REFRESH_STATUS].find_one(
+            sort=[("refreshed_at", -1)], projection={"refreshed_at": 1}
+        )
+        return (
+            db.name,
+            generation["_id"] if generation else 0,
+            refresh["refreshed_at"] if refresh else 0.0,
+        )
 
     def close(self) -> None:
-        """Close the database connection"""
+        """Flush queued writes and close the database connection"""
+        if self.buffer is not None:
+            start = time.perf_counter()
+            self.buffer.close()
+            self._observe("flush", "*", start)
         self.client.close()
+
+    def _rebind(self) -> None:
+        if self.buffer is not None:
+            with self.buffer.lock:
+                self.buffer.flush()
+                self.buffer.db = self.db
+
+    def _observe(self, op: str, collection: str, start: float) -> None:
+        if self.observer is not None:
+            self.observer(op, collection, time.perf_counter() - start)
+
+    def _add(self, collection: str, doc: dict) -> None:
+        start = time.perf_counter()
+        if self.delta is not None:
+            self.delta.stage(collection, doc)
+        elif self.buffer is not None:
+            self.buffer.add(collection, InsertOne(doc))
+        else:
+            self.db[collection].insert_one(doc)
+        self._observe("add", collection, start)
+
+    def _merge(
+        self,
+        collection: str,
+        doc: dict,
+        push: tuple[str, ...] = (),
+        add_to_set: tuple[str, ...] = (),
+    ) -> None:
+        start = time.perf_counter()
+        if self.delta is not None:
+            self.delta.merge(collection, doc, push, add_to_set)
+        else:
+            op = merge_op(doc, push, add_to_set)
+            if self.buffer is not None:
+                self.buffer.add(collection, op)
+            else:
+                self.db[collection].bulk_write([op])
+        self._observe("merge", collection, start)
+
+    def _get(self, collection: str, doc_id: str) -> dict | None:
+        start = time.perf_counter()
+        if self.delta is not None:
+            doc = self.delta.get(collection, doc_id)
+        else:
+            doc = self.db[collection].find_one({"_id": doc_id})
+        self._observe("get", collection, start)
+        return doc
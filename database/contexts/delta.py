@@ -0,0 +1,194 @@
+"""Incremental (delta) writes for scrapes"""
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any
+
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.database import Database
+
+HASHES = "scrape_hashes"
+TOMBSTONES = "scrape_tombstones"
+GENERATIONS = "scrape_generations"
+
+BATCH_SIZE = 1000
+
+
+def digest(doc: dict[str, Any]) -> str:
+    """Get a stable content hash of a document"""
+    data = json.dumps(doc, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def term_of(collection: str, doc: dict[str, Any]) -> str:
+    """Get the term a document belongs to"""
+    return doc["_id"] if collection == "terms" else doc["term_id"]
+
+
+class DeltaWriter:
+    """
+    Stages the documents of a scrape and writes only what changed
+
+    Documents are kept in memory until `commit`, which compares each one's
+    content hash with the hash stored by the previous scrape, upserts the
+    ones that changed, and moves documents that vanished from the scraped
+    terms into a tombstone collection stamped with the scrape generation.
+    """
+
+    def __init__(self, db: Database, collections: list[str]) -> None:
+        """
+        Initialize the delta writer
+
+        Args:
+            - db (Database): The database to write to
+            - collections (list[str]): The collections the scrape fills
+        """
+        self.db = db
+        self.collections = collections
+        self.staged: dict[str, dict[str, dict[str, Any]]] = {c: {} for c in collections}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.changed: set[str] = set()  # Terms with written or removed documents
+        last = self.db[GENERATIONS].find_one(sort=[("_id", -1)])
+        self.generation = (last["_id"] if last else 0) + 1
+
+    def stage(self, collection: str, doc: dict[str, Any]) -> None:
+        """Stage a document, replacing any staged document with the same id"""
+        with self.lock:
+            self.staged[collection][doc["_id"]] = doc
+
+    def merge(
+        self,
+        collection: str,
+        doc: dict[str, Any],
+        push: tuple[str, ...] = (),
+        add_to_set: tuple[str, ...] = (),
+    ) -> None:
+        """
+        Stage a document, merging it into any staged document with the same id
+
+        Args:
+            - collection (str): The collection of the document
+            - doc (dict[str, Any]): The document to merge
+            - push (tuple[str, ...]): The array fields to append to
+            - add_to_set (tuple[str, ...]): The array fields to union (kept sorted so hashes are stable)
+        """
+        with self.lock:
+            staged = self.staged[collection].get(doc["_id"], None)
+            if staged is None:
+                staged = self.staged[collection][doc["_id"]] = dict(doc)
+                for k in add_to_set:
+                    staged[k] = sorted(set(doc[k]))
+                return
+            for k in push:
+                staged[k] = staged[k] + doc[k]
+            for k in add_to_set:
+                staged[k] = sorted(set(staged[k]) | set(doc[k]))
+
+    def get(self, collection: str, doc_id: str) -> dict[str, Any] | None:
+        """Get a staged document"""
+        with self.lock:
+            return self.staged[collection].get(doc_id, None)
+
+    def commit(self, tombstone: bool = True) -> dict[str, dict[str, int]]:
+        """
+        Write the changes of the scrape
+
+        Args:
+            - tombstone (bool): Whether to remove documents that were not seen (disable for partial scrapes)
+
+        Returns:
+            - dict[str, dict[str, int]]: Counts of unchanged, upserted and removed documents per collection
+        """
+        terms = sorted(self.staged["terms"]) if "terms" in self.staged else []
+        stats: dict[str, dict[str, int]] = {}
+        for collection in self.collections:
+            stats[collection] = self._commit_collection(collection, terms, tombstone)
+        self.db[GENERATIONS].insert_one(
+            {
+                "_id": self.generation,
+                "mode": "incremental",
+                "terms": terms,
+                "changed_terms": sorted(self.changed),
+                "started": self.started,
+                "finished": time.time(),
+                "stats": stats,
+            }
+        )
+        return stats
+
+    def _commit_collection(
+        self, collection: str, terms: list[str], tombstone: bool
+    ) -> dict[str, int]:
+        """Write the changes of a single collection"""
+        staged = self.staged[collection]
+        stored = {
+            h["doc_id"]: h["hash"]
+            for h in self.db[HASHES].find(
+                {"collection": collection, "term_id": {"$in": terms}},
+                {"doc_id": 1, "hash": 1},
+            )
+        }
+        writes, hash_writes = [], []
+        for doc_id, doc in staged.items():
+            h = digest(doc)
+            if stored.get(doc_id) == h:
+                continue
+            self.changed.add(term_of(collection, doc))
+            writes.append(ReplaceOne({"_id": doc_id}, doc, upsert=True))
+            hash_writes.append(
+                ReplaceOne(
+                    {"_id": f"{collection}:{doc_id}"},
+                    {
+                        "collection": collection,
+                        "doc_id": doc_id,
+                        "term_id": term_of(collection, doc),
+                        "hash": h,
+                        "generation": self.generation,
+                    },
+                    upsert=True,
+                )
+            )
+
+        upserted = len(writes)
+        vanished = [doc_id for doc_id in stored if doc_id not in staged]
+        if tombstone and vanished:
+            removed_at = time.time()
+            removed_docs = list(self.db[collection].find({"_id": {"$in": vanished}}))
+            self.changed.update(term_of(collection, doc) for doc in removed_docs)
+            graves = [
+                ReplaceOne(
+                    {"_id": f"{collection}:{doc['_id']}"},
+                    {
+                        "collection": collection,
+                        "doc_id": doc["_id"],
+                        "term_id": term_of(collection, doc),
+                        "generation": self.generation,
+                        "removed_at": removed_at,
+                        "doc": doc,
+                    },
+                    upsert=True,
+                )
+                for doc in removed_docs
+            ]
+            self._bulk(TOMBSTONES, graves)
+            writes += [DeleteOne({"_id": doc_id}) for doc_id in vanished]
+            hash_writes += [
+                DeleteOne({"_id": f"{collection}:{doc_id}"}) for doc_id in vanished
+            ]
+
+        removed = len(vanished) if tombstone else 0
+        self._bulk(collection, writes)
+        self._bulk(HASHES, hash_writes)
+        return {
+            "unchanged": len(staged) - upserted,
+            "upserted": upserted,
+            "removed": removed,
+        }
+
+    def _bulk(self, collection: str, ops: list) -> None:
+        """Run unordered bulk writes in batches"""
+        for i in range(0, len(ops), BATCH_SIZE):
+            self.db[collection].bulk_write(ops[i : i + BATCH_SIZE], ordered=False)
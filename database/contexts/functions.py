@@ -1,6 +1,127 @@
 import json
+import sys
+import threading
+import time
+from collections import OrderedDict
 from typing import Any
-from database.contexts.database import DB
+from pymongo.database import Database
+from pymongo.errors import ExecutionTimeout, OperationFailure
+from database.contexts.database import DB, PARTITIONED
+from database.contexts.guard import PipelineGuard, PipelineRejected
+from database.contexts.names import NameIndex
+from database.contexts.cache import TermCache
+from database.contexts.columnar import ColumnarStore, Unsupported
+from database.contexts.occupancy import OccupancyMatrix
+from database.contexts.partitions import SpansPartitions, route
+from database.contexts.profiler import QueryProfiler
+from database.contexts.results import serialize
+from database.contexts.schedules import ScheduleBuilder
+
+# Keys whose documents are ordered (the order of their fields changes results)
+ORDERED_KEYS = {"$sort", "sortBy"}
+STAMP_TTL = 5.0  # Seconds between checks for new data
+
+
+def canonical(value: Any, ordered: bool = False) -> Any:
+    """Sort the fields of a pipeline's documents, except where order matters"""
+    if isinstance(value, dict):
+        items = value.items() if ordered else sorted(value.items())
+        return {k: canonical(v, k in ORDERED_KEYS) for k, v in items}
+    if isinstance(value, list):
+        return [canonical(v) for v in value]
+    return value
+
+
+class ResultCache:
+    """
+    In-process LRU of pipeline results with a size budget
+
+    Results are stored serialized and keyed on the collection and the
+    canonical JSON of the pipeline, so pipelines that only differ in
+    whitespace or field order share an entry. The cache is cleared when the
+    served data changes, which is checked at most every `STAMP_TTL` seconds.
+    """
+
+    def __init__(self, database: DB, max_bytes: int = 32 * 1024 * 1024) -> None:
+        """
+        Initialize the result cache
+
+        Args:
+            - database (DB): The database instance
+            - max_bytes (int): The size budget before the least recently used results are evicted
+        """
+        self.database = database
+        self.max_bytes = max_bytes
+        self.results: OrderedDict[str, str] = OrderedDict()
+        self.size = 0
+        self.stamp: tuple = ()
+        self.checked = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def key(self, collection_name: str, pipeline: list[dict]) -> str:
+        """Get the cache key of a pipeline"""
+        text = json.dumps(canonical(pipeline), separators=(",", ":"))
+        return f"{collection_name}:{text}"
+
+    def get(self, key: str) -> str | None:
+        """Get a cached result, marking it as recently used"""
+        with self.lock:
+            if time.time() - self.checked >= STAMP_TTL:
+                stamp = self.database.stamp()
+                self.checked = time.time()
+                if stamp != self.stamp:
+                    self.results.clear()
+                    self.size = 0
+                    self.stamp = stamp
+            result = self.results.get(key, None)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.results.move_to_end(key)
+            return result
+
+    def put(self, key: str, result: str, stamp: tuple) -> None:
+        """
+        Store a result, evicting results until it fits the budget \\
+        The result is dropped if the served data changed since it was looked up
+
+        Args:
+            - key (str): The cache key of the pipeline
+            - result (str): The serialized result
+            - stamp (tuple): The cache's `stamp` when the lookup missed
+        """
+        if len(result) > self.max_bytes:
+            return
+        with self.lock:
+            if stamp != self.stamp:
+                return
+            previous = self.results.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.results[key] = result
+            self.size += len(result)
+            while self.size > self.max_bytes:
+                _, evicted = self.results.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        """Get the hit and miss counts and size of the cache"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.results),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
 
 
 class Functions:
@@ -8,7 +129,18 @@ class Functions:
 
     def __init__(self, database: DB) -> None:
         self.client = database.client
-        self.db = database.db
+        self.database = database
+        self.occupancy = TermCache(database, OccupancyMatrix)
+        self.names = TermCache(database, NameIndex)
+        self.profiler = QueryProfiler(database.meta)
+        self.cache = ResultCache(database)
+        self.guard = PipelineGuard()
+        self.columnar = ColumnarStore(database)
+
+    @property
+    def db(self) -> Database:
+        """The served database, resolved per call to follow blue/green cut-overs"""
+        return self.database.db
 
     def filter(self, collection_name: str, filter: str) -> list[dict[str, Any]]:
         """
@@ -30,10 +162,191 @@ class Functions:
         :param collection_name: the name of the collection to aggregate
         :param pipeline: the pipeline to apply, must be a valid MongoDB JSON document
 
-        :return: a list of documents that match the pipeline
+        :return: the documents that match the pipeline as compact JSON, or a
+            summary and the first documents if there are too many
+        """
+        try:
+            pipeline_doc = json.loads(pipeline)
+        except json.JSONDecodeError as e:
+            return f"Error: the pipeline is not valid JSON ({e}), fix it and try again"
+        key = self.cache.key(collection_name, pipeline_doc)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        # A result computed from data replaced meanwhile must not be stored
+        stamp = self.cache.stamp
+        try:
+            self.guard.check(collection_name, pipeline_doc)
+            snapshot = self.columnar.get()
+            # Pipelines on past terms are answered from the archive collections
+            collection_name, pipeline_doc = route(
+                collection_name, pipeline_doc, snapshot.archived, PARTITIONED
+            )
+        except (PipelineRejected, SpansPartitions) as e:
+            return f"Error: the pipeline was rejected: {e}"
+        try:
+            text = serialize(snapshot.run(collection_name, pipeline_doc), pipeline_doc)
+        except Unsupported:
+            text = self.run_pipeline(collection_name, pipeline_doc)
+        except Exception as e:
+            # MongoDB tells the assistant what is wrong with the pipeline
+            print(
+                f"Warning (Query): in-memory run of a {collection_name} pipeline"
+                f" failed ({e!r}), running it on MongoDB",
+                file=sys.stderr,
+            )
+            text = self.run_pipeline(collection_name, pipeline_doc)
+        if text == "[]":
+            text = "No documents were found"
+        if not text.startswith("Error:"):
+            self.cache.put(key, text, stamp)
+        return text
+
+    def run_pipeline(self, collection_name: str, pipeline_doc: list[dict]) -> str:
+        """
+        Run a pipeline on MongoDB, within the guard's budget
+
+        :param collection_name: the name of the collection to aggregate
+        :param pipeline_doc: the parsed pipeline
+
+        :return: the serialized result, or an error the assistant can act on
+        """
+        db = self.db
+        start = time.perf_counter()
+        try:
+            admitted = self.guard.admit(db, collection_name, pipeline_doc)
+            with self.guard.turn(), db[collection_name].aggregate(
+                admitted, maxTimeMS=self.guard.max_time_ms
+            ) as cursor:
+                text = serialize(cursor, pipeline_doc)
+        except PipelineRejected as e:
+            return f"Error: the pipeline was rejected: {e}"
+        except ExecutionTimeout:
+            return (
+                f"Error: the pipeline took longer than {self.guard.max_time_ms} ms;"
+                " add a $match (e.g. on term_id) near the start or simplify it"
+            )
+        except OperationFailure as e:
+            message = e.details.get("errmsg", e) if e.details else e
+            return f"Error: the pipeline failed: {message}"
+        self.profiler.record(
+            db, collection_name, pipeline_doc, time.perf_counter() - start
+        )
+        return text
+
+    def build_schedule(
+        self,
+        term_id: str,
+        courses: list[str],
+        earliest_start: str | None = None,
+        latest_end: str | None = None,
+        days_off: str = "",
+        open_only: bool = False,
+        limit: int = 5,
+    ) -> str:
+        """
+        Build ranked schedules of non-conflicting sections for a set of courses
+
+        :param term_id: the id of the term to build schedules for
+        :param courses: the course codes to take (ex. ["CSC-357", "MATH-248"])
+        :param earliest_start: no class may start before this time (ex. "09:00 AM")
+        :param latest_end: no class may end after this time (ex. "05:00 PM")
+        :param days_off: the days to keep free of classes (ex. "F")
+        :param open_only: only use sections with open seats
+        :param limit: the maximum number of schedules to return
+
+        :return: the ranked schedules, or why none could be built
+        """
+        try:
+            result = ScheduleBuilder(self.db).build(
+                term_id,
+                courses,
+                earliest_start=earliest_start,
+                latest_end=latest_end,
+                days_off=days_off,
+                open_only=open_only,
+                limit=limit,
+            )
+        except ValueError as e:
+            return f"Error: {e}, fix it and try again"
+        return json.dumps(result, indent=2)
+
+    def free_rooms(
+        self,
+        term_id: str,
+        days: str,
+        start: str,
+        end: str,
+        building: str | None = None,
+        min_capacity: int | None = None,
+    ) -> str:
+        """
+        Find the rooms that are free for a whole time window
+
+        :param term_id: the id of the term
+        :param days: the days the room must be free (ex. "MWF")
+        :param start: the start of the window (ex. "02:00 PM")
+        :param end: the end of the window (ex. "03:00 PM")
+        :param building: only search this building number (ex. "014")
+        :param min_capacity: the minimum registered capacity of the room
+
+        :return: the free rooms, largest first
+        """
+        try:
+            rooms = self.occupancy.get(term_id).free_rooms(
+                days, start, end, building=building, min_capacity=min_capacity
+            )
+        except ValueError as e:
+            return f"Error: {e}, fix it and try again"
+        if len(rooms) == 0:
+            return "No free rooms were found"
+        return json.dumps(rooms, indent=2)
+
+    def room_utilization(
+        self,
+        term_id: str,
+        days: str = "MTWRF",
+        start: str = "08:00 AM",
+        end: str = "10:00 PM",
+        building: str | None = None,
+    ) -> str:
+        """
+        Get the share of a time window each building's rooms are in use
+
+        :param term_id: the id of the term
+        :param days: the days of the window (ex. "MTWRF")
+        :param start: the start of the window on each day (ex. "08:00 AM")
+        :param end: the end of the window on each day (ex. "10:00 PM")
+        :param building: only report this building number (ex. "014")
+
+        :return: the utilization (0 to 1) by building id
+        """
+        try:
+            result = self.occupancy.get(term_id).utilization(
+                days, start, end, building=building
+            )
+        except ValueError as e:
+            return f"Error: {e}, fix it and try again"
+        return json.dumps(result, indent=2)
+
+    def find_names(
+        self,
+        term_id: str,
+        query: str,
+        kinds: list[str] | None = None,
+        limit: int = 5,
+    ) -> str:
+        """
+        Find instructors, courses, subjects and buildings by a (fuzzy) name
+
+        :param term_id: the id of the term
+        :param query: the name, possibly partial or misspelled (ex. "foaad", "CSC 357")
+        :param kinds: only find these kinds of entities ("instructor", "course", "subject", "building")
+        :param limit: the maximum number of matches to return
+
+        :return: the ids and names of the best matches, best first
         """
-        pipeline_doc = json.loads(pipeline)
-        result = list(self.db[collection_name].aggregate(pipeline_doc))
-        if len(result) == 0:
-            return "No documents were found"
-        return json.dumps(list(result), indent=2)
+        matches = self.names.get(term_id).search(query, kinds=kinds, limit=limit)
+        if len(matches) == 0:
+            return "No names matched"
+        return json.dumps(matches, indent=2)
@@ -0,0 +1,293 @@
+"""Admission checks and execution budgets for the assistant's pipelines"""
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+
+from database.contexts.database import ARCHIVES, COLLECTIONS, VIEWS
+from database.contexts.profiler import explain
+
+MAX_TIME_MS = 5000  # Server-side time limit of a pipeline
+MAX_RESULT = 5000  # Documents a pipeline may return (see results.SCAN_LIMIT)
+MAX_COST = 2_000_000  # Estimated documents a pipeline may examine
+MAX_CONCURRENT = 4  # Pipelines run at once
+QUEUE_SECONDS = 10.0  # Time a pipeline waits for a turn before it is refused
+
+# Read-only stages the assistant may use
+ALLOWED_STAGES = {
+    "$match",
+    "$project",
+    "$addFields",
+    "$set",
+    "$unset",
+    "$group",
+    "$sort",
+    "$limit",
+    "$skip",
+    "$count",
+    "$unwind",
+    "$lookup",
+    "$unionWith",
+    "$facet",
+    "$bucket",
+    "$bucketAuto",
+    "$sortByCount",
+    "$replaceRoot",
+    "$replaceWith",
+    "$sample",
+}
+# The JSON types each stage's spec may have
+STAGE_TYPES: dict[str, tuple[type, ...]] = {
+    "$match": (dict,),
+    "$project": (dict,),
+    "$addFields": (dict,),
+    "$set": (dict,),
+    "$unset": (str, list),
+    "$group": (dict,),
+    "$sort": (dict,),
+    "$limit": (int,),
+    "$skip": (int,),
+    "$count": (str,),
+    "$unwind": (str, dict),
+    "$lookup": (dict,),
+    "$unionWith": (str, dict),
+    "$facet": (dict,),
+    "$bucket": (dict,),
+    "$bucketAuto": (dict,),
+    "$sortByCount": (str, dict),
+    "$replaceRoot": (dict,),
+    "$replaceWith": (str, dict),
+    "$sample": (dict,),
+}
+TYPE_NAMES = {dict: "a document", list: "an array", str: "a string", int: "an integer"}
+# Collections pipelines may read
+READABLE = [*COLLECTIONS, *VIEWS, *ARCHIVES]
+# Operators that run JavaScript on the server
+FORBIDDEN_OPERATORS = {"$where", "$function", "$accumulator"}
+
+
+class PipelineRejected(ValueError):
+    """A pipeline that may not run, with a reason the assistant can act on"""
+
+
+def operators(value: Any) -> Iterator[str]:
+    """Get every operator used in a pipeline"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key.startswith("$"):
+                yield key
+            yield from operators(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from operators(item)
+
+
+def check_stages(pipeline: Any) -> None:
+    """Reject stages that are not allowed, including in nested pipelines"""
+    if not isinstance(pipeline, list) or not all(isinstance(s, dict) for s in pipeline):
+        raise PipelineRejected("The pipeline must be a JSON array of stage documents")
+    for stage in pipeline:
+        if len(stage) != 1:
+            raise PipelineRejected(f"Each stage must have exactly one key: {stage}")
+        name, spec = next(iter(stage.items()))
+        if name not in ALLOWED_STAGES:
+            raise PipelineRejected(
+                f"The {name} stage is not allowed, the database is read-only;"
+                f" use only {', '.join(sorted(ALLOWED_STAGES))}"
+            )
+        types = STAGE_TYPES[name]
+        if not isinstance(spec, types) or isinstance(spec, bool):
+            expected = " or ".join(TYPE_NAMES[t] for t in types)
+            raise PipelineRejected(f"The {name} stage takes {expected}: {stage}")
+        if name in ("$lookup", "$unionWith"):
+            joined = (
+                spec if isinstance(spec, str) else spec.get("from", spec.get("coll"))
+            )
+            if joined not in READABLE:
+                raise PipelineRejected(
+                    f"Unknown collection {joined!r} in {name};"
+                    f" use one of {', '.join(READABLE)}"
+                )
+            if isinstance(spec, dict) and "pipeline" in spec:
+                check_stages(spec["pipeline"])
+        elif name == "$facet":
+            for facet in spec.values():
+                check_stages(facet)
+
+
+def leading_match(pipeline: list[dict]) -> dict:
+    """Get the filter of the `$match` stages at the start of a pipeline"""
+    matches = []
+    for stage in pipeline:
+        if "$match" not in stage:
+            break
+        matches.append(stage["$match"])
+    return matches[0] if len(matches) == 1 else {"$and": matches} if matches else {}
+
+
+def indexed(collection: Collection, field: str) -> bool:
+    """Whether an index of a collection starts with a field"""
+    info = collection.index_information()
+    return any(index["key"][0][0] == field for index in info.values())
+
+
+class PipelineGuard:
+    """
+    Admits the assistant's pipelines and runs them within a budget
+
+    A pipeline is rejected if it uses a stage that is not read-only or
+    JavaScript, or if its estimated cost is too high: the plan from
+    `explain` tells whether the first stages scan the whole collection,
+    and each `$lookup` costs an index probe per input document if the
+    joined field is indexed, or a scan of the joined collection otherwise.
+    Admitted pipelines run with a server-side time limit and result cap,
+    and only `MAX_CONCURRENT` at a time, so one pathological question
+    cannot stall the others.
+    """
+
+    def __init__(
+        self,
+        max_time_ms: int = MAX_TIME_MS,
+        max_result: int = MAX_RESULT,
+        max_cost: int = MAX_COST,
+    ) -> None:
+        """
+        Initialize the pipeline guard
+
+        Args:
+            - max_time_ms (int): The server-side time limit of a pipeline
+            - max_result (int): The maximum number of documents a pipeline returns
+            - max_cost (int): The maximum estimated number of documents a pipeline examines
+        """
+        self.max_time_ms = max_time_ms
+        self.max_result = max_result
+        self.max_cost = max_cost
+        self.slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+
+    def admit(self, db: Database, collection: str, pipeline: Any) -> list[dict]:
+        """
+        Check a pipeline and get the pipeline to run
+
+        Args:
+            - db (Database): The database the pipeline will run on
+            - collection (str): The collection the pipeline will run on
+            - pipeline (Any): The pipeline, as parsed from the assistant's JSON
+
+        Returns:
+            - list[dict]: The pipeline with the result cap appended
+
+        Raises:
+            - PipelineRejected: If the pipeline may not run
+        """
+        self.check(collection, pipeline)
+        self.check_cost(db, collection, pipeline)
+        return [*pipeline, {"$limit": self.max_result}]
+
+    def check(self, collection: str, pipeline: Any) -> None:
+        """
+        Check a pipeline's collections, stages and operators (but not its cost)
+
+        Raises:
+            - PipelineRejected: If the pipeline may not run
+        """
+        if collection not in READABLE:
+            raise PipelineRejected(
+                f"Unknown collection {collection!r};"
+                f" use one of {', '.join(READABLE)}"
+            )
+        check_stages(pipeline)
+        forbidden = FORBIDDEN_OPERATORS.intersection(operators(pipeline))
+        if forbidden:
+            raise PipelineRejected(
+                f"{', '.join(sorted(forbidden))} may not be used,"
+                " use query operators instead"
+            )
+
+    def check_cost(self, db: Database, collection: str, pipeline: list[dict]) -> None:
+        """Reject a pipeline if it would examine too many documents"""
+        match = leading_match(pipeline)
+        rows = db[collection].estimated_document_count()
+        if match and "COLLSCAN" not in explain(db, collection, pipeline):
+            try:
+                rows = db[collection].count_documents(
+                    match, limit=self.max_cost, maxTimeMS=self.max_time_ms
+                )
+            except PyMongoError:
+                pass
+        cost = rows + self.stages_cost(db, collection, pipeline, rows)
+        if cost > self.max_cost:
+            raise PipelineRejected(
+                f"The pipeline would examine about {cost} documents;"
+                f" add a $match (e.g. on term_id) or a $limit near the start"
+            )
+
+    def stages_cost(
+        self, db: Database, collection: str, pipeline: list[dict], rows: int
+    ) -> int:
+        """
+        Estimate the documents the joins of a pipeline examine, including \\
+        those of the pipelines nested in `$lookup`, `$unionWith` and `$facet`
+
+        Args:
+            - db (Database): The database the pipeline will run on
+            - collection (str): The collection the pipeline runs on
+            - pipeline (list[dict]): The pipeline
+            - rows (int): The number of documents that enter the pipeline
+
+        Returns:
+            - int: The estimated number of documents examined
+
+        Raises:
+            - PipelineRejected: If a `$lookup` on an unindexed field examines too many documents
+        """
+        cost = 0
+        for stage in pipeline:
+            name, spec = next(iter(stage.items()))
+            if name == "$limit":
+                rows = min(rows, spec)
+            elif name == "$lookup":
+                joined = db[spec["from"]]
+                field = spec.get("foreignField", None)
+                # Each input document probes the index, or scans the collection
+                probed = field is not None and indexed(joined, field)
+                size = 1 if probed else joined.estimated_document_count()
+                nested = spec.get("pipeline", [])
+                per_row = size + self.stages_cost(db, joined.name, nested, size)
+                cost += rows * per_row
+                if not probed and cost > self.max_cost:
+                    unindexed = "" if field is None else f", {field} is not indexed"
+                    raise PipelineRejected(
+                        f"The $lookup from {collection} into {joined.name} would"
+                        f" examine about {rows * per_row} documents ({rows}"
+                        f" {collection} x {per_row} {joined.name}{unindexed}); add a"
+                        " $match (e.g. on term_id) or a $limit before it, or join"
+                        " on an indexed field such as _id"
+                    )
+            elif name == "$unionWith":
+                joined_name = spec if isinstance(spec, str) else spec["coll"]
+                nested = [] if isinstance(spec, str) else spec.get("pipeline", [])
+                size = db[joined_name].estimated_document_count()
+                cost += size + self.stages_cost(db, joined_name, nested, size)
+            elif name == "$facet":
+                for facet in spec.values():
+                    cost += self.stages_cost(db, collection, facet, rows)
+        return cost
+
+    @contextmanager
+    def turn(self) -> Iterator[None]:
+        """
+        Wait for one of the `MAX_CONCURRENT` turns to run a pipeline
+
+        Raises:
+            - PipelineRejected: If no turn frees up within `QUEUE_SECONDS`
+        """
+        if not self.slots.acquire(timeout=QUEUE_SECONDS):
+            raise PipelineRejected("The database is busy, try again shortly")
+        try:
+            yield
+        finally:
+            self.slots.release()
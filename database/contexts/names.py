@@ -0,0 +1,141 @@
+"""Fuzzy name index for resolving entities before writing a pipeline"""
+
+import bisect
+import re
+from collections import defaultdict
+from typing import Any, NamedTuple
+
+import numpy as np
+from pymongo.database import Database
+
+from database.contexts.partitions import prefix_of
+
+MIN_SCORE = 0.35  # Share of a query's trigrams an entity must have to match
+PREFIX_BONUS = 0.5  # Added when every query word starts a word of the entity
+
+
+class Entity(NamedTuple):
+    """A named document of a term"""
+
+    kind: str
+    id: str
+    name: str
+
+
+def words(text: str) -> list[str]:
+    """Split a name into lowercase words (ex. 'CSC-357' is ['csc', '357'])"""
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def trigrams(word: str) -> set[str]:
+    """Get the trigrams of a word, padded so that short words have some"""
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def term_entities(db: Database, term_id: str) -> list[Entity]:
+    """Get the instructors, courses, subjects and buildings of a term"""
+    query = {"term_id": term_id}
+    prefix = prefix_of(db, term_id)
+    entities = []
+    for doc in db[f"{prefix}instructors"].find(
+        query, {"first_middle_name": 1, "last_name": 1, "code": 1}
+    ):
+        name = f"{doc['first_middle_name']} {doc['last_name']}"
+        entities.append(Entity("instructor", doc["_id"], f"{name} ({doc['code']})"))
+    for doc in db[f"{prefix}courses"].find(query, {"code": 1, "name": 1}):
+        entities.append(Entity("course", doc["_id"], f"{doc['code']} {doc['name']}"))
+    for doc in db[f"{prefix}subjects"].find(query, {"code": 1, "name": 1}):
+        entities.append(Entity("subject", doc["_id"], f"{doc['code']} {doc['name']}"))
+    for doc in db[f"{prefix}buildings"].find(query, {"number": 1, "name": 1}):
+        entities.append(
+            Entity("building", doc["_id"], f"{doc['number']} {doc['name']}")
+        )
+    return entities
+
+
+class NameIndex:
+    """
+    Trigram and prefix index of the names of a term's entities
+
+    An entity matches a query by the share of the query's word trigrams its
+    name has, which tolerates typos (ex. 'khosmod' still shares most of
+    'khosmood'), with a bonus when every query word starts one of its words
+    (ex. 'foa' for 'Foaad'). Course codes are also indexed without their
+    dash, so 'CSC357' and 'csc 357' both find 'CSC-357'.
+    """
+
+    def __init__(self, db: Database, term_id: str) -> None:
+        """
+        Build the name index of a term
+
+        Args:
+            - db (Database): The database to read the entities from
+            - term_id (str): The term id
+        """
+        self.entities = term_entities(db, term_id)
+        self.kinds = np.array([entity.kind for entity in self.entities])
+        self.lengths = np.array([len(entity.name) for entity in self.entities])
+        postings: dict[str, list[int]] = defaultdict(list)
+        prefixes: list[tuple[str, int]] = []
+        for i, entity in enumerate(self.entities):
+            name_words = words(entity.name)
+            if entity.kind == "course" and len(name_words) >= 2:
+                name_words.append(name_words[0] + name_words[1])
+            for gram in set().union(*map(trigrams, name_words)):
+                postings[gram].append(i)
+            prefixes.extend((word, i) for word in set(name_words))
+        self.postings = {
+            g: np.array(ids, dtype=np.int32) for g, ids in postings.items()
+        }
+        prefixes.sort()
+        self.prefix_words = [word for word, _ in prefixes]
+        self.prefix_entities = np.array([i for _, i in prefixes], dtype=np.int32)
+
+    def starting_with(self, prefix: str) -> np.ndarray:
+        """Get the entities with a word that starts with a prefix"""
+        start = bisect.bisect_left(self.prefix_words, prefix)
+        end = bisect.bisect_left(self.prefix_words, prefix + "\x7f", start)
+        return np.unique(self.prefix_entities[start:end])
+
+    def search(
+        self, query: str, kinds: list[str] | None = None, limit: int = 5
+    ) -> list[dict[str, Any]]:
+        """
+        Find the entities whose names best match a query
+
+        Args:
+            - query (str): The name, possibly partial or misspelled (ex. 'foaad', 'CSC 357', 'pilling')
+            - kinds (list[str] | None): Only find these kinds ('instructor', 'course', 'subject', 'building')
+            - limit (int): The maximum number of entities to return
+
+        Returns:
+            - list[dict[str, Any]]: The `_id`, `kind`, `name` and `score` of the best matches, best first
+        """
+        query_words = words(query)
+        if not query_words or not self.entities:
+            return []
+        grams = set().union(*map(trigrams, query_words))
+        hits = [self.postings[g] for g in grams if g in self.postings]
+        scores = np.bincount(
+            np.concatenate(hits) if hits else np.empty(0, dtype=np.int32),
+            minlength=len(self.entities),
+        ) / len(grams)
+        prefixed = self.starting_with(query_words[0])
+        for word in query_words[1:]:
+            prefixed = np.intersect1d(prefixed, self.starting_with(word))
+        scores[prefixed] += PREFIX_BONUS
+        candidates = np.flatnonzero(scores >= MIN_SCORE)
+        if kinds is not None:
+            candidates = candidates[np.isin(self.kinds[candidates], kinds)]
+        # Best score first, then shortest name (the closest to the query)
+        order = np.lexsort((self.lengths[candidates], -scores[candidates]))
+        return [
+            {
+                "_id": self.entities[i].id,
+                "kind": self.entities[i].kind,
+                "name": self.entities[i].name,
+                "score": round(float(scores[i]), 3),
+            }
+            for i in candidates[order[:limit]]
+        ]
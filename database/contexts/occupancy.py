@@ -0,0 +1,166 @@
+"""Room occupancy matrices for free-room and utilization queries"""
+
+from typing import Any
+
+import numpy as np
+from pymongo.database import Database
+
+from database.contexts.partitions import prefix_of
+from database.contexts.schedules import section_mask
+from database.timeslots import DAYS, SLOT_MINUTES, SLOTS_PER_DAY, parse_time
+
+SLOTS_PER_WEEK = len(DAYS) * SLOTS_PER_DAY
+
+
+def mask_to_row(mask: int) -> np.ndarray:
+    """Unpack a weekly time mask into a boolean row of slots"""
+    raw = mask.to_bytes(SLOTS_PER_WEEK // 8, "little")
+    return np.unpackbits(np.frombuffer(raw, dtype=np.uint8), bitorder="little").view(
+        bool
+    )
+
+
+class OccupancyMatrix:
+    """
+    Room x time-slot occupancy of a term
+
+    Row `i` is `room_ids[i]` and column `j` is the `j`-th `SLOT_MINUTES`
+    slot of the week (starting Monday at midnight); a cell is set when a
+    section meets in the room during the slot.
+    """
+
+    def __init__(self, db: Database, term_id: str) -> None:
+        """
+        Build the occupancy matrix of a term
+
+        Args:
+            - db (Database): The database to read rooms and sections from
+            - term_id (str): The term id
+        """
+        self.term_id = term_id
+        prefix = prefix_of(db, term_id)
+        rooms = list(
+            db[f"{prefix}rooms"]
+            .find(
+                {"term_id": term_id},
+                {"building_id": 1, "number": 1, "registered_location_capacity": 1},
+            )
+            .sort("_id")
+        )
+        self.room_ids = [r["_id"] for r in rooms]
+        self.numbers = [r["number"] for r in rooms]
+        self.registered = [r["registered_location_capacity"] for r in rooms]
+        self.buildings = np.array([r["building_id"] for r in rooms], dtype=object)
+        self.capacities = np.array(
+            [capacity or 0 for capacity in self.registered], dtype=np.int32
+        )
+        index = {room_id: i for i, room_id in enumerate(self.room_ids)}
+        self.matrix = np.zeros((len(rooms), SLOTS_PER_WEEK), dtype=bool)
+        for section in db[f"{prefix}sections"].find(
+            {"term_id": term_id, "room_id": {"$in": self.room_ids}},
+            {"room_id": 1, "days": 1, "start": 1, "end": 1, "time_mask": 1},
+        ):
+            mask = section_mask(section)
+            if mask:
+                self.matrix[index[section["room_id"]]] |= mask_to_row(mask)
+
+    def columns(self, days: str, start: str, end: str) -> np.ndarray:
+        """
+        Get the slot columns of a time window on some days
+
+        Raises:
+            - ValueError: If the days or times are not valid, or the window is empty
+        """
+        days = days.upper()
+        if not days or any(day not in DAYS for day in days):
+            raise ValueError(
+                f"days must be one or more of the letters {DAYS} (ex. 'MWF'), not '{days}'"
+            )
+        first, last = parse_time(start), parse_time(end)
+        for text, minutes in ((start, first), (end, last)):
+            if minutes is None or minutes > 24 * 60:
+                raise ValueError(f"'{text}' is not a time like '02:00 PM'")
+        assert first is not None and last is not None
+        if first >= last:
+            raise ValueError(f"the window must start before it ends ({start}-{end})")
+        first, last = first // SLOT_MINUTES, -(-last // SLOT_MINUTES)
+        return np.concatenate(
+            [np.arange(first, last) + DAYS.index(day) * SLOTS_PER_DAY for day in days]
+        )
+
+    def selection(
+        self, building: str | None = None, min_capacity: int | None = None
+    ) -> np.ndarray:
+        """Get the rows of the rooms in a building with a minimum capacity"""
+        rows = np.ones(len(self.room_ids), dtype=bool)
+        if building is not None:
+            rows &= self.buildings == f"{self.term_id}-{building}"
+        if min_capacity is not None:
+            rows &= self.capacities >= min_capacity
+        return rows
+
+    def free_rooms(
+        self,
+        days: str,
+        start: str,
+        end: str,
+        building: str | None = None,
+        min_capacity: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Find the rooms that are free for a whole time window
+
+        Args:
+            - days (str): The days the room must be free (ex. 'T', 'MWF')
+            - start (str): The start of the window (ex. '02:00 PM')
+            - end (str): The end of the window (ex. '03:00 PM')
+            - building (str | None): The building number (ex. '014')
+            - min_capacity (int | None): The minimum registered capacity
+
+        Returns:
+            - list[dict[str, Any]]: The free rooms, largest first
+
+        Raises:
+            - ValueError: If the days or times are not valid, or the window is empty
+        """
+        busy = self.matrix[:, self.columns(days, start, end)].any(axis=1)
+        rows = np.flatnonzero(self.selection(building, min_capacity) & ~busy)
+        rows = rows[np.argsort(-self.capacities[rows], kind="stable")]
+        return [
+            {
+                "room_id": self.room_ids[i],
+                "number": self.numbers[i],
+                "registered_location_capacity": self.registered[i],
+            }
+            for i in rows
+        ]
+
+    def utilization(
+        self,
+        days: str = "MTWRF",
+        start: str = "08:00 AM",
+        end: str = "10:00 PM",
+        building: str | None = None,
+    ) -> dict[str, float]:
+        """
+        Get the share of a time window each building's rooms are in use
+
+        Args:
+            - days (str): The days of the window
+            - start (str): The start of the window on each day
+            - end (str): The end of the window on each day
+            - building (str | None): Only report this building (ex. '014')
+
+        Returns:
+            - dict[str, float]: The utilization (0 to 1) by building id
+
+        Raises:
+            - ValueError: If the days or times are not valid, or the window is empty
+        """
+        rows = self.selection(building)
+        used = self.matrix[np.ix_(rows, self.columns(days, start, end))].mean(axis=1)
+        buildings = self.buildings[rows]
+        return {
+            b: round(float(used[buildings == b].mean()), 4)
+            for b in sorted(set(buildings))
+        }
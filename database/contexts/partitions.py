@@ -0,0 +1,203 @@
+"""Hot and archive partitions of the scraped collections by term"""
+
+import time
+from typing import Any
+
+from pymongo.database import Database
+
+CURRENT = "current"
+FUTURE = "future"
+PAST = "past"
+
+# Past terms are moved from a collection to its `archive_` counterpart, so the
+# hot collections only hold the current and future terms
+ARCHIVE_PREFIX = "archive_"
+ARCHIVED_TERMS = "archived_terms"
+
+
+class SpansPartitions(ValueError):
+    """A pipeline that matches both archived and hot terms"""
+
+
+def classify_terms(
+    terms: list[dict], today: int | None = None
+) -> dict[str, list[dict]]:
+    """
+    Sort terms into refresh tiers by their dates
+
+    Terms that have ended are in the past. Of the others, the current term
+    is the one that started first (the term in session, or between terms the
+    next one to start, whose registration is open), and the rest are future
+    terms. The schedules site's `_curr` and `_next` urls are not used, as
+    stored urls keep pointing to them after the site moves on.
+
+    Args:
+        - terms (list[dict]): The terms to sort
+        - today (int | None): The date to sort them at, as YYYYMMDD (today if not provided)
+
+    Returns:
+        - dict[str, list[dict]]: The terms of each tier
+    """
+    if today is None:
+        today = int(time.strftime("%Y%m%d"))
+    tiers: dict[str, list[dict]] = {CURRENT: [], FUTURE: [], PAST: []}
+    for term in sorted(terms, key=lambda t: t["start"]):
+        if term["end"] < today:
+            tiers[PAST].append(term)
+        elif not tiers[CURRENT]:
+            tiers[CURRENT].append(term)
+        else:
+            tiers[FUTURE].append(term)
+    return tiers
+
+
+def archived(collection: str) -> str:
+    """Get the name of the archive collection of a collection"""
+    return f"{ARCHIVE_PREFIX}{collection}"
+
+
+def archived_terms(db: Database) -> set[str]:
+    """Get the terms whose documents are in the archive collections"""
+    return {t["_id"] for t in db[ARCHIVED_TERMS].find({}, {"_id": 1})}
+
+
+def prefix_of(db: Database, term_id: str) -> str:
+    """Get the prefix of the collections that hold a term's documents"""
+    return ARCHIVE_PREFIX if db[ARCHIVED_TERMS].find_one({"_id": term_id}) else ""
+
+
+def move_terms(
+    db: Database, collections: list[str], terms: list[str], archive: bool = True
+) -> dict[str, int]:
+    """
+    Move the documents of some terms to the archive collections, or back
+
+    The documents are copied on the server with `$merge`, then the terms are
+    marked as archived (or not) before the copies they left are removed, so
+    readers that follow the marks always find the documents.
+
+    Args:
+        - db (Database): The database to move the documents in
+        - collections (list[str]): The partitioned collections
+        - terms (list[str]): The terms to move
+        - archive (bool): Whether to move the terms to the archive (or back to the hot collections)
+
+    Returns:
+        - dict[str, int]: The number of documents moved per collection
+    """
+    query = {"term_id": {"$in": terms}}
+    pairs = [(c, archived(c)) if archive else (archived(c), c) for c in collections]
+    for source, target in pairs:
+        db[source].aggregate(
+            [
+                {"$match": query},
+                {
+                    "$merge": {
+                        "into": target,
+                        "on": "_id",
+                        "whenMatched": "replace",
+                        "whenNotMatched": "insert",
+                    }
+                },
+            ]
+        )
+    if archive:
+        for term in terms:
+            db[ARCHIVED_TERMS].replace_one(
+                {"_id": term},
+                {"term_id": term, "archived_at": time.time()},
+                upsert=True,
+            )
+    else:
+        db[ARCHIVED_TERMS].delete_many({"_id": {"$in": terms}})
+    return {
+        collection: db[source].delete_many(query).deleted_count
+        for collection, (source, _) in zip(collections, pairs)
+    }
+
+
+def targeted_terms(pipeline: list[dict]) -> set[str] | None:
+    """
+    Get the terms the leading `$match` stages of a pipeline restrict it to
+
+    Returns:
+        - set[str] | None: The terms (None if the pipeline is not restricted by `term_id`)
+    """
+    terms: set[str] | None = None
+    for stage in pipeline:
+        if not isinstance(stage, dict) or "$match" not in stage:
+            break
+        match = stage["$match"]
+        conditions = [match, *match.get("$and", [])] if isinstance(match, dict) else []
+        for condition in conditions:
+            value = (
+                condition.get("term_id", None) if isinstance(condition, dict) else None
+            )
+            if isinstance(value, dict) and set(value) == {"$eq"}:
+                value = value["$eq"]
+            if isinstance(value, str):
+                named = {value}
+            elif isinstance(value, dict) and set(value) == {"$in"}:
+                named = {v for v in value["$in"] if isinstance(v, str)}
+            else:
+                continue
+            terms = named if terms is None else terms & named
+    return terms
+
+
+def to_archive(value: Any, collections: list[str]) -> Any:
+    """Point a pipeline's joins on partitioned collections to their archives"""
+    if isinstance(value, list):
+        return [to_archive(v, collections) for v in value]
+    if not isinstance(value, dict):
+        return value
+    routed = {}
+    for key, spec in value.items():
+        if key in ("$lookup", "$unionWith") and isinstance(spec, str):
+            spec = archived(spec) if spec in collections else spec
+        elif key in ("$lookup", "$unionWith", "$facet"):
+            spec = {
+                k: (
+                    archived(v)
+                    if k in ("from", "coll") and v in collections
+                    else to_archive(v, collections)
+                )
+                for k, v in spec.items()
+            }
+        routed[key] = spec
+    return routed
+
+
+def route(
+    collection: str,
+    pipeline: list[dict],
+    archived_set: set[str],
+    collections: list[str],
+) -> tuple[str, list[dict]]:
+    """
+    Get the collection and pipeline that answer a pipeline \\
+    A pipeline only runs on the archive when its leading `$match` restricts
+    it to archived terms; every other pipeline runs on the hot collections
+
+    Args:
+        - collection (str): The collection the pipeline was written for
+        - pipeline (list[dict]): The pipeline
+        - archived_set (set[str]): The archived terms
+        - collections (list[str]): The partitioned collections
+
+    Returns:
+        - tuple[str, list[dict]]: The collection and pipeline to run
+
+    Raises:
+        - SpansPartitions: If the pipeline matches both archived and hot terms
+    """
+    terms = targeted_terms(pipeline) if collection in collections else None
+    if not terms or not terms & archived_set:
+        return collection, pipeline
+    if not terms <= archived_set:
+        raise SpansPartitions(
+            f"Past terms ({', '.join(sorted(terms & archived_set))}) are stored"
+            f" apart from current ones ({', '.join(sorted(terms - archived_set))});"
+            " query them in separate pipelines"
+        )
+    return archived(collection), to_archive(pipeline, collections)
@@ -0,0 +1,276 @@
+"""Slow pipeline profiler and index suggestions for the query path"""
+
+import atexit
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Iterator
+
+from pymongo.database import Database
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+QUERY_LOG = "query_log"
+QUERY_LOG_BYTES = 16 * 1024 * 1024  # Size of the capped log collection
+SLOW_SECONDS = 0.1  # Pipelines slower than this are explained
+FLUSH_SECONDS = 1.0  # How often queued log entries are written
+MAX_PENDING = 10000  # Queued log entries kept while the log cannot be written
+
+# Match operators that select an exact value (others select a range)
+EQUALITY_OPS = {"$eq", "$in"}
+
+
+def match_fields(match: dict, equality: set[str], ranges: set[str]) -> None:
+    """Collect the fields a `$match` document filters on"""
+    for key, value in match.items():
+        if key in ("$and", "$or", "$nor"):
+            for clause in value:
+                match_fields(clause, equality, ranges)
+        elif key.startswith("$"):
+            continue  # `$expr`, `$text`, ... cannot be served by a plain index
+        elif isinstance(value, dict) and any(k.startswith("$") for k in value):
+            if set(value) <= EQUALITY_OPS:
+                equality.add(key)
+            else:
+                ranges.add(key)
+        else:
+            equality.add(key)
+
+
+def predicates(collection: str, pipeline: list[dict]) -> list[dict[str, Any]]:
+    """
+    Get the index-relevant predicates of a pipeline
+
+    Only the `$match` and `$sort` stages at the start of the pipeline run
+    against the collection, so only those can use its indexes. Each
+    `$lookup` is an equality predicate on its joined collection.
+
+    Args:
+        - collection (str): The collection the pipeline runs on
+        - pipeline (list[dict]): The pipeline
+
+    Returns:
+        - list[dict[str, Any]]: The `collection`, `equality`, `range` and `sort` fields of each predicate
+    """
+    equality: set[str] = set()
+    ranges: set[str] = set()
+    sort: list[str] = []
+    for stage in pipeline:
+        if "$match" in stage and not sort:
+            match_fields(stage["$match"], equality, ranges)
+        elif "$sort" in stage and not sort:
+            sort = [field for field in stage["$sort"] if not field.startswith("$")]
+        else:
+            break
+    found = []
+    if equality or ranges or sort:
+        found.append(
+            {
+                "collection": collection,
+                "equality": sorted(equality),
+                "range": sorted(ranges - equality),
+                "sort": sort,
+            }
+        )
+    for stage in pipeline:
+        lookup = stage.get("$lookup", None)
+        if isinstance(lookup, dict) and "foreignField" in lookup:
+            found.append(
+                {
+                    "collection": lookup["from"],
+                    "equality": [lookup["foreignField"]],
+                    "range": [],
+                    "sort": [],
+                }
+            )
+    return found
+
+
+def plan_stages(explain: Any) -> Iterator[str]:
+    """Get the names of all plan stages in an explain result"""
+    if isinstance(explain, dict):
+        if isinstance(explain.get("stage", None), str):
+            yield explain["stage"]
+        for value in explain.values():
+            yield from plan_stages(value)
+    elif isinstance(explain, list):
+        for value in explain:
+            yield from plan_stages(value)
+
+
+def explain(db: Database, collection: str, pipeline: list[dict]) -> list[str]:
+    """Get the plan stages of a pipeline (empty if it cannot be explained)"""
+    try:
+        result = db.command(
+            {
+                "explain": {
+                    "aggregate": collection,
+                    "pipeline": pipeline,
+                    "cursor": {},
+                },
+                "verbosity": "queryPlanner",
+            }
+        )
+    except PyMongoError:
+        return []
+    return list(plan_stages(result))
+
+
+class QueryProfiler:
+    """
+    Times the pipelines run for the assistant
+
+    Every pipeline's time and predicates are logged to a capped collection
+    in the meta database. Pipelines slower than `slow_seconds` are also
+    explained, and a warning is printed when the plan scans a whole
+    collection. Pipelines are only queued on the query path; a background
+    thread explains and logs them every `flush_seconds`.
+    """
+
+    def __init__(
+        self,
+        meta: Database,
+        slow_seconds: float = SLOW_SECONDS,
+        flush_seconds: float = FLUSH_SECONDS,
+    ) -> None:
+        """
+        Initialize the query profiler and start its log writer
+
+        Args:
+            - meta (Database): The meta database to log to
+            - slow_seconds (float): The time after which a pipeline is explained
+            - flush_seconds (float): How often queued pipelines are logged
+        """
+        self.meta = meta
+        self.slow_seconds = slow_seconds
+        self.flush_seconds = flush_seconds
+        self.pending: list[tuple[Database, str, list[dict], float, float]] = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        try:
+            meta.create_collection(QUERY_LOG, capped=True, size=QUERY_LOG_BYTES)
+        except CollectionInvalid:
+            pass  # Already created (possibly by another process just now)
+        self.writer = threading.Thread(target=self._run, daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def record(
+        self, db: Database, collection: str, pipeline: list[dict], seconds: float
+    ) -> None:
+        """
+        Queue a pipeline that was run to be logged (and explained if it was slow)
+
+        Args:
+            - db (Database): The database the pipeline ran on
+            - collection (str): The collection the pipeline ran on
+            - pipeline (list[dict]): The pipeline
+            - seconds (float): How long the pipeline took
+        """
+        with self.lock:
+            if len(self.pending) >= MAX_PENDING:
+                self.pending.pop(0)
+            self.pending.append((db, collection, pipeline, seconds, time.time()))
+
+    def flush(self) -> None:
+        """Explain the queued slow pipelines and log all queued pipelines"""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        entries = []
+        for db, collection, pipeline, seconds, at in pending:
+            stages: list[str] = []
+            if seconds >= self.slow_seconds:
+                stages = explain(db, collection, pipeline)
+                if "COLLSCAN" in stages:
+                    print(
+                        f"Warning (Query): {collection} pipeline took {seconds:.3f}s"
+                        f" with a collection scan: {pipeline}",
+                        file=sys.stderr,
+                    )
+            entries.append(
+                {
+                    "at": at,
+                    "database": db.name,
+                    "collection": collection,
+                    "seconds": seconds,
+                    "slow": seconds >= self.slow_seconds,
+                    "collscan": "COLLSCAN" in stages,
+                    "predicates": predicates(collection, pipeline),
+                }
+            )
+        if not entries:
+            return
+        try:
+            self.meta[QUERY_LOG].insert_many(entries, ordered=False)
+        except PyMongoError as e:
+            print(
+                f"Warning (Query): could not log {len(entries)} pipelines: {e}",
+                file=sys.stderr,
+            )
+
+    def close(self) -> None:
+        """Stop the log writer, logging the pipelines still queued"""
+        self.stopped.set()
+        self.writer.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.flush_seconds):
+            self.flush()
+
+
+def index_key(predicate: dict[str, Any]) -> tuple[str, ...]:
+    """Get the index key that serves a predicate (equality, sort, then range fields)"""
+    key: list[str] = []
+    for field in (*predicate["equality"], *predicate["sort"], *predicate["range"]):
+        if field not in key:
+            key.append(field)
+    return tuple(key)
+
+
+def is_served(key: tuple[str, ...], indexes: list[tuple[str, ...]]) -> bool:
+    """Whether an existing index can narrow a predicate down by its leading field"""
+    return any(index and index[0] in key for index in indexes)
+
+
+def suggest_indexes(meta: Database, db: Database, since: float = 0.0) -> list[dict]:
+    """
+    Suggest indexes for the logged predicates no existing index serves
+
+    Args:
+        - meta (Database): The meta database with the query log
+        - db (Database): The database to check the existing indexes of
+        - since (float): Only consider pipelines logged after this timestamp
+
+    Returns:
+        - list[dict]: The suggested `collection` and `key`, with how many logged pipelines (`count`, `slow`, `collscan`) and `seconds` in total it would serve, most time first
+    """
+    stats: dict[tuple[str, tuple[str, ...]], dict] = defaultdict(
+        lambda: {"count": 0, "slow": 0, "collscan": 0, "seconds": 0.0}
+    )
+    for entry in meta[QUERY_LOG].find({"at": {"$gte": since}}):
+        for predicate in entry["predicates"]:
+            key = index_key(predicate)
+            if predicate["collection"] != entry["collection"]:
+                stat = stats[(predicate["collection"], key)]
+                stat["count"] += 1
+                continue
+            stat = stats[(entry["collection"], key)]
+            stat["count"] += 1
+            stat["slow"] += entry["slow"]
+            stat["collscan"] += entry["collscan"]
+            stat["seconds"] += entry["seconds"]
+
+    existing: dict[str, list[tuple[str, ...]]] = {}
+    suggestions = []
+    for (collection, key), stat in stats.items():
+        if collection not in existing:
+            info = db[collection].index_information()
+            existing[collection] = [
+                tuple(field for field, _ in index["key"]) for index in info.values()
+            ]
+        if is_served(key, existing[collection]):
+            continue
+        suggestions.append({"collection": collection, "key": list(key), **stat})
+    suggestions.sort(key=lambda s: (-s["seconds"], -s["count"]))
+    return suggestions
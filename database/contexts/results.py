@@ -0,0 +1,147 @@
+"""Bounded, compact serialization of pipeline results for the assistant"""
+
+import json
+import re
+from typing import Any, Iterable
+
+MAX_ROWS = 50  # Documents returned before a result is truncated
+MAX_BYTES = 16 * 1024  # Serialized size returned before a result is truncated
+SCAN_LIMIT = 5000  # Documents read to summarize a truncated result
+MAX_DISTINCT = 20  # Distinct values tracked per field in a summary
+
+# Long fields the assistant rarely needs, dropped unless a pipeline names them
+BULKY_FIELDS = (
+    "url",
+    "ics_download_url",
+    "schedule_url",
+    "catalog_url",
+    "requirement_message",
+    "requirement_messages",
+)
+
+
+def requested_fields(pipeline: list[dict]) -> set[str]:
+    """Get the bulky fields a pipeline names (ex. in a `$project` or as `$url`)"""
+    text = json.dumps(pipeline)
+    return {f for f in BULKY_FIELDS if re.search(rf'["$.]{f}"', text)}
+
+
+def strip(value: Any, dropped: set[str], omitted: set[str]) -> Any:
+    """Drop fields from a document and the documents nested in it"""
+    if isinstance(value, dict):
+        omitted.update(dropped.intersection(value))
+        return {
+            k: strip(v, dropped, omitted) for k, v in value.items() if k not in dropped
+        }
+    if isinstance(value, list):
+        return [strip(v, dropped, omitted) for v in value]
+    return value
+
+
+def compact(doc: Any) -> str:
+    """Serialize a document without whitespace"""
+    return json.dumps(doc, separators=(",", ":"), default=str)
+
+
+class FieldStats:
+    """Summary of the values of each top-level field of some documents"""
+
+    def __init__(self) -> None:
+        self.present: dict[str, int] = {}
+        self.values: dict[str, set[str]] = {}
+        self.ranges: dict[str, tuple[float, float]] = {}
+
+    def add(self, doc: dict) -> None:
+        """Count a document's fields"""
+        for field, value in doc.items():
+            if value is None:
+                continue
+            self.present[field] = self.present.get(field, 0) + 1
+            values = self.values.setdefault(field, set())
+            if len(values) <= MAX_DISTINCT:
+                values.add(compact(value))
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                low, high = self.ranges.get(field, (value, value))
+                self.ranges[field] = (min(low, value), max(high, value))
+
+    def summary(self) -> dict[str, dict[str, Any]]:
+        """Get the number of documents with each field and its distinct values"""
+        stats = {}
+        for field, present in self.present.items():
+            values = self.values[field]
+            stat: dict[str, Any] = {"present": present}
+            if len(values) > MAX_DISTINCT:
+                stat["distinct"] = f"{MAX_DISTINCT}+"
+            else:
+                stat["distinct"] = len(values)
+            if field in self.ranges:
+                stat["min"], stat["max"] = self.ranges[field]
+            elif len(values) <= 5:
+                stat["values"] = [json.loads(v) for v in sorted(values)]
+            stats[field] = stat
+        return stats
+
+
+def serialize(
+    docs: Iterable[dict],
+    pipeline: list[dict],
+    max_rows: int = MAX_ROWS,
+    max_bytes: int = MAX_BYTES,
+) -> str:
+    """
+    Serialize a pipeline's documents as they are read, within a budget
+
+    Bulky fields are dropped unless the pipeline names them. If the documents
+    exceed `max_rows` or `max_bytes`, only the first ones are returned along
+    with a summary of the result (up to `SCAN_LIMIT` documents are read for
+    it), so the assistant can narrow its pipeline.
+
+    Args:
+        - docs (Iterable[dict]): The documents, usually a cursor
+        - pipeline (list[dict]): The pipeline that produced them
+        - max_rows (int): The maximum number of documents to return
+        - max_bytes (int): The maximum size of the returned documents
+
+    Returns:
+        - str: The compact JSON (a list of documents, or a summary object with the first documents if truncated)
+    """
+    dropped = set(BULKY_FIELDS) - requested_fields(pipeline)
+    omitted: set[str] = set()
+    rows: list[str] = []
+    size = 0
+    stats = FieldStats()
+    read = 0
+    truncated = False
+    for doc in docs:
+        doc = strip(doc, dropped, omitted)
+        read += 1
+        stats.add(doc)
+        if truncated:
+            if read >= SCAN_LIMIT:
+                return summarize(rows, read, False, stats, omitted)
+            continue
+        row = compact(doc)
+        if len(rows) >= max_rows or size + len(row) > max_bytes:
+            truncated = True
+            continue
+        rows.append(row)
+        size += len(row) + 1
+    if not truncated:
+        return f"[{','.join(rows)}]"
+    return summarize(rows, read, True, stats, omitted)
+
+
+def summarize(
+    rows: list[str], read: int, complete: bool, stats: FieldStats, omitted: set[str]
+) -> str:
+    """Serialize a truncated result with a summary of all its documents"""
+    summary = {
+        "truncated": True,
+        "total": read if complete else f"{read}+",
+        "returned": len(rows),
+        "omitted_fields": sorted(omitted),
+        "field_stats": stats.summary(),
+        "hint": "Narrow the pipeline with $match, $project, $group or $limit stages to see the rest",
+    }
+    text = compact(summary)
+    return f'{text[:-1]},"documents":[{",".join(rows)}]}}'
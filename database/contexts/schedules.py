@@ -0,0 +1,271 @@
+"""Conflict-free schedule builder"""
+
+import re
+from typing import Any, NamedTuple
+
+from pymongo.database import Database
+
+from database.contexts.partitions import prefix_of
+from database.timeslots import (
+    SLOT_MINUTES,
+    SLOTS_PER_DAY,
+    DAYS,
+    from_hex,
+    mask_days,
+    parse_time,
+    time_mask,
+    window_mask,
+)
+
+# Section fields returned with a schedule, and those of each of its meetings
+SECTION_FIELDS = (
+    "alias",
+    "code",
+    "type",
+    "instructor_id",
+    "enrollment_capacity",
+    "enrolled",
+    "waitlisted",
+)
+MEETING_FIELDS = ("days", "start", "end", "room_id")
+
+alias_number_re = r"-([0-9]+)$"
+
+
+class Option(NamedTuple):
+    """A way to take one course: its sections that must be taken together"""
+
+    course: str
+    mask: int
+    sections: list[dict]
+
+
+def section_mask(section: dict) -> int:
+    """Get a section meeting's mask, from the stored field if present"""
+    if "time_mask" in section:
+        return from_hex(section["time_mask"])
+    return time_mask(section["days"], section["start"], section["end"]) or 0
+
+
+def alias_number(alias: str) -> int:
+    """Get the section number of an alias (ex. 'CSC-357-03' is 3)"""
+    match = re.search(alias_number_re, alias)
+    return int(match.group(1)) if match else 0
+
+
+def has_seats(section: dict) -> bool:
+    """Whether a section has open seats (unknown enrollment counts as open)"""
+    capacity, enrolled = section["enrollment_capacity"], section["enrolled"]
+    return capacity is None or enrolled is None or enrolled < capacity
+
+
+def course_options(course: str, meetings: list[dict]) -> list[Option]:
+    """
+    Get the ways to take a course
+
+    A section may meet at several times (one document per meeting), so
+    meetings are first combined per section code. When a course has lectures
+    and other components (e.g., labs), each component section is paired with
+    the lecture numbered right before it (ex. 'CSC-357-02' lab with
+    'CSC-357-01' lecture), otherwise every section is an option on its own.
+    """
+    sections: dict[str, dict] = {}
+    for meeting in meetings:
+        section = sections.get(meeting["code"], None)
+        if section is None:
+            section = sections[meeting["code"]] = {
+                **{k: meeting[k] for k in SECTION_FIELDS},
+                "meetings": [],
+                "mask": 0,
+            }
+        section["meetings"].append({k: meeting[k] for k in MEETING_FIELDS})
+        section["mask"] |= section_mask(meeting)
+    ordered = sorted(sections.values(), key=lambda s: alias_number(s["alias"]))
+    lectures = [s for s in ordered if s["type"] == "Lecture"]
+    others = [s for s in ordered if s["type"] != "Lecture"]
+    if not lectures or not others:
+        return [Option(course, s["mask"], [s]) for s in ordered]
+    options = []
+    for other in others:
+        number = alias_number(other["alias"])
+        preceding = [lec for lec in lectures if alias_number(lec["alias"]) < number]
+        lecture = preceding[-1] if preceding else lectures[0]
+        if lecture["mask"] & other["mask"]:
+            continue
+        options.append(
+            Option(course, lecture["mask"] | other["mask"], [lecture, other])
+        )
+    return options
+
+
+def bound_minutes(text: str | None) -> int | None:
+    """
+    Parse an optional time bound
+
+    Raises:
+        - ValueError: If the time is not like '09:00 AM'
+    """
+    if not text:
+        return None
+    minutes = parse_time(text)
+    if minutes is None or minutes > 24 * 60:
+        raise ValueError(f"'{text}' is not a time like '09:00 AM'")
+    return minutes
+
+
+def gap_minutes(mask: int) -> int:
+    """Get the total idle time between classes on the days of a schedule"""
+    gaps = 0
+    full_day = (1 << SLOTS_PER_DAY) - 1
+    for day in range(len(DAYS)):
+        slots = mask >> (day * SLOTS_PER_DAY) & full_day
+        if slots:
+            span = slots.bit_length() - (slots & -slots).bit_length() + 1
+            gaps += span - bin(slots).count("1")
+    return gaps * SLOT_MINUTES
+
+
+class ScheduleBuilder:
+    """
+    Enumerates conflict-free combinations of sections
+
+    Every section carries a weekly bitmask of its meeting times, so a
+    combination conflicts exactly when two masks share a bit. Courses are
+    searched depth first, fewest options first, and a branch is pruned as
+    soon as its next option overlaps the times already taken.
+    """
+
+    def __init__(
+        self, db: Database, max_explored: int = 20000, max_visited: int = 200000
+    ) -> None:
+        """
+        Initialize the schedule builder
+
+        Args:
+            - db (Database): The database to read sections from
+            - max_explored (int): The maximum number of complete schedules to rank
+            - max_visited (int): The maximum number of options tried, conflicting or not
+        """
+        self.db = db
+        self.max_explored = max_explored
+        self.max_visited = max_visited
+
+    def build(
+        self,
+        term_id: str,
+        courses: list[str],
+        earliest_start: str | None = None,
+        latest_end: str | None = None,
+        days_off: str = "",
+        open_only: bool = False,
+        limit: int = 5,
+    ) -> dict[str, Any]:
+        """
+        Build ranked conflict-free schedules
+
+        Schedules are ranked by the number of days on campus, then the idle
+        time between classes.
+
+        Args:
+            - term_id (str): The term id (ex. '2242')
+            - courses (list[str]): The course codes (ex. ['CSC-357', 'MATH-248'])
+            - earliest_start (str | None): No class may start before this time (ex. '09:00 AM')
+            - latest_end (str | None): No class may end after this time (ex. '05:00 PM')
+            - days_off (str): Days with no classes at all (ex. 'F')
+            - open_only (bool): Only use sections with open seats
+            - limit (int): The maximum number of schedules to return
+
+        Returns:
+            - dict[str, Any]: The ranked `schedules`, and per course (or `*` for all of them) any `problems` that made it impossible or cut the search short
+
+        Raises:
+            - ValueError: If a time or a day off is not valid
+        """
+        earliest = bound_minutes(earliest_start)
+        latest = bound_minutes(latest_end)
+        days_off = days_off.upper()
+        if any(day not in DAYS for day in days_off):
+            raise ValueError(
+                f"days_off must be letters of {DAYS} (ex. 'F'), not '{days_off}'"
+            )
+        codes = [c.strip().upper().replace(" ", "-") for c in courses]
+        course_ids = {f"{term_id}-{code}": code for code in codes}
+        meetings: dict[str, list[dict]] = {code: [] for code in codes}
+        fields = (*SECTION_FIELDS, *MEETING_FIELDS, "course_id", "time_mask")
+        projection = {k: 1 for k in fields}
+        sections = self.db[f"{prefix_of(self.db, term_id)}sections"]
+        for meeting in sections.find(
+            {"course_id": {"$in": list(course_ids)}}, projection
+        ):
+            meetings[course_ids[meeting["course_id"]]].append(meeting)
+
+        blocked = window_mask(earliest, latest, days_off)
+        problems: dict[str, str] = {}
+        choices: list[list[Option]] = []
+        for code in codes:
+            if not meetings[code]:
+                problems[code] = "no sections are offered this term"
+                continue
+            options = [
+                o
+                for o in course_options(code, meetings[code])
+                if not o.mask & blocked
+                and (not open_only or all(has_seats(s) for s in o.sections))
+            ]
+            if not options:
+                problems[code] = "no sections fit the constraints"
+                continue
+            choices.append(options)
+        if problems:
+            return {"schedules": [], "problems": problems}
+
+        choices.sort(key=len)
+        found: list[tuple[int, list[Option]]] = []
+        stack: list[Option] = []
+        visited = 0
+
+        def search(depth: int, taken: int) -> None:
+            nonlocal visited
+            if len(found) >= self.max_explored:
+                return
+            if depth == len(choices):
+                found.append((taken, list(stack)))
+                return
+            for option in choices[depth]:
+                # Conflicting options are pruned, but still cost a visit
+                visited += 1
+                if visited > self.max_visited:
+                    return
+                if option.mask & taken:
+                    continue
+                stack.append(option)
+                search(depth + 1, taken | option.mask)
+                stack.pop()
+
+        search(0, 0)
+        if visited > self.max_visited:
+            problems["*"] = "too many combinations of sections to search; " + (
+                "the schedules are the best of those found before stopping"
+                if found
+                else "add constraints (e.g. days_off, open_only) or fewer courses"
+            )
+        elif not found:
+            problems["*"] = "every combination of sections has a conflict"
+        if not found:
+            return {"schedules": [], "problems": problems}
+        found.sort(key=lambda f: (len(mask_days(f[0])), gap_minutes(f[0])))
+        return {
+            "schedules": [
+                {
+                    "days": mask_days(taken),
+                    "gap_minutes": gap_minutes(taken),
+                    "sections": [
+                        {k: v for k, v in s.items() if k != "mask"}
+                        for option in options
+                        for s in option.sections
+                    ],
+                }
+                for taken, options in found[:limit]
+            ],
+            "problems": problems,
+        }
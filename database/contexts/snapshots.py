@@ -0,0 +1,292 @@
+"""Compressed, checksummed snapshots of a database version"""
+
+import gzip
+import hashlib
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import bson
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from database.contexts.database import ARCHIVES, COLLECTIONS, DB, VIEWS
+from database.contexts.delta import BATCH_SIZE, GENERATIONS, HASHES, digest, term_of
+from database.contexts.partitions import ARCHIVED_TERMS
+from database.contexts.views import SECTION_DETAILS
+
+MANIFEST = "manifest.json"
+FORMAT = 1
+
+# Collections kept in a snapshot (the content hashes keep the next incremental
+# scrape of an imported version incremental)
+SNAPSHOT_COLLECTIONS = [*COLLECTIONS, *VIEWS, *ARCHIVES, ARCHIVED_TERMS, HASHES]
+
+
+class SnapshotError(Exception):
+    """A snapshot that is damaged or does not match its manifest"""
+
+
+def term_field(collection: str) -> str:
+    """Get the field that holds the term of a collection's documents"""
+    return "_id" if collection == "terms" else "term_id"
+
+
+def summarize(collection: str, docs: list[dict[str, Any]]) -> dict[str, dict]:
+    """
+    Get the document count and content hash of each term of a collection \\
+    The hash does not depend on the order of the documents
+
+    Returns:
+        - dict[str, dict]: The `count` and `hash` of each term
+    """
+    digests: dict[str, list[str]] = {}
+    for doc in docs:
+        digests.setdefault(term_of(collection, doc), []).append(digest(doc))
+    return {
+        term: {
+            "count": len(hashes),
+            "hash": hashlib.sha256("\n".join(sorted(hashes)).encode()).hexdigest(),
+        }
+        for term, hashes in digests.items()
+    }
+
+
+def dump_collection(db: Database, collection: str) -> tuple[bytes, dict]:
+    """Get the gzipped BSON of a collection and its manifest entry"""
+    docs = list(db[collection].find())
+    data = b"".join(bson.encode(doc) for doc in docs)
+    entry = {
+        "count": len(docs),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "terms": summarize(collection, docs),
+    }
+    return gzip.compress(data, compresslevel=6), entry
+
+
+def export_snapshot(database: DB, path: str | None = None, workers: int = 4) -> str:
+    """
+    Export the served (or pinned) version to a snapshot archive
+
+    The archive is a zip of gzipped BSON files, one per collection (the
+    layout of `mongodump --gzip`), and a manifest with the version's stamp
+    and each collection's checksum and per-term counts and content hashes.
+    Collections are read and compressed in parallel.
+
+    Args:
+        - database (DB): The database to export
+        - path (str | None): The archive to write (named after the version and generation if not provided)
+        - workers (int): The number of collections read at once
+
+    Returns:
+        - str: The path of the archive
+    """
+    name, generation, refreshed_at = database.stamp()
+    db = database.client[name]
+    if path is None:
+        exported = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join("snapshots", f"{name}_g{generation}_{exported}.zip")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    existing = set(db.list_collection_names())
+    collections = [c for c in SNAPSHOT_COLLECTIONS if c in existing]
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        dumps = dict(
+            zip(collections, pool.map(lambda c: dump_collection(db, c), collections))
+        )
+    manifest = {
+        "format": FORMAT,
+        "database": name,
+        "generation": generation,
+        "refreshed_at": refreshed_at,
+        "exported_at": time.time(),
+        "collections": {c: entry for c, (_, entry) in dumps.items()},
+    }
+    partial = f"{path}.partial"
+    with zipfile.ZipFile(partial, "w", zipfile.ZIP_STORED) as archive:
+        for collection, (data, _) in dumps.items():
+            archive.writestr(f"{collection}.bson.gz", data)
+        archive.writestr(MANIFEST, json.dumps(manifest, indent=2))
+    os.replace(partial, path)
+    return path
+
+
+def read_source(source: str) -> tuple[dict[str, bytes], dict | None]:
+    """
+    Read the collections of a snapshot archive or of a `mongodump` directory
+
+    Args:
+        - source (str): A snapshot archive, or a directory of `.bson` or `.bson.gz` files
+
+    Returns:
+        - tuple[dict[str, bytes], dict | None]: The BSON of each collection, and the manifest (None for a `mongodump` directory)
+    """
+    if os.path.isdir(source):
+        files = {}
+        for name in os.listdir(source):
+            with open(os.path.join(source, name), "rb") as f:
+                files[name] = f.read()
+    else:
+        with zipfile.ZipFile(source) as archive:
+            files = {name: archive.read(name) for name in archive.namelist()}
+        if MANIFEST not in files:
+            raise SnapshotError(f"{source} has no {MANIFEST}")
+    data = {}
+    for collection in SNAPSHOT_COLLECTIONS:
+        if f"{collection}.bson.gz" in files:
+            data[collection] = gzip.decompress(files[f"{collection}.bson.gz"])
+        elif f"{collection}.bson" in files:
+            data[collection] = files[f"{collection}.bson"]
+    if MANIFEST not in files:
+        return data, None
+    manifest = json.loads(files[MANIFEST])
+    if manifest.get("format") != FORMAT:
+        raise SnapshotError(f"{source} has unknown format {manifest.get('format')}")
+    for collection, entry in manifest["collections"].items():
+        if collection not in data:
+            raise SnapshotError(f"{collection} is missing from {source}")
+        if hashlib.sha256(data[collection]).hexdigest() != entry["sha256"]:
+            raise SnapshotError(f"{collection} does not match its checksum")
+    return data, manifest
+
+
+def verify(db: Database, expected: dict[str, dict[str, dict]]) -> list[str]:
+    """
+    Compare the imported documents of each term with the snapshot's
+
+    Args:
+        - db (Database): The database imported into
+        - expected (dict[str, dict[str, dict]]): The `count` and `hash` of each term of each collection
+
+    Returns:
+        - list[str]: The mismatches found (empty if the import is complete)
+    """
+    problems = []
+    for collection, terms in expected.items():
+        query = {term_field(collection): {"$in": list(terms)}}
+        stored = summarize(collection, list(db[collection].find(query)))
+        for term, entry in terms.items():
+            found = stored.get(term, {"count": 0, "hash": None})
+            if found["count"] != entry["count"]:
+                problems.append(
+                    f"{collection} of {term}: {found['count']} documents imported,"
+                    f" {entry['count']} expected"
+                )
+            elif found["hash"] != entry["hash"]:
+                problems.append(f"{collection} of {term}: content hash mismatch")
+    return problems
+
+
+def failure_message(error: OperationFailure) -> str:
+    """Describe why a server-side write failed"""
+    if isinstance(error, BulkWriteError):
+        errors = error.details.get("writeErrors", [])
+        if errors:
+            return f"{len(errors)} documents failed, e.g. {errors[0].get('errmsg')}"
+    return str(error.details.get("errmsg", error) if error.details else error)
+
+
+def insert_batch(db: Database, collection: str, docs: list[dict]) -> None:
+    """
+    Insert a batch of a snapshot's documents
+
+    Raises:
+        - SnapshotError: If the batch could not be inserted, naming its collection and terms
+    """
+    try:
+        db[collection].insert_many(docs, ordered=False, bypass_document_validation=True)
+    except OperationFailure as e:
+        terms = ", ".join(sorted({term_of(collection, doc) for doc in docs}))
+        raise SnapshotError(
+            f"inserting {collection} of term(s) {terms} failed: {failure_message(e)}"
+        ) from e
+
+
+def import_snapshot(
+    database: DB, source: str, terms: list[str] | None = None, workers: int = 4
+) -> list[str]:
+    """
+    Import a snapshot into a new version, which is not served until promoted
+
+    Documents are bulk inserted in parallel into a staged version without
+    indexes, which are built afterward, then each term's documents are
+    checked against the snapshot's counts and content hashes. When only some
+    terms are imported, the served version's other terms are copied on the
+    server, so the new version can replace it.
+
+    Args:
+        - database (DB): The database client (its staged version is imported into)
+        - source (str): A snapshot archive, or a `mongodump` directory
+        - terms (list[str] | None): The terms to import (all terms if not provided)
+        - workers (int): The number of batches inserted at once
+
+    Returns:
+        - list[str]: The problems found (empty if the version may be promoted)
+
+    Raises:
+        - SnapshotError: If the snapshot is damaged, or could not be loaded (the staged version is then dropped)
+    """
+    data, manifest = read_source(source)
+    docs = {c: bson.decode_all(d) for c, d in data.items()}
+    if terms is not None:
+        docs = {
+            c: [d for d in collection if term_of(c, d) in terms]
+            for c, collection in docs.items()
+        }
+    if manifest is None:
+        expected = {c: summarize(c, collection) for c, collection in docs.items()}
+    else:
+        expected = {
+            c: {
+                t: entry
+                for t, entry in manifest["collections"][c]["terms"].items()
+                if terms is None or t in terms
+            }
+            for c in docs
+        }
+    served = database.serving()["name"]
+    name = database.name
+    staged = database.stage(indexes=False)
+    db = database.db
+    batches = [
+        (c, collection[i : i + BATCH_SIZE])
+        for c, collection in docs.items()
+        for i in range(0, len(collection), BATCH_SIZE)
+    ]
+    try:
+        if terms is not None:
+            for collection in SNAPSHOT_COLLECTIONS:
+                try:
+                    database.client[served][collection].aggregate(
+                        [
+                            {"$match": {term_field(collection): {"$nin": terms}}},
+                            {"$merge": {"into": {"db": db.name, "coll": collection}}},
+                        ]
+                    )
+                except OperationFailure as e:
+                    raise SnapshotError(
+                        f"copying the served {collection} of other terms failed:"
+                        f" {failure_message(e)}"
+                    ) from e
+        with ThreadPoolExecutor(max(1, workers)) as pool:
+            list(pool.map(lambda batch: insert_batch(db, *batch), batches))
+    except SnapshotError as e:
+        # A partly loaded version must not be promoted by a later run
+        database.client.drop_database(staged)
+        database.name = name
+        raise SnapshotError(f"{e} (staged version {staged} dropped)") from e
+    database.setup()
+    if SECTION_DETAILS not in docs:
+        database.refresh_views(terms)
+    db[GENERATIONS].insert_one(
+        {
+            "_id": manifest["generation"] if manifest else 0,
+            "mode": "import",
+            "source": os.path.abspath(source),
+            "terms": sorted(terms or {t for c in expected.values() for t in c}),
+            "finished": time.time(),
+        }
+    )
+    return verify(db, expected)
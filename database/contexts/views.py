@@ -0,0 +1,221 @@
+"""Materialized views built from the scraped collections"""
+
+import statistics
+import threading
+import time
+from contextlib import ExitStack
+
+from pymongo import ReplaceOne
+from pymongo.database import Database
+
+SECTION_DETAILS = "section_details"
+ROLLUPS = "rollups"
+
+# Rollup builds of the same term in this process run one at a time
+ROLLUP_LOCKS: dict[str, threading.Lock] = {}
+ROLLUP_LOCKS_LOCK = threading.Lock()
+
+# Fields copied from each section as they are
+SECTION_FIELDS = (
+    "term_id",
+    "subject_id",
+    "course_id",
+    "code",
+    "alias",
+    "number",
+    "type",
+    "requirement_code",
+    "requirement_message",
+    "days",
+    "start",
+    "end",
+    "instructor_id",
+    "room_id",
+    "enrollment_capacity",
+    "enrolled",
+    "waitlisted",
+)
+# Fields taken from the joined documents
+JOINED_FIELDS = {
+    "course_name": "$course.name",
+    "instructor_name": {
+        "$concat": ["$instructor.first_middle_name", " ", "$instructor.last_name"]
+    },
+    "instructor_office": "$instructor.office",
+    "room_capacity": "$room.registered_location_capacity",
+    "building_id": "$room.building_id",
+    "building_name": "$building.name",
+}
+# What sections are rolled up by: the section details field of each scope's
+# key and, if there is one, of its name
+ROLLUP_SCOPES = {
+    "term": ("term_id", None),
+    "subject": ("subject_id", None),
+    "course": ("course_id", "course_name"),
+    "instructor": ("instructor_id", "instructor_name"),
+    "building": ("building_id", "building_name"),
+}
+BATCH_SIZE = 1000
+
+
+def join(collection: str, local_field: str, name: str) -> list[dict]:
+    """Get the stages that embed the document a field refers to (or null)"""
+    return [
+        {
+            "$lookup": {
+                "from": collection,
+                "localField": local_field,
+                "foreignField": "_id",
+                "as": name,
+            }
+        },
+        {"$set": {name: {"$arrayElemAt": [f"${name}", 0]}}},
+    ]
+
+
+def section_details_pipeline(terms: list[str], built_at: float) -> list[dict]:
+    """Get the pipeline that builds the section details of some terms"""
+    return [
+        {"$match": {"term_id": {"$in": terms}}},
+        *join("courses", "course_id", "course"),
+        *join("instructors", "instructor_id", "instructor"),
+        *join("rooms", "room_id", "room"),
+        *join("buildings", "room.building_id", "building"),
+        {
+            "$project": {
+                **{f: {"$ifNull": [f"${f}", None]} for f in SECTION_FIELDS},
+                **{f: {"$ifNull": [v, None]} for f, v in JOINED_FIELDS.items()},
+                "built_at": {"$literal": built_at},
+            }
+        },
+        {
+            "$merge": {
+                "into": SECTION_DETAILS,
+                "on": "_id",
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+
+
+def build_section_details(db: Database, terms: list[str] | None = None) -> int:
+    """
+    Rebuild the section details of some terms
+
+    The details are built on the server with `$lookup` on the joined
+    collections' ids and merged into the view, then the details of the
+    terms' sections that no longer exist are removed, so readers never see
+    a term's details missing while it is rebuilt.
+
+    Args:
+        - db (Database): The database to rebuild the view of
+        - terms (list[str] | None): The terms to rebuild (all terms if not provided)
+
+    Returns:
+        - int: The number of section details of the terms
+    """
+    if terms is None:
+        terms = [t["_id"] for t in db.terms.find({}, {"_id": 1})]
+    if not terms:
+        return 0
+    built_at = time.time()
+    db.sections.aggregate(section_details_pipeline(terms, built_at))
+    db[SECTION_DETAILS].delete_many(
+        {"term_id": {"$in": terms}, "built_at": {"$lt": built_at}}
+    )
+    return db[SECTION_DETAILS].count_documents({"term_id": {"$in": terms}})
+
+
+def rollup(sections: list[dict]) -> dict:
+    """Get the enrollment statistics of a group of section details"""
+    enrolled = [s["enrolled"] for s in sections if s["enrolled"] is not None]
+    filled = [
+        (s["enrolled"], s["enrollment_capacity"])
+        for s in sections
+        if s["enrolled"] is not None and s["enrollment_capacity"]
+    ]
+    capacity = sum(c for _, c in filled)
+    return {
+        "sections": len(sections),
+        "enrolled_total": sum(enrolled),
+        "enrolled_mean": round(statistics.fmean(enrolled), 2) if enrolled else None,
+        "enrolled_median": float(statistics.median(enrolled)) if enrolled else None,
+        "enrolled_max": max(enrolled) if enrolled else None,
+        "capacity_total": capacity,
+        "fill_ratio": (
+            round(sum(e for e, _ in filled) / capacity, 4) if capacity else None
+        ),
+        "waitlisted_total": sum(s["waitlisted"] or 0 for s in sections),
+    }
+
+
+def rollup_lock(term: str) -> threading.Lock:
+    """Get the lock that serializes the rollup builds of a term"""
+    with ROLLUP_LOCKS_LOCK:
+        return ROLLUP_LOCKS.setdefault(term, threading.Lock())
+
+
+def build_rollups(db: Database, terms: list[str] | None = None) -> int:
+    """
+    Recompute the rollups of some terms from their section details
+
+    Each term, and each subject, course, instructor and building of a term,
+    gets a document of enrollment statistics keyed `term:scope:key`, so
+    analytical questions are answered by a lookup instead of a `$group`
+    over every section. Rollups that no longer have sections are removed.
+    Builds of the same term are serialized, so one cannot remove the
+    rollups another just wrote.
+
+    Args:
+        - db (Database): The database to rebuild the rollups of
+        - terms (list[str] | None): The terms to rebuild (all terms if not provided)
+
+    Returns:
+        - int: The number of rollups of the terms
+    """
+    if terms is None:
+        terms = [t["_id"] for t in db.terms.find({}, {"_id": 1})]
+    if not terms:
+        return 0
+    with ExitStack() as stack:
+        # Locks are taken in order, so builds of overlapping terms cannot deadlock
+        for term in sorted(set(terms)):
+            stack.enter_context(rollup_lock(term))
+        built_at = time.time()
+        fields = {field for scope in ROLLUP_SCOPES.values() for field in scope if field}
+        projection = {
+            f: 1 for f in (*fields, "enrolled", "enrollment_capacity", "waitlisted")
+        }
+        groups: dict[tuple[str, str, str], list[dict]] = {}
+        names: dict[tuple[str, str, str], str | None] = {}
+        for section in db[SECTION_DETAILS].find(
+            {"term_id": {"$in": terms}}, projection
+        ):
+            for scope, (field, name_field) in ROLLUP_SCOPES.items():
+                if section[field] is None:
+                    continue
+                group = (section["term_id"], scope, section[field])
+                groups.setdefault(group, []).append(section)
+                names[group] = section[name_field] if name_field else None
+        ops = [
+            ReplaceOne(
+                {"_id": f"{term}:{scope}:{key}"},
+                {
+                    "term_id": term,
+                    "scope": scope,
+                    "key": key,
+                    "name": names[(term, scope, key)],
+                    **rollup(sections),
+                    "built_at": built_at,
+                },
+                upsert=True,
+            )
+            for (term, scope, key), sections in groups.items()
+        ]
+        for i in range(0, len(ops), BATCH_SIZE):
+            db[ROLLUPS].bulk_write(ops[i : i + BATCH_SIZE], ordered=False)
+        # Only the groups that no longer exist are removed
+        built = [f"{term}:{scope}:{key}" for term, scope, key in groups]
+        db[ROLLUPS].delete_many({"term_id": {"$in": terms}, "_id": {"$nin": built}})
+    return len(ops)
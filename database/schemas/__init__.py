@@ -23,3 +23,5 @@ course = __load_json("database/schemas/courses.json")
 section = __load_json("database/schemas/sections.json")
 # ge = __load_json("database/schemas/ges.json")
 instructor = __load_json("database/schemas/instructors.json")
+section_detail = __load_json("database/schemas/section_details.json")
+rollup = __load_json("database/schemas/rollups.json")
@@ -0,0 +1,116 @@
+"""Weekly time bitmasks for section meeting times"""
+
+import re
+
+DAYS = "MTWRFSU"  # Day letters used by the schedules site, Monday first
+SLOT_MINUTES = 5  # Resolution of a mask (class times are multiples of 5 minutes)
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+time_re = r"^\s*([0-9]{1,2}):([0-9]{2})\s*([AP]M)\s*$"
+
+
+def parse_time(text: str) -> int | None:
+    """Convert a time like '04:10 PM' to minutes after midnight"""
+    match = re.match(time_re, text.upper())
+    if match is None:
+        return None
+    hour, minute, half = int(match.group(1)), int(match.group(2)), match.group(3)
+    if hour == 12:
+        hour = 0
+    if half == "PM":
+        hour += 12
+    return hour * 60 + minute
+
+
+def format_time(minutes: int) -> str:
+    """Convert minutes after midnight to a time like '04:10 PM'"""
+    hour, minute = divmod(minutes, 60)
+    half = "PM" if hour >= 12 else "AM"
+    return f"{(hour - 1) % 12 + 1:02d}:{minute:02d} {half}"
+
+
+def day_mask(day: int, start: int, end: int) -> int:
+    """
+    Get the mask of a time range on one day
+
+    Args:
+        - day (int): The day index (0 is Monday)
+        - start (int): The start in minutes after midnight (rounded down to a slot)
+        - end (int): The end in minutes after midnight (rounded up to a slot)
+    """
+    first = start // SLOT_MINUTES
+    last = -(-end // SLOT_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << (day * SLOTS_PER_DAY + first)
+
+
+def time_mask(days: str | None, start: str | None, end: str | None) -> int | None:
+    """
+    Get the weekly mask of a section's meeting times
+
+    Each bit is a `SLOT_MINUTES` slot of the week, so two sections conflict
+    exactly when their masks share a bit (`a & b != 0`).
+
+    Args:
+        - days (str | None): The days the section meets (ex. 'MWF')
+        - start (str | None): The start time (ex. '10:10 AM')
+        - end (str | None): The end time (ex. '11:00 AM')
+
+    Returns:
+        - int | None: The mask (None if the section has no scheduled meeting time)
+    """
+    if not days or not start or not end:
+        return None
+    start_minutes, end_minutes = parse_time(start), parse_time(end)
+    if start_minutes is None or end_minutes is None:
+        return None
+    mask = 0
+    for letter in days:
+        day = DAYS.find(letter)
+        if day >= 0:
+            mask |= day_mask(day, start_minutes, end_minutes)
+    return mask or None
+
+
+def window_mask(
+    earliest: int | None = None, latest: int | None = None, days_off: str = ""
+) -> int:
+    """
+    Get the mask of the times a schedule must stay clear of
+
+    Args:
+        - earliest (int | None): No class may start before this many minutes after midnight
+        - latest (int | None): No class may end after this many minutes after midnight
+        - days_off (str): The days with no classes at all (ex. 'F')
+    """
+    mask = 0
+    for day, letter in enumerate(DAYS):
+        if letter in days_off:
+            mask |= day_mask(day, 0, 24 * 60)
+            continue
+        if earliest is not None:
+            mask |= day_mask(day, 0, earliest)
+        if latest is not None:
+            mask |= day_mask(day, latest, 24 * 60)
+    return mask
+
+
+def to_hex(mask: int | None) -> str | None:
+    """Encode a mask for storage (MongoDB integers are limited to 64 bits)"""
+    return None if mask is None else format(mask, "x")
+
+
+def from_hex(text: str | None) -> int:
+    """Decode a stored mask (0 if the section has no scheduled meeting time)"""
+    return int(text, 16) if text else 0
+
+
+def mask_days(mask: int) -> str:
+    """Get the letters of the days a mask covers"""
+    full_day = (1 << SLOTS_PER_DAY) - 1
+    return "".join(
+        letter
+        for day, letter in enumerate(DAYS)
+        if mask >> (day * SLOTS_PER_DAY) & full_day
+    )
@@ -1,2 +1,2 @@
 #!/bin/bash
-mongodump --uri="mongodb://localhost:27017" --db=cpsync --out=./dump
+python3 snapshot.py export "$@"
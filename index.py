@@ -26,6 +26,7 @@ class Server:
     def register_routes(self):
         """Register the routes"""
         self.app.add_url_rule("/ask", "ask", self.ask, methods=["GET"])
+        self.app.add_url_rule("/stats", "stats", self.stats, methods=["GET"])
 
     def ask(self):
         query = request.args.get("query", "")
@@ -33,6 +34,10 @@ class Server:
         response = {"answer": self.autogen.get_last_message()}
         return jsonify(response)
 
+    def stats(self):
+        """Report the hit and miss counts of the pipeline result cache"""
+        return jsonify(self.autogen.functions.cache.stats())
+
     def run(self, port):
         """Run the server"""
         self.app.run(port=port)
@@ -0,0 +1,71 @@
+"""Manage the database indexes and views and report on slow pipelines"""
+
+import argparse
+import time
+
+from database.contexts.database import ARCHIVES, COLLECTIONS, DB, VIEWS, index_models
+from database.contexts.profiler import QUERY_LOG, suggest_indexes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Manage the database indexes and views and report on slow pipelines"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ensure_parser = subparsers.add_parser(
+        "ensure",
+        help="Create the declared indexes and rebuild the views of the served database",
+    )
+    report_parser = subparsers.add_parser(
+        "report", help="Summarize the logged pipelines and suggest missing indexes"
+    )
+    report_parser.add_argument(
+        "-d",
+        "--days",
+        type=float,
+        default=7.0,
+        help="Only consider pipelines logged in the last DAYS days (default: 7)",
+    )
+    report_parser.add_argument(
+        "--create",
+        action="store_true",
+        help="Create the suggested indexes on the served database",
+    )
+    args = parser.parse_args()
+
+    db = DB()
+    served = db.db
+    if args.command == "ensure":
+        db.pin()
+        db.setup()
+        for name in [*COLLECTIONS, *VIEWS, *ARCHIVES]:
+            models = index_models(name)
+            if models:
+                print(
+                    f"{served.name}.{name}: {', '.join(served[name].index_information())}"
+                )
+        print(f"{db.refresh_views()} section details built")
+    else:
+        since = time.time() - args.days * 24 * 60 * 60
+        log = db.meta[QUERY_LOG]
+        entries = log.count_documents({"at": {"$gte": since}})
+        slow = log.count_documents({"at": {"$gte": since}, "slow": True})
+        collscans = log.count_documents({"at": {"$gte": since}, "collscan": True})
+        print(
+            f"{entries} pipelines in the last {args.days:g} days,"
+            f" {slow} slow, {collscans} with a collection scan"
+        )
+        suggestions = suggest_indexes(db.meta, served, since)
+        if not suggestions:
+            print(f"The indexes of {served.name} serve every logged predicate")
+        for suggestion in suggestions:
+            key = ", ".join(suggestion["key"])
+            print(
+                f"{suggestion['collection']} ({key}): {suggestion['count']} pipelines"
+                f" ({suggestion['slow']} slow, {suggestion['collscan']} collection"
+                f" scans), {suggestion['seconds']:.2f}s total"
+            )
+            if args.create:
+                served[suggestion["collection"]].create_index(
+                    [(field, 1) for field in suggestion["key"]]
+                )
+    db.close()
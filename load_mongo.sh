@@ -1,2 +1,7 @@
 #!/bin/bash
-mongorestore --uri="mongodb://localhost:27017" ./dump
+if [ $# -lt 1 ]; then
+    echo "Usage: $0 SOURCE [-t TERM ...] [--no-promote]" >&2
+    echo "SOURCE is a snapshot written by dump_mongo.sh, or a mongodump directory" >&2
+    exit 2
+fi
+python3 snapshot.py import "$@"
@@ -0,0 +1,98 @@
+"""Keep scraped data fresh"""
+
+import argparse
+import sys
+
+from database.contexts.database import DB
+from scraper.base import BaseScraper, ParserBackend
+from scraper.cache import PageCache
+from scraper.refresh import RefreshDaemon
+from scraper.scheduler import CrawlScheduler
+from scraper.transport import Transport
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep scraped data fresh")
+    parser.add_argument(
+        "--current-interval",
+        type=float,
+        default=5 * 60,
+        help="Seconds between enrollment refreshes of the current term (default: 300)",
+    )
+    parser.add_argument(
+        "--future-interval",
+        type=float,
+        default=60 * 60,
+        help="Seconds between incremental scrapes of future terms (default: 3600)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of concurrent crawl workers (default: 8)",
+    )
+    parser.add_argument(
+        "-r",
+        "--rate",
+        type=float,
+        default=3.0,
+        help="Maximum requests per second to the schedules site (default: 3.0)",
+    )
+    parser.add_argument(
+        "-c",
+        "--page-cache",
+        default=".cache/pages",
+        help="Directory of the persistent page cache, empty to disable (default: .cache/pages)",
+    )
+    parser.add_argument(
+        "-p",
+        "--parser",
+        default=ParserBackend.LXML.value,
+        choices=[b.value for b in ParserBackend],
+        help="HTML parser backend (default: lxml)",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Refresh every tier once and exit",
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="Only report how stale each tier's data is",
+    )
+    args = parser.parse_args()
+
+    BaseScraper.parser = ParserBackend(args.parser)
+
+    db = DB()
+    db.setup()
+    pages = PageCache(args.page_cache) if args.page_cache else None
+    scheduler = CrawlScheduler(workers=args.workers, rate=args.rate)
+    transport = Transport(limiter=scheduler.limiter, pool_size=max(1, args.workers))
+    daemon = RefreshDaemon(
+        db,
+        scheduler,
+        transport,
+        pages,
+        current_interval=args.current_interval,
+        future_interval=args.future_interval,
+    )
+    try:
+        if args.status:
+            print(daemon.report())
+        else:
+            daemon.run(once=args.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.close()
+        transport.close()
+        if pages is not None:
+            pages.close()
+        db.close()
+    if args.once and scheduler.failures:
+        print(f"{len(scheduler.failures)} crawl task(s) failed:", file=sys.stderr)
+        for label, error in scheduler.failures:
+            print(f"  {label}: {error}", file=sys.stderr)
+        sys.exit(1)
@@ -1,11 +1,20 @@
 """Scrape Schedules Website"""
 
 import argparse
+import os
+import sys
+import time
 
 from database.contexts.database import DB
+from scraper.base import BaseScraper, ParserBackend
+from scraper.cache import MemoryCache, PageCache
+from scraper.metrics import Metrics, Profiler
+from scraper.recording import RecordingTransport
+from scraper.parallel import ScrapeOptions, scrape_terms
+from scraper.scheduler import CrawlScheduler, SharedRateLimiter
+from scraper.transport import Transport
 from scraper.scrapers.terms import TermsScraper
 
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Scrape Schedules Website")
     parser.add_argument(
@@ -15,13 +24,247 @@ if __name__ == "__main__":
         default=0,
         help="Number of terms to go back (default: 0)",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of concurrent crawl workers, 0 crawls serially (default: 8)",
+    )
+    parser.add_argument(
+        "-r",
+        "--rate",
+        type=float,
+        default=3.0,
+        help="Maximum requests per second to the schedules site (default: 3.0)",
+    )
+    parser.add_argument(
+        "-P",
+        "--processes",
+        type=int,
+        default=1,
+        help="Number of processes scraping terms in parallel, each with WORKERS threads (default: 1)",
+    )
+    parser.add_argument(
+        "-c",
+        "--page-cache",
+        default=".cache/pages",
+        help="Directory of the persistent page cache, empty to disable (default: .cache/pages)",
+    )
+    parser.add_argument(
+        "--page-cache-size",
+        type=int,
+        default=512,
+        help="Size budget of the persistent page cache in MiB (default: 512)",
+    )
+    parser.add_argument(
+        "--memory-cache-size",
+        type=int,
+        default=16,
+        help="Size budget of the in-process page cache in MiB (default: 16)",
+    )
+    parser.add_argument(
+        "-p",
+        "--parser",
+        default=ParserBackend.LXML.value,
+        choices=[b.value for b in ParserBackend],
+        help="HTML parser backend (default: lxml)",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Update the existing database in place, writing only what changed",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Number of documents per bulk insert, 0 inserts one at a time (default: 1000)",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="ARCHIVE",
+        help="Record every response into a compressed archive for benchmark.py crawl (bypasses the page cache)",
+    )
+    parser.add_argument(
+        "--log-json",
+        metavar="PATH",
+        help="Append structured JSON events (pages fetched, warnings, a summary) to a file",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        default=".cache/metrics.prom",
+        help="File to write crawl metrics to in the Prometheus text format, empty to disable (default: .cache/metrics.prom)",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="Write cProfile stats of the main thread to a file (with --workers 0, the whole crawl)",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        metavar="PATH",
+        help="Write the top memory allocation sites of the run to a file",
+    )
+    parser.add_argument(
+        "--no-promote",
+        action="store_true",
+        help="Stage and validate a new database version without serving it",
+    )
+    parser.add_argument(
+        "--min-ratio",
+        type=float,
+        default=0.9,
+        help="Minimum ratio of the served courses and sections a new version must have to be served (default: 0.9)",
+    )
+    parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="Serve the previous database version again and exit",
+    )
     args = parser.parse_args()
 
     th = args.term_history
     if th < 0:
         raise ValueError("Term history must be non-negative")
 
+    if args.workers < 0:
+        raise ValueError("Workers must be non-negative")
+
+    if args.processes < 1:
+        raise ValueError("Processes must be positive")
+
+    if args.processes > 1 and args.incremental:
+        raise ValueError("Incremental scrapes run in a single process")
+
+    if args.processes > 1 and args.record:
+        raise ValueError("Recorded scrapes run in a single process")
+
+    BaseScraper.parser = ParserBackend(args.parser)
+
+    profiler = Profiler(args.profile, args.tracemalloc)
+    profiler.start()
+    log = open(args.log_json, "a", buffering=1) if args.log_json else None
+    metrics = Metrics(log)
+    started = time.time()
+
     db = DB()
-    db.reset()
-    scraper = TermsScraper(db)
-    scraper.fetch("index_curr.htm", th)
+    db.observer = metrics.db_op
+    failures: list = []
+    failed = 0
+    if args.rollback:
+        print(f"Serving {db.rollback()}")
+    else:
+        if args.batch_size > 0:
+            db.buffered(batch_size=args.batch_size)
+        if args.incremental:
+            print(f"Updating {db.pin()} in place")
+            db.setup()
+            generation = db.begin_delta()
+            print(f"Incremental scrape, generation {generation}")
+        else:
+            # Readers keep being served the current version while this one fills
+            print(f"Scraping into {db.stage()}, serving {db.serving()['name']}")
+        # A recording must get every page from the network, so it bypasses the cache
+        pages = (
+            PageCache(args.page_cache, max_bytes=args.page_cache_size * 1024 * 1024)
+            if args.page_cache and not args.record
+            else None
+        )
+        memory = MemoryCache(args.memory_cache_size * 1024 * 1024)
+        if args.processes > 1:
+            # Terms are independent, so each is scraped by a worker process while
+            # all processes share one rate limit to the schedules site
+            limiter = SharedRateLimiter(args.rate)
+            scheduler = CrawlScheduler(limiter=limiter)
+            transport = Transport(limiter=limiter)
+            scraper = TermsScraper(db, memory, scheduler, pages, transport, metrics)
+            paths = scraper.term_paths("index_curr.htm", th)
+            scheduler.close()
+            transport.close()
+            if pages is not None:
+                pages.close()
+            print(f"Scraping {len(paths)} terms on {args.processes} processes")
+            options = ScrapeOptions(
+                database=db.db.name,
+                workers=args.workers,
+                parser=args.parser,
+                page_cache=args.page_cache or None,
+                page_cache_size=args.page_cache_size,
+                memory_cache_size=args.memory_cache_size,
+                batch_size=args.batch_size,
+                log_json=args.log_json,
+            )
+            reports = scrape_terms(paths, args.processes, limiter, options)
+            for report in reports:
+                metrics.merge(report["metrics"])
+            failures = [failure for report in reports for failure in report["failures"]]
+            failed = sum(report["write_errors"] for report in reports)
+        else:
+            scheduler = CrawlScheduler(workers=args.workers, rate=args.rate)
+            if args.record:
+                transport = RecordingTransport(
+                    args.record,
+                    limiter=scheduler.limiter,
+                    pool_size=max(1, args.workers),
+                )
+            else:
+                transport = Transport(
+                    limiter=scheduler.limiter, pool_size=max(1, args.workers)
+                )
+            scraper = TermsScraper(db, memory, scheduler, pages, transport, metrics)
+            scheduler.submit(scraper.fetch, "index_curr.htm", th)
+            failures = scheduler.join()
+            scheduler.close()
+            transport.close()
+            if pages is not None:
+                pages.close()
+            db.flush()
+            errors = db.buffer.errors if db.buffer is not None else []
+            failed = sum(len(batch["failed"]) for batch in errors)
+        if failed:
+            print(f"{failed} document(s) failed to insert", file=sys.stderr)
+        if args.incremental:
+            # A partial crawl must not remove the documents it failed to reach
+            stats = db.commit_delta(tombstone=not failures)
+            for collection, counts in stats.items():
+                print(
+                    f"{collection}: {counts['upserted']} upserted, "
+                    f"{counts['removed']} removed, {counts['unchanged']} unchanged"
+                )
+        else:
+            print(f"{db.refresh_views()} section details built")
+            moved = db.archive_terms()
+            if moved:
+                print(f"{sum(moved.values())} documents of past terms archived")
+            problems = db.validate(min_ratio=args.min_ratio)
+            if failures:
+                problems.append(f"{len(failures)} crawl task(s) failed")
+            if failed:
+                problems.append(f"{failed} document(s) failed to insert")
+            if problems:
+                print(f"Not serving {db.name}: {'; '.join(problems)}", file=sys.stderr)
+            elif not args.no_promote:
+                db.promote()
+                print(f"Serving {db.name}, previous version kept for --rollback")
+    db.close()
+    profiler.stop()
+    metrics.inc("crawl_failures_total", len(failures))
+    metrics.inc("write_failures_total", failed)
+    metrics.observe("crawl_seconds", time.time() - started)
+    metrics.log("summary", failures=len(failures), **metrics.snapshot())
+    if log is not None:
+        log.close()
+    if args.metrics:
+        os.makedirs(os.path.dirname(args.metrics) or ".", exist_ok=True)
+        with open(args.metrics, "w", encoding="utf-8") as file:
+            file.write(metrics.prometheus())
+    if failures:
+        print(f"{len(failures)} crawl task(s) failed:", file=sys.stderr)
+        for label, error in failures:
+            print(f"  {label}: {error}", file=sys.stderr)
+    if failures or failed:
+        sys.exit(1)
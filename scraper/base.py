@@ -2,54 +2,228 @@
 
 import sys
 import time
-from typing import Callable
+from enum import Enum
+from typing import Any, Callable, Iterator, TypeVar
 
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 
 from database.contexts.database import DB
+from scraper.cache import MemoryCache, PageCache
+from scraper.metrics import Metrics
+from scraper.scheduler import CrawlScheduler
+from scraper.transport import Transport
 from scraper.utils import BaseURL
 
+T = TypeVar("T", bound="BaseScraper")
+
+# Restricts parsing to the `#listing` element of a page
+LISTING = SoupStrainer(id="listing")
+
+
+class ParserBackend(Enum):
+    """HTML parser backends (BeautifulSoup tree builders)"""
+
+    HTML = "html.parser"  # Pure Python, always available
+    LXML = "lxml"  # C parser, much faster on large listing pages
+    HTML5LIB = "html5lib"  # Browser-grade, slowest
+
+    def parse(self, content: str, only: SoupStrainer | None = None) -> BeautifulSoup:
+        """
+        Parse a page with this backend
+
+        Args:
+            - content (str): The page's text content
+            - only (SoupStrainer | None): Restrict the tree to matching elements (ignored by html5lib)
+
+        Returns:
+            - BeautifulSoup: The parsed page
+        """
+        if self is ParserBackend.HTML5LIB:
+            only = None
+        return BeautifulSoup(content, self.value, parse_only=only)
+
 
 class BaseScraper:
     """Base scraper class"""
 
     name = "BaseScraper"
     base_url: BaseURL
+    parser = ParserBackend.HTML  # Selected per run, see scrape.py
+    only: SoupStrainer | None = None  # Part of each page the scraper needs
+    revalidate = False  # Always revalidate cached pages, even fresh ones
 
-    def __init__(self, db: DB, cache: dict[str, str] | None = None) -> None:
+    def __init__(
+        self,
+        db: DB,
+        cache: MemoryCache | None = None,
+        scheduler: CrawlScheduler | None = None,
+        pages: PageCache | None = None,
+        transport: Transport | None = None,
+        metrics: Metrics | None = None,
+    ) -> None:
         """
         Initialize the scraper
 
         Args:
             - db (DB): The database instance
-            - cache (dict[str, str] | None): The cache to use (if not provided, a new one is created)
+            - cache (MemoryCache | None): The in-process page cache to use (if not provided, a new one is created)
+            - scheduler (CrawlScheduler | None): The scheduler to enqueue work on (if not provided, work runs inline)
+            - pages (PageCache | None): The persistent page cache to use (if not provided, pages are always downloaded)
+            - transport (Transport | None): The HTTP transport to use (if not provided, a new one is created)
+            - metrics (Metrics | None): The metrics to record into (if not provided, new ones are created)
         """
         self.db = db
-        self.cache: dict[str, str] = cache or {}  # Content cache {path: text-content}
+        self.cache = cache if cache is not None else MemoryCache()  # {path: text}
+        self.scheduler = scheduler or CrawlScheduler()
+        self.pages = pages
+        self.transport = transport or Transport(limiter=self.scheduler.limiter)
+        self.metrics = metrics or Metrics()
+
+    def spawn(self, scraper: type[T]) -> T:
+        """Create a dependent scraper sharing this scraper's resources"""
+        return scraper(
+            self.db,
+            self.cache,
+            self.scheduler,
+            self.pages,
+            self.transport,
+            self.metrics,
+        )
+
+    def count_rows(self, rows: int) -> None:
+        """Record the number of rows extracted from a page"""
+        self.metrics.inc("rows_total", rows, scraper=self.name)
 
-    def soup(self, path: str, sleep: float = 0.3) -> BeautifulSoup:
+    def enqueue(self, fetch: Callable[..., None], *args: Any) -> None:
+        """
+        Enqueue a dependent `fetch` call on the scheduler
+
+        Args:
+            - fetch (Callable): The bound `fetch` method of a dependent scraper
+            - args (Any): The arguments to call it with
+        """
+        self.scheduler.submit(fetch, *args)
+
+    def soup(self, path: str) -> BeautifulSoup:
         """
         Fetch and cache the raw text on the specified page \\
         `HTTPError` is raised if one occurred
 
         Args:
             - path (str): The path to the page
-            - sleep (float): The time to sleep before fetching the page
 
         Returns:
             - BeautifulSoup: The parsed page
         """
         content = self.cache.get(path, None)
         if content is None:
-            time.sleep(sleep)
-            print(f"Fetching .../{path}")
-            response = requests.get(self.base_url.value + path, timeout=10)
-            response.raise_for_status()
-            content = response.text
+            content = self.download(path)
             self.cache[path] = content
-        return BeautifulSoup(content, "html.parser")
+        else:
+            self.metrics.inc("pages_total", scraper=self.name, source="memory")
+        with self.metrics.timer("parse_seconds", scraper=self.name):
+            return self.parser.parse(content, self.only)
+
+    def rows(self, path: str, skip: int = 0) -> Iterator[Tag]:
+        """
+        Stream the rows of the `#listing` table on the specified page \\
+        Each row is released once the consumer moves on, and so is the whole
+        tree once the listing is exhausted, so memory does not pile up. Rows
+        are not counted here, as some are headers; consumers count the rows
+        they parse
+
+        Args:
+            - path (str): The path to the page
+            - skip (int): The number of leading rows (e.g., headers) to skip
+
+        Returns:
+            - Iterator[Tag]: The table's rows, in order
+        """
+        soup = self.soup(path)
+        table = soup.find("table", id="listing")
+        assert isinstance(table, Tag), f"Failed to find listing table in {path}"
+        count = 0
+        try:
+            row = table.find("tr")
+            while isinstance(row, Tag):
+                following = row.find_next("tr")
+                if following is not None and not any(
+                    parent is table for parent in following.parents
+                ):
+                    following = None  # Past the end of the table
+                if count >= skip:
+                    yield row
+                count += 1
+                row.decompose()
+                row = following
+        finally:
+            soup.decompose()
+        assert count > 0, f"Failed to find listing rows in {path}"
+
+    def download(self, path: str) -> str:
+        """
+        Get the raw text of a page from the persistent cache or the network
+
+        Fresh entries in the page cache are used as is (unless the scraper
+        always revalidates); stale ones are revalidated with a conditional
+        request, and a 304 response reuses the cached body. Network requests
+        go through the shared transport, which waits on the rate limiter and
+        retries transient failures.
+
+        Args:
+            - path (str): The path to the page
+
+        Returns:
+            - str: The page's text content
+        """
+        url = self.base_url.value + path
+        pages = self.pages
+        entry = pages.lookup(url) if pages is not None else None
+        cached = pages.read(entry) if pages is not None and entry is not None else None
+        headers = {}
+        if pages is not None and entry is not None and cached is not None:
+            if pages.is_fresh(entry) and not self.revalidate:
+                self.metrics.inc("pages_total", scraper=self.name, source="cache")
+                return cached
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        print(f"Fetching .../{path}")
+        start = time.perf_counter()
+        response = self.transport.get(url, headers=headers)
+        elapsed = time.perf_counter() - start
+        source = "revalidated" if response.status_code == 304 and headers else "network"
+        size = len(response.content)
+        self.metrics.inc("pages_total", scraper=self.name, source=source)
+        self.metrics.inc("fetch_bytes_total", size, scraper=self.name)
+        self.metrics.observe("fetch_seconds", elapsed, scraper=self.name)
+        self.metrics.log(
+            "page",
+            scraper=self.name,
+            url=url,
+            source=source,
+            status=response.status_code,
+            bytes=size,
+            seconds=round(elapsed, 6),
+        )
+        if source == "revalidated":
+            assert pages is not None and entry is not None and cached is not None
+            pages.revalidated(entry)
+            return cached
+        response.raise_for_status()
+        content = response.text
+        if pages is not None:
+            pages.store(
+                url,
+                content,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+            )
+        return content
 
     def warn(self, message: str) -> None:
         """Print a warning message to stderr"""
         print(f"Warning ({self.name}): {message}", file=sys.stderr)
+        self.metrics.inc("warnings_total", scraper=self.name)
+        self.metrics.log("warning", scraper=self.name, message=message)
@@ -0,0 +1,255 @@
+"""Page caches for the scrapers"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import NamedTuple
+
+# Time-to-live policies as (url pattern, seconds); first match wins, None never expires
+DEFAULT_TTLS: list[tuple[str, float | None]] = [
+    (r"_curr\.htm", 15 * 60),  # Current term, changes during registration
+    (r"_next\.htm", 60 * 60),  # Upcoming term
+    (r"_[0-9]{4}\.htm", None),  # Past terms are effectively immutable
+    (r".*", 60 * 60),
+]
+
+
+class MemoryCache:
+    """
+    In-process LRU of page texts with a size budget
+
+    Shared by all scrapers of a crawl so that pages parsed by several of them
+    (e.g., a term's index and location pages) are only fetched once, while
+    memory stays flat however many pages the crawl reads. Sizes are counted
+    in characters, which matches bytes for the (ASCII) schedules pages.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024) -> None:
+        """
+        Initialize the memory cache
+
+        Args:
+            - max_bytes (int): The size budget before the least recently used pages are evicted
+        """
+        self.max_bytes = max_bytes
+        self.pages: OrderedDict[str, str] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def get(self, path: str, default: str | None = None) -> str | None:
+        """Get a page's text, marking it as recently used"""
+        with self.lock:
+            text = self.pages.get(path, None)
+            if text is None:
+                return default
+            self.pages.move_to_end(path)
+            return text
+
+    def __setitem__(self, path: str, text: str) -> None:
+        """Store a page's text, evicting pages until it fits the budget"""
+        if len(text) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.pages.pop(path, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.pages[path] = text
+            self.size += len(text)
+            while self.size > self.max_bytes:
+                _, evicted = self.pages.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class PageEntry(NamedTuple):
+    """Metadata for a cached page"""
+
+    url: str
+    digest: str
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+    size: int
+
+
+class PageCache:
+    """
+    Content-addressed, compressed page store keyed by URL
+
+    Page bodies are stored zlib-compressed under their SHA-256 digest, so
+    identical pages share a blob. An SQLite index maps URLs to digests along
+    with the validators (ETag, Last-Modified) needed for conditional requests.
+    Least recently used entries are evicted once the store exceeds its budget.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 512 * 1024 * 1024,
+        ttls: list[tuple[str, float | None]] | None = None,
+    ) -> None:
+        """
+        Initialize the page cache
+
+        Args:
+            - directory (str): The directory to store pages in (created if missing)
+            - max_bytes (int): The compressed size budget before LRU eviction kicks in
+            - ttls (list[tuple[str, float | None]] | None): TTL policies (defaults to `DEFAULT_TTLS`)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = [(re.compile(p), ttl) for p, ttl in (ttls or DEFAULT_TTLS)]
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            os.path.join(directory, "index.sqlite3"),
+            timeout=30,
+            check_same_thread=False,
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_lru ON pages (accessed_at)")
+        self.conn.commit()
+
+    def ttl(self, url: str) -> float | None:
+        """Get the time-to-live for a URL (None if it never expires)"""
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return None
+
+    def lookup(self, url: str) -> PageEntry | None:
+        """Get the cache entry for a URL, if any"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, digest, etag, last_modified, fetched_at, size"
+                " FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+        return PageEntry(*row) if row is not None else None
+
+    def urls(self) -> list[str]:
+        """Get the URLs of all cached pages"""
+        with self.lock:
+            rows = self.conn.execute("SELECT url FROM pages ORDER BY url").fetchall()
+        return [url for (url,) in rows]
+
+    def is_fresh(self, entry: PageEntry) -> bool:
+        """Check whether an entry may be used without revalidation"""
+        ttl = self.ttl(entry.url)
+        return ttl is None or time.time() - entry.fetched_at < ttl
+
+    def read(self, entry: PageEntry) -> str | None:
+        """Read a cached page body (None if its blob has gone missing)"""
+        try:
+            with open(self._blob_path(entry.digest), "rb") as file:
+                content = zlib.decompress(file.read()).decode("utf-8")
+        except (OSError, zlib.error):
+            return None
+        with self.lock:
+            self.conn.execute(
+                "UPDATE pages SET accessed_at = ? WHERE url = ?",
+                (time.time(), entry.url),
+            )
+            self.conn.commit()
+        return content
+
+    def revalidated(self, entry: PageEntry) -> None:
+        """Mark an entry as fresh after the server answered 304 Not Modified"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                (now, now, entry.url),
+            )
+            self.conn.commit()
+
+    def store(
+        self, url: str, content: str, etag: str | None, last_modified: str | None
+    ) -> None:
+        """
+        Store a page body and its validators
+
+        Args:
+            - url (str): The page URL
+            - content (str): The page body
+            - etag (str | None): The response's ETag header
+            - last_modified (str | None): The response's Last-Modified header
+        """
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        blob = zlib.compress(data, 6)
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as file:
+                file.write(blob)
+            os.replace(tmp, path)
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute(
+                "SELECT digest FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, etag, last_modified, now, now, len(blob)),
+            )
+            self.conn.commit()
+            if old is not None and old[0] != digest:
+                self._release(old[0])
+            self._evict()
+
+    def close(self) -> None:
+        """Close the cache index"""
+        with self.lock:
+            self.conn.close()
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    def _release(self, digest: str) -> None:
+        """Delete a blob once no URL references it (lock must be held)"""
+        (refs,) = self.conn.execute(
+            "SELECT COUNT(*) FROM pages WHERE digest = ?", (digest,)
+        ).fetchone()
+        if refs == 0:
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+
+    def _evict(self) -> None:
+        """Evict least recently used entries until under budget (lock must be held)"""
+        (total,) = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        victims = self.conn.execute(
+            "SELECT url, digest, size FROM pages ORDER BY accessed_at ASC"
+        ).fetchall()
+        for url, digest, size in victims:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._release(digest)
+            total -= size
+        self.conn.commit()
@@ -0,0 +1,195 @@
+"""Crawl instrumentation: counters, timers, structured logs and profiling"""
+
+import cProfile
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Iterator, TextIO
+
+PREFIX = "cpsync_"
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def labels_of(labels: dict[str, str]) -> Labels:
+    """Get a hashable, ordered form of metric labels"""
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(labels: Labels) -> str:
+    """Format metric labels the Prometheus way"""
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Metrics:
+    """
+    Thread-safe crawl metrics
+
+    Counters (e.g., pages, bytes, rows) and timers (e.g., fetch and parse
+    latency) are keyed by name and labels such as the scraper. Events can
+    also be written as one JSON object per line to a log stream.
+    """
+
+    def __init__(self, log: TextIO | None = None) -> None:
+        """
+        Initialize the metrics
+
+        Args:
+            - log (TextIO | None): The stream to write JSON events to (if not provided, events are dropped)
+        """
+        self.log_stream = log
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.timers: dict[tuple[str, Labels], list[float]] = {}  # [count, sum, max]
+        self.lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Add to a counter"""
+        key = (name, labels_of(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """Record a timing"""
+        key = (name, labels_of(labels))
+        with self.lock:
+            timer = self.timers.setdefault(key, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Time the body of a `with` block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def db_op(self, op: str, collection: str, seconds: float) -> None:
+        """Record a database operation (see `DB.observer`)"""
+        self.observe("db_op_seconds", seconds, op=op, collection=collection)
+
+    def log(self, event: str, **fields: Any) -> None:
+        """Write a structured event to the log stream"""
+        if self.log_stream is None:
+            return
+        line = json.dumps({"ts": time.time(), "event": event, **fields}, default=str)
+        with self.lock:
+            self.log_stream.write(line + "\n")
+
+    def snapshot(self) -> dict[str, list[dict]]:
+        """Get all counters and timers as plain data"""
+        with self.lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "timers": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": int(count),
+                        "sum": total,
+                        "max": peak,
+                    }
+                    for (name, labels), (count, total, peak) in sorted(
+                        self.timers.items()
+                    )
+                ],
+            }
+
+    def merge(self, snapshot: dict[str, list[dict]]) -> None:
+        """Add the counters and timers of a snapshot (e.g., from a worker process)"""
+        for counter in snapshot["counters"]:
+            self.inc(counter["name"], counter["value"], **counter["labels"])
+        with self.lock:
+            for t in snapshot["timers"]:
+                key = (t["name"], labels_of(t["labels"]))
+                timer = self.timers.setdefault(key, [0, 0.0, 0.0])
+                timer[0] += t["count"]
+                timer[1] += t["sum"]
+                timer[2] = max(timer[2], t["max"])
+
+    def prometheus(self) -> str:
+        """Dump all counters and timers in the Prometheus text format"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{PREFIX}{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{format_labels(labels)} {value:g}")
+        for (name, labels), (count, total, peak) in timers:
+            metric = f"{PREFIX}{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{metric}_count{format_labels(labels)} {count:g}")
+            lines.append(f"{metric}_sum{format_labels(labels)} {total:.6f}")
+            lines.append(f"{metric}_max{format_labels(labels)} {peak:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """
+    Opt-in cProfile and tracemalloc capture of a whole run
+
+    cProfile only profiles the main thread (the thread that calls `start`):
+    one profile per thread cannot be merged while other threads still run,
+    and from Python 3.12 only one profile may be enabled at a time. Crawl
+    with `workers` == 0 to run every fetch on the main thread and profile
+    all of it. tracemalloc sees the allocations of every thread.
+    """
+
+    def __init__(self, profile: str | None = None, memory: str | None = None) -> None:
+        """
+        Initialize the profiler
+
+        Args:
+            - profile (str | None): The path to write cProfile stats to (loadable with `pstats`)
+            - memory (str | None): The path to write the top tracemalloc allocation sites to
+        """
+        self.profile_path = profile
+        self.memory_path = memory
+        self.profile: cProfile.Profile | None = None
+
+    def start(self) -> None:
+        """Start capturing"""
+        if self.memory_path is not None:
+            tracemalloc.start(10)
+        if self.profile_path is not None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self) -> None:
+        """Stop capturing and write the results (call from the thread that started)"""
+        if self.profile is not None and self.profile_path is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.profile_path)
+            self.profile = None
+            print(f"Profile of the main thread written to {self.profile_path}")
+        if self.memory_path is not None:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(self.memory_path, "w", encoding="utf-8") as file:
+                file.write(
+                    f"current {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB\n\n"
+                )
+                for stat in snapshot.statistics("lineno")[:50]:
+                    file.write(f"{stat}\n")
+            print(f"Memory profile written to {self.memory_path}")
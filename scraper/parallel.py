@@ -0,0 +1,135 @@
+"""Process-parallel scraping of terms"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple
+
+from database.contexts.database import DB
+from scraper.base import BaseScraper, ParserBackend
+from scraper.cache import MemoryCache, PageCache
+from scraper.metrics import Metrics
+from scraper.scheduler import CrawlScheduler, RateLimiter
+from scraper.scrapers.terms import TermsScraper
+from scraper.transport import Transport
+
+# The rate limiter shared with the parent, set when a worker process starts
+limiter: RateLimiter | None = None
+
+
+class ScrapeOptions(NamedTuple):
+    """Settings every worker process scrapes its terms with"""
+
+    database: str
+    workers: int
+    parser: str
+    page_cache: str | None
+    page_cache_size: int
+    memory_cache_size: int
+    batch_size: int
+    log_json: str | None = None
+
+
+def init_worker(shared: RateLimiter, parser: str) -> None:
+    """Set up a worker process"""
+    global limiter  # pylint: disable=global-statement
+    limiter = shared
+    BaseScraper.parser = ParserBackend(parser)
+
+
+def scrape_term(path: str, options: ScrapeOptions) -> dict:
+    """
+    Scrape a term and its dependent data in a worker process
+
+    Each term gets its own database connection, scheduler and transport;
+    only the rate limit is shared with the other workers.
+
+    Args:
+        - path (str): The path to the term's index page
+        - options (ScrapeOptions): The settings to scrape with
+
+    Returns:
+        - dict: The term's report (path, requests, failures, write errors, duration and metrics)
+    """
+    start = time.time()
+    # Processes append whole lines to the shared log
+    log = open(options.log_json, "a", buffering=1) if options.log_json else None
+    metrics = Metrics(log)
+    db = DB(options.database)
+    db.observer = metrics.db_op
+    if options.batch_size > 0:
+        db.buffered(batch_size=options.batch_size)
+    pages = (
+        PageCache(options.page_cache, max_bytes=options.page_cache_size * 1024 * 1024)
+        if options.page_cache
+        else None
+    )
+    scheduler = CrawlScheduler(workers=options.workers, limiter=limiter)
+    transport = Transport(limiter=limiter, pool_size=max(1, options.workers))
+    memory = MemoryCache(options.memory_cache_size * 1024 * 1024)
+    scraper = TermsScraper(db, memory, scheduler, pages, transport, metrics)
+    try:
+        scheduler.submit(scraper.fetch_term, path)
+        failures = scheduler.join()
+    finally:
+        scheduler.close()
+        transport.close()
+        if pages is not None:
+            pages.close()
+        db.close()
+        if log is not None:
+            log.close()
+    write_errors = db.buffer.errors if db.buffer is not None else []
+    return {
+        "path": path,
+        "requests": transport.budget.requests,
+        # Exceptions are not always picklable, so only their descriptions are returned
+        "failures": [(label, repr(e)) for label, e in failures],
+        "write_errors": sum(len(batch["failed"]) for batch in write_errors),
+        "duration": time.time() - start,
+        "metrics": metrics.snapshot(),
+    }
+
+
+def scrape_terms(
+    paths: list[str], processes: int, shared: RateLimiter, options: ScrapeOptions
+) -> list[dict]:
+    """
+    Scrape terms on a process pool, reporting progress as terms finish
+
+    Args:
+        - paths (list[str]): The paths to the terms' index pages
+        - processes (int): The number of worker processes
+        - shared (RateLimiter): The rate limiter shared by all workers (e.g., a `SharedRateLimiter`)
+        - options (ScrapeOptions): The settings to scrape with
+
+    Returns:
+        - list[dict]: The report of every term, in the order of `paths`
+    """
+    reports: dict[str, dict] = {}
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=init_worker,
+        initargs=(shared, options.parser),
+    ) as pool:
+        futures = {pool.submit(scrape_term, path, options): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:  # pylint: disable=broad-except
+                # The worker itself died (e.g., the database was unreachable)
+                report = {
+                    "path": path,
+                    "requests": 0,
+                    "failures": [(f"scrape_term({path!r})", repr(e))],
+                    "write_errors": 0,
+                    "duration": 0.0,
+                    "metrics": Metrics().snapshot(),
+                }
+            reports[path] = report
+            print(
+                f"[{len(reports)}/{len(paths)}] {path}: {report['requests']} requests, "
+                f"{len(report['failures'])} failures, "
+                f"{report['write_errors']} write errors in {report['duration']:.1f}s"
+            )
+    return [reports[path] for path in paths]
@@ -0,0 +1,119 @@
+"""Record and replay the responses of a crawl"""
+
+import hashlib
+import json
+import threading
+import zipfile
+from typing import Any
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from scraper.transport import Transport
+
+INDEX = "index.json"
+
+# Response headers kept in a recording (the ones the scrapers look at)
+RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+def entry_name(url: str) -> str:
+    """Get the name of a URL's body in an archive"""
+    return "pages/" + hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+class RecordingTransport(Transport):
+    """
+    Transport that saves every response it gets into a compressed archive
+
+    The archive is a zip file with one deflated body per URL and an index of
+    the URLs' statuses and headers. Conditional request headers are dropped,
+    so every recorded response carries a full body.
+    """
+
+    def __init__(self, path: str, **kwargs: Any) -> None:
+        """
+        Initialize the recording transport
+
+        Args:
+            - path (str): The path of the archive to write (overwritten if it exists)
+            - kwargs (Any): The arguments of `Transport`
+        """
+        super().__init__(**kwargs)
+        self.archive = zipfile.ZipFile(
+            path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9
+        )
+        self.index: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def get(self, url: str, headers: dict[str, str] | None = None) -> requests.Response:
+        """GET a URL and record the response"""
+        response = super().get(url)
+        with self.lock:
+            if url not in self.index:
+                self.archive.writestr(entry_name(url), response.content)
+                self.index[url] = {
+                    "status": response.status_code,
+                    "encoding": response.encoding,
+                    "headers": {
+                        k: response.headers[k]
+                        for k in RECORDED_HEADERS
+                        if k in response.headers
+                    },
+                }
+        return response
+
+    def close(self) -> None:
+        """Write the index and close the archive and all pooled connections"""
+        with self.lock:
+            self.archive.writestr(INDEX, json.dumps(self.index, indent=2))
+            self.archive.close()
+        super().close()
+
+
+class ReplayTransport(Transport):
+    """
+    Transport that answers requests from a recorded archive
+
+    URLs that were not recorded get a 404, like a page missing upstream.
+    No requests are made and no rate limit applies.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize the replay transport
+
+        Args:
+            - path (str): The path of the archive to read
+        """
+        super().__init__()
+        self.archive = zipfile.ZipFile(path, "r")
+        self.index: dict[str, dict] = json.loads(self.archive.read(INDEX))
+        self.lock = threading.Lock()
+
+    def urls(self) -> list[str]:
+        """Get all recorded URLs"""
+        return list(self.index)
+
+    def get(self, url: str, headers: dict[str, str] | None = None) -> requests.Response:
+        """Get the recorded response of a URL"""
+        response = requests.Response()
+        response.url = url
+        recorded = self.index.get(url, None)
+        self.budget.record_request()
+        with self.lock:
+            content = (
+                self.archive.read(entry_name(url)) if recorded is not None else b""
+            )
+        response.status_code = recorded["status"] if recorded is not None else 404
+        response.headers = CaseInsensitiveDict(
+            recorded["headers"] if recorded is not None else {}
+        )
+        response.encoding = recorded["encoding"] if recorded is not None else None
+        response._content = content  # pylint: disable=protected-access
+        return response
+
+    def close(self) -> None:
+        """Close the archive"""
+        self.archive.close()
+        super().close()
@@ -0,0 +1,190 @@
+"""Tiered refresh of scraped data"""
+
+import time
+
+import requests
+
+from database.contexts.database import DB
+from database.contexts.partitions import CURRENT, FUTURE, PAST, classify_terms
+from scraper.cache import PageCache
+from scraper.scheduler import CrawlScheduler
+from scraper.scrapers.enrollment import EnrollmentScraper
+from scraper.scrapers.terms import (
+    TermsScraper,
+    assemble_term_details,
+    get_location_link,
+)
+from scraper.transport import Transport
+from scraper.utils import BaseURL
+
+# Index pages of the terms the schedules site currently serves
+INDEX_PATHS = ("index_curr.htm", "index_next.htm")
+
+
+class RefreshDaemon:
+    """
+    Long-running refresh service
+
+    Each tier is refreshed on its own interval: the current term's section
+    listings are re-read in enrollment-only mode, future terms are
+    re-scraped incrementally, and past terms are never refreshed (once a
+    term is past, it is moved to the archive collections).
+    """
+
+    def __init__(
+        self,
+        db: DB,
+        scheduler: CrawlScheduler,
+        transport: Transport,
+        pages: PageCache | None = None,
+        current_interval: float = 5 * 60,
+        future_interval: float = 60 * 60,
+    ) -> None:
+        """
+        Initialize the refresh daemon
+
+        Args:
+            - db (DB): The database instance
+            - scheduler (CrawlScheduler): The scheduler to run page fetches on
+            - transport (Transport): The HTTP transport to use
+            - pages (PageCache | None): The persistent page cache to use
+            - current_interval (float): Seconds between refreshes of the current term
+            - future_interval (float): Seconds between refreshes of future terms
+        """
+        self.db = db
+        self.scheduler = scheduler
+        self.transport = transport
+        self.pages = pages
+        self.intervals = {CURRENT: current_interval, FUTURE: future_interval}
+        self.last_run: dict[str, float] = {}
+
+    def run(self, once: bool = False) -> None:
+        """
+        Refresh tiers as they come due, forever (or once each)
+
+        Args:
+            - once (bool): Refresh every tier once and return
+        """
+        while True:
+            for term_id in self.refresh_index():
+                print(f"Re-scraped term {term_id}, new or moved on the schedules site")
+            moved = self.db.archive_terms()
+            if moved:
+                print(f"Archived {sum(moved.values())} documents of past terms")
+            for tier, interval in self.intervals.items():
+                if time.time() - self.last_run.get(tier, 0) >= interval:
+                    self.refresh(tier)
+            print(self.report())
+            if once:
+                return
+            next_due = min(
+                self.last_run[tier] + interval
+                for tier, interval in self.intervals.items()
+            )
+            time.sleep(max(1.0, next_due - time.time()))
+
+    def refresh(self, tier: str) -> None:
+        """Refresh all terms in a tier and record the outcome"""
+        # Refresh whichever version is served now (a scrape may have promoted one)
+        self.db.pin()
+        terms = classify_terms(self.db.get_terms())[tier]
+        start = time.time()
+        failed_before = len(self.scheduler.failures)
+        pages = changed = 0
+        for term in terms:
+            if tier == CURRENT:
+                pages += self.refresh_enrollment(term)
+            else:
+                changed += self.refresh_term(term)
+        failures = len(self.scheduler.join()) - failed_before
+        if tier == CURRENT and terms:
+            # Once every listing is read, rather than once per listing
+            self.db.refresh_rollups([t["_id"] for t in terms])
+        self.last_run[tier] = time.time()
+        self.db.set_refresh_status(
+            tier,
+            {
+                "terms": [t["_id"] for t in terms],
+                "pages": pages,
+                "changed": changed,
+                "failures": failures,
+                "duration": self.last_run[tier] - start,
+                "interval": self.intervals[tier],
+            },
+        )
+
+    def refresh_index(self) -> list[str]:
+        """
+        Re-read the index pages of the terms the schedules site serves, and
+        re-scrape the terms that are new or moved to another page (ex. when
+        the next term becomes the current one), so their urls are up to date
+
+        Returns:
+            - list[str]: The ids of the re-scraped terms
+        """
+        self.db.pin()
+        scraper = TermsScraper(
+            self.db, None, self.scheduler, self.pages, self.transport
+        )
+        stored = {t["_id"]: t["url"] for t in self.db.get_terms()}
+        moved = []
+        for path in INDEX_PATHS:
+            try:
+                soup = scraper.soup(path)
+            except requests.RequestException as e:
+                print(f"Failed to read {path}: {e}")
+                continue
+            if get_location_link(soup) is None:
+                continue
+            details = assemble_term_details(soup, scraper.base_url.value + path)
+            if details is None or stored.get(details["_id"]) == details["url"]:
+                continue
+            self.refresh_term(details)
+            moved.append(details["_id"])
+        return moved
+
+    def refresh_enrollment(self, term: dict) -> int:
+        """Re-read the enrollment numbers of a term and count the listings read"""
+        scraper = EnrollmentScraper(
+            self.db, None, self.scheduler, self.pages, self.transport
+        )
+        paths = [
+            url.removeprefix(BaseURL.SCHEDULES.value)
+            for url in self.db.get_course_urls(term["_id"])
+        ]
+        for path in paths:
+            self.scheduler.submit(scraper.fetch, term["_id"], path)
+        self.scheduler.join()
+        return len(paths)
+
+    def refresh_term(self, term: dict) -> int:
+        """Re-scrape a term incrementally and count the documents that changed"""
+        scraper = TermsScraper(
+            self.db, None, self.scheduler, self.pages, self.transport
+        )
+        failed_before = len(self.scheduler.failures)
+        self.db.begin_delta()
+        self.scheduler.submit(
+            scraper.fetch_term, term["url"].removeprefix(scraper.base_url.value)
+        )
+        failed = len(self.scheduler.join()) > failed_before
+        stats = self.db.commit_delta(tombstone=not failed)
+        return sum(c["upserted"] + c["removed"] for c in stats.values())
+
+    def report(self) -> str:
+        """Describe how stale each tier's data is"""
+        lines = []
+        now = time.time()
+        for status in sorted(self.db.get_refresh_status(), key=lambda s: s["_id"]):
+            age = now - status["refreshed_at"]
+            lines.append(
+                f"{status['_id']:<8} terms {','.join(status['terms']) or '-':<10} "
+                f"{age:>7.0f}s old (every {status['interval']:.0f}s), "
+                f"{status['pages']} pages, {status['changed']} changed documents, "
+                f"{status['failures']} failures"
+            )
+        past = classify_terms(self.db.get_terms())[PAST]
+        lines.append(
+            f"{PAST:<8} terms {','.join(t['_id'] for t in past) or '-'} never refreshed"
+        )
+        return "\n".join(lines)
@@ -0,0 +1,191 @@
+"""Concurrent crawl scheduler and rate limiting for the scrapers"""
+
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting requests per second"""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """
+        Initialize the rate limiter
+
+        Args:
+            - rate (float): The sustained number of requests per second (<= 0 disables limiting)
+            - burst (int): The maximum number of requests that may be made back to back
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request may be made"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if tokens >= 1:
+                    self.tokens = tokens - 1
+                    return
+                self.tokens = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    Token bucket shared by processes
+
+    The bucket lives in shared memory, so every process given the limiter
+    when it starts (e.g., through a pool initializer) draws from the same
+    request budget.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """
+        Initialize the rate limiter
+
+        Args:
+            - rate (float): The sustained number of requests per second across all processes (<= 0 disables limiting)
+            - burst (int): The maximum number of requests that may be made back to back
+        """
+        self.state = multiprocessing.Array("d", 2)
+        super().__init__(rate, burst)
+        self.lock = self.state.get_lock()
+
+    @property
+    def tokens(self) -> float:
+        return self.state[0]
+
+    @tokens.setter
+    def tokens(self, value: float) -> None:
+        self.state[0] = value
+
+    @property
+    def updated(self) -> float:
+        return self.state[1]
+
+    @updated.setter
+    def updated(self, value: float) -> None:
+        self.state[1] = value
+
+
+class CrawlScheduler:
+    """
+    Work queue for scraper `fetch` calls
+
+    With `workers` > 0, submitted work items run on a thread pool and may
+    enqueue further work items; `join` waits until the whole tree is done.
+    With `workers` == 0, work items run inline (depth-first, like a plain
+    recursive crawl).
+
+    In both modes a failed work item is recorded in `failures` rather than
+    raised, so the rest of the crawl still runs; callers must check what
+    `join` returns (or `failures`) and treat a non-empty list as a failed
+    crawl (ex. by not promoting the version and exiting non-zero).
+    """
+
+    def __init__(
+        self,
+        workers: int = 0,
+        rate: float = 1 / 0.3,
+        burst: int = 1,
+        limiter: RateLimiter | None = None,
+    ) -> None:
+        """
+        Initialize the scheduler
+
+        Args:
+            - workers (int): The number of worker threads (0 runs work inline)
+            - rate (float): The global requests per second allowed to the upstream site
+            - burst (int): The number of requests that may be made back to back
+            - limiter (RateLimiter | None): The rate limiter to use instead (e.g., one shared by processes)
+        """
+        self.limiter = limiter or RateLimiter(rate, burst)
+        self.executor = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawl")
+            if workers > 0
+            else None
+        )
+        self.pending = 0
+        self.idle = threading.Condition()
+        self.failures: list[tuple[str, BaseException]] = []
+        self.claimed: set[str] = set()
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> None:
+        """
+        Enqueue a work item
+
+        Args:
+            - fn (Callable): The function to call, usually a scraper's bound `fetch`
+            - args (Any): The positional arguments to call it with
+        """
+        if self.executor is None:
+            self._run(fn, args)
+            return
+        with self.idle:
+            self.pending += 1
+        future = self.executor.submit(self._run, fn, args)
+        future.add_done_callback(self._done)
+
+    def claim(self, key: str) -> bool:
+        """
+        Claim a piece of work for the current crawl, so that work reached
+        through several pages (ex. a cross-listed course) is enqueued once
+
+        Args:
+            - key (str): The identifier of the work (ex. a course id)
+
+        Returns:
+            - bool: Whether the work was unclaimed (and is now claimed by the caller)
+        """
+        with self.idle:
+            if key in self.claimed:
+                return False
+            self.claimed.add(key)
+            return True
+
+    def join(self) -> list[tuple[str, BaseException]]:
+        """
+        Wait for all enqueued work (including work enqueued by work) to finish \\
+        Claims are forgotten, so the next crawl (ex. a refresh) does the work again
+
+        Returns:
+            - list[tuple[str, BaseException]]: The work items that failed and why
+        """
+        with self.idle:
+            while self.pending > 0:
+                self.idle.wait()
+            self.claimed.clear()
+        return self.failures
+
+    def close(self) -> None:
+        """Wait for outstanding work and shut down the worker threads"""
+        self.join()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def _run(self, fn: Callable[..., Any], args: tuple) -> None:
+        """Run a work item, recording its failure instead of aborting the crawl"""
+        try:
+            fn(*args)
+        except Exception as e:  # pylint: disable=broad-except
+            label = f"{getattr(fn, '__qualname__', fn)}{args}"
+            print(f"Failed ({label}): {e!r}", file=sys.stderr)
+            self.failures.append((label, e))
+
+    def _done(self, _: Future) -> None:
+        with self.idle:
+            self.pending -= 1
+            if self.pending == 0:
+                self.idle.notify_all()
@@ -19,6 +19,7 @@ class BuildingsScraper(BaseScraper):
         soup = self.soup(path)
         buildings = soup.find_all(class_="locationDivDescr")
         building_num_names = [bldg_num_name(b.text) for b in buildings]
+        self.count_rows(len(buildings))
         for num, name in building_num_names:
             tmp_building = {
                 "_id": f"{term_id}-{num}",
@@ -28,6 +28,7 @@ class CollegesScraper(BaseScraper):
         assert (
             len(subject_links) == len(instructor_links) == len(college_links)
         ), f"College, subject and instructor link counts do not match in {path}"
+        self.count_rows(len(college_links))
 
         for college_link, subject_link, instructor_link in zip(
             college_links, subject_links, instructor_links
@@ -54,10 +55,16 @@ class CollegesScraper(BaseScraper):
                 "url": self.base_url.value + subject_path,
             }
             self.db.add_college(college)
-            # Fetch dependent data
-            SubjectsScraper(self.db, self.cache).fetch(
-                term_id, college["_id"], subject_path
+            # Enqueue dependent data
+            self.enqueue(
+                self.spawn(SubjectsScraper).fetch,
+                term_id,
+                college["_id"],
+                subject_path,
             )
-            InstructorsScraper(self.db, self.cache).fetch(
-                term_id, college["_id"], instructor_path
+            self.enqueue(
+                self.spawn(InstructorsScraper).fetch,
+                term_id,
+                college["_id"],
+                instructor_path,
             )
@@ -1,11 +1,13 @@
 """Scraper for available courses"""
 
+import sys
+
 from bs4 import Tag
 
 from database.contexts.database import DB
 from scraper.scrapers.sections import SectionsScraper
 from scraper.utils import BaseURL
-from scraper.base import BaseScraper
+from scraper.base import LISTING, BaseScraper
 
 
 class CoursesScraper(BaseScraper):
@@ -13,19 +15,13 @@ class CoursesScraper(BaseScraper):
 
     name = "CoursesScraper"
     base_url = BaseURL.SCHEDULES
+    only = LISTING
 
     def fetch(self, term_id: str, college_id: str, subject_id: str, path: str) -> None:
         """Fetch all courses for a given subject"""
-        soup = self.soup(path)
-        table = soup.find("table", id="listing")
-        assert isinstance(table, Tag), f"Failed to find course listing table in {path}"
-        rows = table.find_all("tr")
-        assert len(rows) > 0, f"Failed to find course rows in {path}"
-
-        for row in rows[1:]:
-            assert isinstance(
-                row, Tag
-            ), f"Unexpected non-tag in course listing in {path}"
+        courses: dict[str, dict] = {}  # Courses on this page by id
+        parsed = 0
+        for row in self.rows(path, skip=1):
             cells = row.find_all("td")
             if len(cells) != 13:
                 continue
@@ -84,20 +80,31 @@ class CoursesScraper(BaseScraper):
                 "requirement_messages": [course_req_msg],
                 "url": self.base_url.value + course_path,
             }
-            existing_course = self.db.get_course(course["_id"])
+            parsed += 1
+            existing_course = courses.get(course["_id"], None)
             if existing_course is not None:
                 existing_course["types"] += course["types"]
                 existing_course["requirement_codes"] += course["requirement_codes"]
                 existing_course["requirement_messages"] += course[
                     "requirement_messages"
                 ]
-                self.db.update_course(existing_course)
             else:
-                self.db.add_course(course)
-                # Fetch dependent data
-                SectionsScraper(self.db, self.cache).fetch(
-                    term_id, college_id, subject_id, course["_id"], course_path
+                courses[course["_id"]] = course
+            if self.scheduler.claim(course["_id"]):
+                # Enqueue dependent data once per crawl, even when cross-listed
+                self.enqueue(
+                    self.spawn(SectionsScraper).fetch,
+                    term_id,
+                    college_id,
+                    subject_id,
+                    course["_id"],
+                    course_path,
                 )
+        self.count_rows(parsed)
+
+        # Merge each course once (a course may also be listed by another subject)
+        for course in courses.values():
+            self.db.merge_course(course)
 
 
 if __name__ == "__main__":
@@ -105,3 +112,6 @@ if __name__ == "__main__":
     db.reset()
     scraper = CoursesScraper(db)
     scraper.fetch("2242", "2242-52-CENG", "2242-CSC", "courses_CSC_curr.htm")
+    scraper.scheduler.close()
+    if scraper.scheduler.failures:
+        sys.exit(1)
@@ -0,0 +1,55 @@
+"""Lightweight scraper for section enrollment numbers"""
+
+from bs4 import SoupStrainer, Tag
+
+from scraper.utils import BaseURL
+from scraper.base import BaseScraper
+from scraper.scrapers.sections import section_id
+
+
+class EnrollmentScraper(BaseScraper):
+    """
+    Enrollment scraper class
+
+    Reads only the columns of a course's section listing that identify a
+    section and its enrollment, and updates existing sections in place.
+    """
+
+    name = "EnrollmentScraper"
+    base_url = BaseURL.SCHEDULES
+    only = SoupStrainer("tr", class_="active")
+    revalidate = True
+
+    def fetch(self, term_id: str, path: str) -> None:
+        """Refresh the enrollment numbers of all sections of a course"""
+        soup = self.soup(path)
+        updates: list[dict] = []
+        for row in soup.find_all("tr"):
+            assert isinstance(
+                row, Tag
+            ), f"Unexpected non-tag in section listing in {path}"
+            cells = row.find_all("td", recursive=False)
+            if len(cells) != 17:
+                continue
+            section_code = cells[2].get_text(strip=True)
+            if not section_code.isnumeric():
+                continue
+            days_span = cells[6].find("span")
+            days = days_span.get_text(strip=True) if days_span is not None else None
+            room_link = cells[10].find("a")
+            room = room_link.get_text(strip=True) if room_link is not None else None
+            updates.append(
+                {
+                    "_id": section_id(term_id, section_code, days, room),
+                    "enrollment_capacity": to_int(cells[12].get_text(strip=True)),
+                    "enrolled": to_int(cells[13].get_text(strip=True)),
+                    "waitlisted": to_int(cells[14].get_text(strip=True)),
+                }
+            )
+        self.count_rows(len(updates))
+        self.db.update_enrollment(updates)
+
+
+def to_int(text: str) -> int | None:
+    """Convert a numeric cell to an int (None if empty or not numeric)"""
+    return int(text) if text.isdigit() else None
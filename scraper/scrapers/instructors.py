@@ -4,7 +4,7 @@ import re
 from bs4 import Tag
 
 from scraper.utils import BaseURL
-from scraper.base import BaseScraper
+from scraper.base import LISTING, BaseScraper
 
 name_re = r"^(.+),\s+(.+)$"
 
@@ -14,21 +14,14 @@ class InstructorsScraper(BaseScraper):
 
     name = "InstructorsScraper"
     base_url = BaseURL.SCHEDULES
+    only = LISTING
 
     def fetch(self, term_id: str, college_id: str, path: str) -> None:
         """Fetch all instructors for a given college"""
-        soup = self.soup(path)
-        table = soup.find("table", id="listing")
-        assert isinstance(
-            table, Tag
-        ), f"Failed to find instructor listing table in {path}"
-        trs = table.find_all("tr")
-        assert len(trs) > 0, f"Failed to find instructor rows in {path}"
         instr_subj_code = None
-        for row in trs:
-            assert isinstance(
-                row, Tag
-            ), f"Unexpected non-tag in instructor listing in {path}"
+        instructors: dict[str, dict] = {}  # Instructors on this page by id
+        parsed = 0
+        for row in self.rows(path):
             cells = row.find_all("td")
             instr_subj_span = row.find("span", class_="subjectDiv")
             if instr_subj_span is not None:
@@ -95,12 +88,15 @@ class InstructorsScraper(BaseScraper):
                     "office": instr_office,
                     "url": self.base_url.value + instr_href,
                 }
-                existing_instr = self.db.get_instructor(instructor["_id"])
+                existing_instr = instructors.get(instructor["_id"], None)
                 if existing_instr is not None:
-                    if instructor["colleges"][0] not in existing_instr["colleges"]:
-                        existing_instr["colleges"] += instructor["colleges"]
                     if instructor["subjects"][0] not in existing_instr["subjects"]:
                         existing_instr["subjects"] += instructor["subjects"]
-                    self.db.update_instructor(existing_instr)
                 else:
-                    self.db.add_instructor(instructor)
+                    instructors[instructor["_id"]] = instructor
+                parsed += 1
+        self.count_rows(parsed)
+
+        # Merge each instructor once (they may also teach for other colleges)
+        for instructor in instructors.values():
+            self.db.merge_instructor(instructor)
@@ -3,7 +3,7 @@
 from bs4 import Tag
 
 from scraper.utils import BaseURL
-from scraper.base import BaseScraper
+from scraper.base import LISTING, BaseScraper
 
 
 class RoomsScraper(BaseScraper):
@@ -11,17 +11,13 @@ class RoomsScraper(BaseScraper):
 
     name = "RoomsScraper"
     base_url = BaseURL.SCHEDULES
+    only = LISTING
 
     def fetch(self, term_id: str, path: str) -> None:
         """Fetch all rooms for a given building"""
-        soup = self.soup(path)
-        table = soup.find("table", id="listing")
-        assert isinstance(table, Tag), f"Failed to find room listing table in {path}"
-        trs = table.find_all("tr")
-        assert len(trs) > 0, f"Failed to find room rows in {path}"
         bldg_num = None
-        for row in trs:
-            assert isinstance(row, Tag), f"Unexpected non-tag in room listing in {path}"
+        rooms = 0
+        for row in self.rows(path):
             cells = row.find_all("td")
             if row.has_attr("id"):
                 bldg_num = row["id"]
@@ -64,3 +60,5 @@ class RoomsScraper(BaseScraper):
                     "url": self.base_url.value + path + f"#{bldg_num}",
                 }
                 self.db.add_room(room)
+                rooms += 1
+        self.count_rows(rooms)
@@ -3,8 +3,9 @@
 import re
 from bs4 import Tag
 
+from database.timeslots import time_mask, to_hex
 from scraper.utils import BaseURL
-from scraper.base import BaseScraper
+from scraper.base import LISTING, BaseScraper
 
 instructor_link_re = r"^person_(.+)_.+.htm$"
 
@@ -14,21 +15,14 @@ class SectionsScraper(BaseScraper):
 
     name = "SectionsScraper"
     base_url = BaseURL.SCHEDULES
+    only = LISTING
 
     def fetch(
         self, term_id: str, college_id: str, subject_id: str, course_id: str, path: str
     ) -> None:
         """Fetch all sections for a given course"""
-        soup = self.soup(path)
-        table = soup.find("table", id="listing")
-        assert isinstance(table, Tag), f"Failed to find section listing table in {path}"
-        rows = table.find_all("tr")
-        assert len(rows) > 0, f"Failed to find section rows in {path}"
-
-        for row in rows[1:]:
-            assert isinstance(
-                row, Tag
-            ), f"Unexpected non-tag in section listing in {path}"
+        sections = 0
+        for row in self.rows(path, skip=1):
             row_classes = row["class"]
             if "active" not in row_classes:
                 continue
@@ -161,7 +155,9 @@ class SectionsScraper(BaseScraper):
                 ), f"Failed to find section ics download path in {path}"
 
             section = {
-                "_id": f"{term_id}-{section_code}-{section_days or 'NoDays'}-{section_room_code or 'NoLoc'}",
+                "_id": section_id(
+                    term_id, section_code, section_days, section_room_code
+                ),
                 "term_id": term_id,
                 "college_id": college_id,
                 "subject_id": subject_id,
@@ -175,6 +171,9 @@ class SectionsScraper(BaseScraper):
                 "days": section_days,
                 "start": section_start_time,
                 "end": section_end_time,
+                "time_mask": to_hex(
+                    time_mask(section_days, section_start_time, section_end_time)
+                ),
                 "instructor_id": (
                     f"{term_id}-{instructor_code}" if instructor_code else None
                 ),
@@ -191,6 +190,11 @@ class SectionsScraper(BaseScraper):
                 ),
                 "url": self.base_url.value + section_path,
             }
-            existing_section = self.db.get_section(section["_id"])
-            if existing_section is None:
-                self.db.add_section(section)
+            self.db.add_section(section)
+            sections += 1
+        self.count_rows(sections)
+
+
+def section_id(term_id: str, code: str, days: str | None, room: str | None) -> str:
+    """Assemble a section's id (one section may meet at several days/locations)"""
+    return f"{term_id}-{code}-{days or 'NoDays'}-{room or 'NoLoc'}"
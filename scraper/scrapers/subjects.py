@@ -2,7 +2,7 @@
 
 from scraper.scrapers.courses import CoursesScraper
 from scraper.utils import BaseURL
-from scraper.base import BaseScraper
+from scraper.base import LISTING, BaseScraper
 
 
 class SubjectsScraper(BaseScraper):
@@ -10,6 +10,7 @@ class SubjectsScraper(BaseScraper):
 
     name = "SubjectsScraper"
     base_url = BaseURL.SCHEDULES
+    only = LISTING
 
     def fetch(self, term_id: str, college_id: str, path: str) -> None:
         """Fetch all subjects for a given college"""
@@ -25,6 +26,7 @@ class SubjectsScraper(BaseScraper):
         assert len(subject_links) == len(
             course_links
         ), f"Subject and course link counts do not match in {path}"
+        self.count_rows(len(subject_links))
 
         for subject_link, course_link in zip(subject_links, course_links):
             catalog_link = catalogs.get(subject_link.get_text(strip=True), None)
@@ -49,7 +51,11 @@ class SubjectsScraper(BaseScraper):
             }
             self.db.add_subject(subject)
 
-            # Fetch dependent data
-            CoursesScraper(self.db, self.cache).fetch(
-                term_id, college_id, subject["_id"], course_path
+            # Enqueue dependent data
+            self.enqueue(
+                self.spawn(CoursesScraper).fetch,
+                term_id,
+                college_id,
+                subject["_id"],
+                course_path,
             )
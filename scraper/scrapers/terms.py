@@ -1,6 +1,7 @@
 """Scraper for available terms"""
 
 import re
+import sys
 from datetime import datetime
 
 from bs4 import BeautifulSoup
@@ -28,6 +29,20 @@ class TermsScraper(BaseScraper):
         Finds the first term's page and then iterates through all terms
         to get their details
         """
+        for path in self.term_paths(starting_path, hist):
+            self.fetch_term(path, self.soup(path))
+
+    def term_paths(self, starting_path: str, hist: int) -> list[str]:
+        """
+        Find the index pages of all populated terms
+
+        Args:
+            - starting_path (str): The path to the current term's index page
+            - hist (int): The number of terms to go back
+
+        Returns:
+            - list[str]: The paths of the terms' index pages, oldest first
+        """
         path = starting_path
         tmp_soup = self.soup(path)
         tmp_path = get_prev_path(tmp_soup)
@@ -41,27 +56,43 @@ class TermsScraper(BaseScraper):
             hist -= 1
 
         tmp_path = last_path
+        paths = []
 
         while tmp_path is not None:
             # Traverse through all populated terms starting from the first term
             tmp_soup = self.soup(tmp_path)
-            tmp_location_link = get_location_link(tmp_soup)
-            if tmp_location_link is None:
+            if get_location_link(tmp_soup) is None:
                 break
-            details = assemble_term_details(tmp_soup, self.base_url.value + tmp_path)
-            if details is not None:
-                self.db.add_term(details)
-                # Fetch dependent data
-                BuildingsScraper(self.db, self.cache).fetch(
-                    details["_id"], tmp_location_link
-                )
-                RoomsScraper(self.db, self.cache).fetch(
-                    details["_id"], tmp_location_link
-                )
-                CollegesScraper(self.db, self.cache).fetch(details["_id"], tmp_path)
-            else:
-                self.warn(f"Failed to assemble term details for {tmp_path}")
+            paths.append(tmp_path)
             tmp_path = get_next_path(tmp_soup)
+        return paths
+
+    def fetch_term(self, path: str, soup: BeautifulSoup | None = None) -> bool:
+        """
+        Fetch a single term and enqueue its dependent data
+
+        Args:
+            - path (str): The path to the term's index page
+            - soup (BeautifulSoup | None): The parsed index page, if already fetched
+
+        Returns:
+            - bool: Whether the term is populated (has a location listing)
+        """
+        if soup is None:
+            soup = self.soup(path)
+        location_link = get_location_link(soup)
+        if location_link is None:
+            return False
+        details = assemble_term_details(soup, self.base_url.value + path)
+        if details is None:
+            self.warn(f"Failed to assemble term details for {path}")
+            return True
+        self.db.add_term(details)
+        # Enqueue dependent data
+        self.enqueue(self.spawn(BuildingsScraper).fetch, details["_id"], location_link)
+        self.enqueue(self.spawn(RoomsScraper).fetch, details["_id"], location_link)
+        self.enqueue(self.spawn(CollegesScraper).fetch, details["_id"], path)
+        return True
 
 
 def get_prev_path(soup: BeautifulSoup) -> str | None:
@@ -164,3 +195,6 @@ if __name__ == "__main__":
     db.reset()
     scraper = TermsScraper(db)
     scraper.fetch("index_curr.htm", 0)
+    scraper.scheduler.close()
+    if scraper.scheduler.failures:
+        sys.exit(1)
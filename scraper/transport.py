@@ -0,0 +1,155 @@
+"""Pooled HTTP transport shared by the scrapers"""
+
+import random
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scraper.scheduler import RateLimiter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryBudget:
+    """
+    Global cap on retries across all requests
+
+    Retries are allowed while they stay under `minimum` plus `ratio` times the
+    number of requests made, so a struggling server is not hammered with
+    retries while isolated transient failures are still absorbed.
+    """
+
+    def __init__(self, ratio: float = 0.1, minimum: int = 10) -> None:
+        self.ratio = ratio
+        self.minimum = minimum
+        self.requests = 0
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def record_request(self) -> None:
+        """Record a first attempt"""
+        with self.lock:
+            self.requests += 1
+
+    def try_spend(self) -> bool:
+        """Spend a retry if the budget allows it"""
+        with self.lock:
+            if self.retries >= self.minimum + self.ratio * self.requests:
+                return False
+            self.retries += 1
+            return True
+
+
+class Transport:
+    """HTTP client with connection pooling, compression and retries"""
+
+    def __init__(
+        self,
+        limiter: RateLimiter | None = None,
+        pool_size: int = 16,
+        timeout: float = 10,
+        max_attempts: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 30,
+        budget: RetryBudget | None = None,
+    ) -> None:
+        """
+        Initialize the transport
+
+        Args:
+            - limiter (RateLimiter | None): The rate limiter every attempt waits on
+            - pool_size (int): The number of keep-alive connections kept per host
+            - timeout (float): The timeout of each attempt in seconds
+            - max_attempts (int): The maximum number of attempts per request
+            - backoff (float): The base delay of the exponential backoff in seconds
+            - max_backoff (float): The maximum delay between attempts in seconds
+            - budget (RetryBudget | None): The retry budget (if not provided, a new one is created)
+        """
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget or RetryBudget()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive",
+                "User-Agent": "cpsync-scraper (+https://github.com/N8WM/cpsync)",
+            }
+        )
+
+    def get(self, url: str, headers: dict[str, str] | None = None) -> requests.Response:
+        """
+        GET a URL, retrying transient failures \\
+        The last error is raised once attempts or the retry budget run out
+
+        Args:
+            - url (str): The URL to fetch
+            - headers (dict[str, str] | None): Extra request headers
+
+        Returns:
+            - requests.Response: The response (which may be a 304 or a non-retryable error)
+        """
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not self._may_retry(attempt):
+                    raise
+                delay = self._delay(attempt, None)
+                self._warn(f"{e.__class__.__name__} on {url}, retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                if not self._may_retry(attempt):
+                    return response
+                delay = self._delay(attempt, response.headers.get("Retry-After"))
+                self._warn(
+                    f"HTTP {response.status_code} on {url}, retrying in {delay:.1f}s"
+                )
+                response.close()
+            time.sleep(delay)
+
+    def close(self) -> None:
+        """Close all pooled connections"""
+        self.session.close()
+
+    def _may_retry(self, attempt: int) -> bool:
+        return attempt < self.max_attempts and self.budget.try_spend()
+
+    def _delay(self, attempt: int, retry_after: str | None) -> float:
+        """Exponential backoff with full jitter, or the server's Retry-After"""
+        if retry_after is not None:
+            seconds = parse_retry_after(retry_after)
+            if seconds is not None:
+                return min(seconds, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def _warn(self, message: str) -> None:
+        print(f"Warning (Transport): {message}", file=sys.stderr)
+
+
+def parse_retry_after(value: str) -> float | None:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
@@ -0,0 +1,90 @@
+"""Export the served database to a snapshot and import snapshots into a new version"""
+
+import argparse
+import sys
+import time
+
+from database.contexts.snapshots import SnapshotError, export_snapshot, import_snapshot
+from database.contexts.database import DB
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export the served database to a snapshot and import snapshots into a new version"
+    )
+    parser.add_argument(
+        "--host", default="localhost", help="MongoDB host (default: localhost)"
+    )
+    parser.add_argument(
+        "--port", type=int, default=27017, help="MongoDB port (default: 27017)"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of collections or batches processed at once (default: 4)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser(
+        "export", help="Export the served database to a snapshot archive"
+    )
+    export_parser.add_argument(
+        "-o",
+        "--output",
+        metavar="PATH",
+        help="Archive to write (default: snapshots/<version>_g<generation>_<time>.zip)",
+    )
+    export_parser.add_argument(
+        "-d", "--database", help="Export this database instead of the served one"
+    )
+    import_parser = subparsers.add_parser(
+        "import",
+        help="Import a snapshot archive or a mongodump directory into a new version",
+    )
+    import_parser.add_argument(
+        "source", help="Snapshot archive, or directory of .bson files (ex. dump/cpsync)"
+    )
+    import_parser.add_argument(
+        "-t",
+        "--terms",
+        nargs="+",
+        metavar="TERM",
+        help="Only import these terms, keeping the served version's other terms",
+    )
+    import_parser.add_argument(
+        "--no-promote",
+        action="store_true",
+        help="Import and verify a new database version without serving it",
+    )
+    import_parser.add_argument(
+        "--min-ratio",
+        type=float,
+        default=0.9,
+        help="Minimum ratio of the served courses and sections the new version must have to be served (default: 0.9)",
+    )
+    args = parser.parse_args()
+
+    db = DB(host=args.host, port=args.port)
+    started = time.time()
+    if args.command == "export":
+        db.name = args.database
+        path = export_snapshot(db, args.output, args.workers)
+        print(f"Exported {db.db.name} to {path} in {time.time() - started:.1f}s")
+    else:
+        try:
+            problems = import_snapshot(db, args.source, args.terms, args.workers)
+        except SnapshotError as e:
+            print(f"Not importing {args.source}: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Imported {args.source} into {db.name} in {time.time() - started:.1f}s")
+        if not problems:
+            moved = db.archive_terms()
+            if moved:
+                print(f"{sum(moved.values())} documents of past terms archived")
+        problems += db.validate(min_ratio=args.min_ratio)
+        if problems:
+            print(f"Not serving {db.name}: {'; '.join(problems)}", file=sys.stderr)
+        elif not args.no_promote:
+            db.promote()
+            print(f"Serving {db.name}, previous version kept for rollback")
+    db.close()
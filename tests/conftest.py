@@ -0,0 +1,228 @@
+"""Shared fixtures: an in-memory MongoDB with a small term of scraped data"""
+
+import mongomock
+import pytest
+from mongomock.database import Database as MockDatabase
+from pymongo.database import Database
+
+from database.contexts.database import DB, META_DBNAME
+from database.timeslots import time_mask, to_hex
+
+TERM = "2242"
+
+# (course code, name, [(number, type, days, start, end, instructor, room, capacity, enrolled)])
+COURSES = [
+    (
+        "CSC-357",
+        "Systems Programming",
+        [
+            (
+                "01",
+                "Lecture",
+                "MWF",
+                "09:10 AM",
+                "10:00 AM",
+                "khosmood",
+                "014-0255",
+                35,
+                33,
+            ),
+            (
+                "02",
+                "Lecture",
+                "TR",
+                "12:10 PM",
+                "01:30 PM",
+                "aeckhard",
+                "014-0256",
+                35,
+                20,
+            ),
+            (
+                "03",
+                "Laboratory",
+                "TR",
+                "01:40 PM",
+                "03:00 PM",
+                "aeckhard",
+                "014-0256",
+                35,
+                35,
+            ),
+        ],
+    ),
+    (
+        "CSC-349",
+        "Design and Analysis of Algorithms",
+        [
+            (
+                "01",
+                "Lecture",
+                "MWF",
+                "09:10 AM",
+                "10:00 AM",
+                "rkumar",
+                "180-0101",
+                40,
+                38,
+            ),
+            (
+                "02",
+                "Lecture",
+                "MWF",
+                "11:10 AM",
+                "12:00 PM",
+                "rkumar",
+                "180-0101",
+                40,
+                None,
+            ),
+        ],
+    ),
+    (
+        "MATH-248",
+        "Methods of Proof in Mathematics",
+        [
+            (
+                "01",
+                "Lecture",
+                "MTWR",
+                "10:10 AM",
+                "11:00 AM",
+                "jsmith",
+                "180-0102",
+                30,
+                12,
+            ),
+            ("02", "Lecture", "MWF", "02:10 PM", "03:00 PM", None, None, 30, 30),
+        ],
+    ),
+]
+ROOMS = [("014-0255", 40), ("014-0256", 36), ("180-0101", 45), ("180-0102", None)]
+BUILDINGS = [("014", "Frank E. Pilling"), ("180", "Baker Center")]
+INSTRUCTORS = [
+    ("khosmood", "Khosmood", "Foaad", "Professor", "014-0211"),
+    ("aeckhard", "Eckhardt", "Aaron", "Lecturer", None),
+    ("rkumar", "Kumar", "Rahul", "Associate Professor", "014-0212"),
+    ("jsmith", "Smith", "Jane M", "Professor", "025-0101"),
+]
+
+
+def sample_documents(term: str = TERM) -> dict[str, list[dict]]:
+    """Get the documents of a small scraped term, by collection"""
+    docs: dict[str, list[dict]] = {
+        "terms": [
+            {
+                "_id": term,
+                "start": 20240108,
+                "end": 20240322,
+                "season": "Winter",
+                "year": 2024,
+                "url": f"https://schedules.calpoly.edu/index_{term}.htm",
+            }
+        ],
+        "buildings": [
+            {"_id": f"{term}-{n}", "term_id": term, "number": n, "name": name}
+            for n, name in BUILDINGS
+        ],
+        "rooms": [
+            {
+                "_id": f"{term}-{r}",
+                "term_id": term,
+                "building_id": f"{term}-{r.split('-')[0]}",
+                "number": r,
+                "registered_location_capacity": capacity,
+            }
+            for r, capacity in ROOMS
+        ],
+        "instructors": [
+            {
+                "_id": f"{term}-{code}",
+                "term_id": term,
+                "code": code,
+                "last_name": last,
+                "first_middle_name": first,
+                "job_title": title,
+                "office": office,
+                "subjects": [f"{term}-CSC"],
+            }
+            for code, last, first, title, office in INSTRUCTORS
+        ],
+        "subjects": [
+            {"_id": f"{term}-{s}", "term_id": term, "code": s, "name": name}
+            for s, name in (("CSC", "Computer Science"), ("MATH", "Mathematics"))
+        ],
+        "courses": [],
+        "sections": [],
+    }
+    for code, name, sections in COURSES:
+        subject = code.split("-")[0]
+        course_id = f"{term}-{code}"
+        docs["courses"].append(
+            {
+                "_id": course_id,
+                "term_id": term,
+                "subject_id": f"{term}-{subject}",
+                "code": code,
+                "name": name,
+                "types": sorted({s[1] for s in sections}),
+            }
+        )
+        for number, kind, days, start, end, instr, room, capacity, enrolled in sections:
+            docs["sections"].append(
+                {
+                    "_id": f"{course_id}-{number}",
+                    "term_id": term,
+                    "subject_id": f"{term}-{subject}",
+                    "course_id": course_id,
+                    "code": f"{code}-{number}",
+                    "alias": f"{code}-{number}",
+                    "number": number,
+                    "type": kind,
+                    "days": days,
+                    "start": start,
+                    "end": end,
+                    "time_mask": to_hex(time_mask(days, start, end)),
+                    "instructor_id": f"{term}-{instr}" if instr else None,
+                    "room_id": f"{term}-{room}" if room else None,
+                    "enrollment_capacity": capacity,
+                    "enrolled": enrolled,
+                    "waitlisted": 2 if enrolled == capacity else 0,
+                }
+            )
+    return docs
+
+
+@pytest.fixture
+def client() -> mongomock.MongoClient:
+    return mongomock.MongoClient()
+
+
+@pytest.fixture
+def db(client: mongomock.MongoClient) -> Database:
+    """A database holding the sample term"""
+    database = client["cpsync_test"]
+    for collection, docs in sample_documents().items():
+        database[collection].insert_many(docs)
+    return database
+
+
+@pytest.fixture
+def versions(client: mongomock.MongoClient, monkeypatch: pytest.MonkeyPatch) -> DB:
+    """A database client serving a version that holds the sample term"""
+    # mongomock has no schema validation, so collections are created without it
+    create = MockDatabase.create_collection
+    monkeypatch.setattr(
+        MockDatabase,
+        "create_collection",
+        lambda self, name, validator=None, **kwargs: create(self, name, **kwargs),
+    )
+    database = DB()
+    database.client.close()
+    database.client, database.meta = client, client[META_DBNAME]
+    database.stage()
+    for collection, docs in sample_documents().items():
+        database.db[collection].insert_many(docs)
+    database.promote()
+    database.name = None
+    return database
@@ -0,0 +1,107 @@
+"""Cached pages expire by URL, and the least recently used are evicted"""
+
+import itertools
+import os
+import zlib
+
+import pytest
+
+from scraper import cache
+from scraper.cache import MemoryCache, PageCache
+
+BASE = "https://schedules.calpoly.edu/"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock that advances a second per reading, so access order is strict"""
+    now = {"time": 1000.0}
+    ticks = itertools.count()
+
+    def time():
+        return now["time"] + next(ticks)
+
+    monkeypatch.setattr(cache.time, "time", time)
+    return now
+
+
+@pytest.fixture
+def pages(tmp_path, clock):
+    pages = PageCache(str(tmp_path), max_bytes=10**6)
+    yield pages
+    pages.close()
+
+
+def blobs(pages: PageCache) -> int:
+    """Count the page bodies stored on disk"""
+    return sum(
+        len(files) for _, _, files in os.walk(os.path.join(pages.directory, "blobs"))
+    )
+
+
+def test_ttl_by_url(pages):
+    assert pages.ttl(BASE + "courses_CSC_curr.htm") == 15 * 60
+    assert pages.ttl(BASE + "courses_CSC_next.htm") == 60 * 60
+    assert pages.ttl(BASE + "courses_CSC_2238.htm") is None
+    assert pages.ttl(BASE + "all_person_curr.htm?x") == 15 * 60
+
+
+def test_freshness(pages, clock):
+    pages.store(BASE + "index_curr.htm", "current", "etag-1", None)
+    pages.store(BASE + "index_2238.htm", "past", None, None)
+    current = pages.lookup(BASE + "index_curr.htm")
+    past = pages.lookup(BASE + "index_2238.htm")
+    assert current.etag == "etag-1"
+    assert pages.is_fresh(current) and pages.is_fresh(past)
+
+    clock["time"] += 15 * 60
+    assert not pages.is_fresh(current)
+    assert pages.is_fresh(past)
+
+    pages.revalidated(current)
+    assert pages.is_fresh(pages.lookup(BASE + "index_curr.htm"))
+    assert pages.read(current) == "current"
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    # Each body is 100 repeated letters, so all compress to the same size
+    size = len(zlib.compress(b"a" * 100, 6))
+    pages = PageCache(str(tmp_path), max_bytes=2 * size)
+    pages.store(BASE + "a", "a" * 100, None, None)
+    pages.store(BASE + "b", "b" * 100, None, None)
+    pages.read(pages.lookup(BASE + "a"))
+    pages.store(BASE + "c", "c" * 100, None, None)
+    assert pages.urls() == [BASE + "a", BASE + "c"]
+    assert blobs(pages) == 2
+    pages.close()
+
+
+def test_identical_pages_share_a_body(pages):
+    pages.store(BASE + "a", "same", None, None)
+    pages.store(BASE + "b", "same", None, None)
+    assert blobs(pages) == 1
+
+    pages.store(BASE + "a", "changed", None, None)
+    assert blobs(pages) == 2
+    pages.store(BASE + "b", "changed", None, None)
+    assert blobs(pages) == 1
+    assert pages.read(pages.lookup(BASE + "b")) == "changed"
+
+
+def test_missing_body_reads_as_a_miss(pages):
+    pages.store(BASE + "a", "body", None, None)
+    entry = pages.lookup(BASE + "a")
+    os.remove(pages._blob_path(entry.digest))
+    assert pages.read(entry) is None
+
+
+def test_memory_cache_budget():
+    memory = MemoryCache(max_bytes=10)
+    memory["a"] = "aaaa"
+    memory["b"] = "bbbb"
+    assert memory.get("a") == "aaaa"
+    memory["c"] = "cccc"
+    assert memory.get("b") is None
+    assert (memory.get("a"), memory.get("c")) == ("aaaa", "cccc")
+    memory["d"] = "d" * 11
+    assert memory.get("d") is None and len(memory) == 2
@@ -0,0 +1,234 @@
+"""The in-memory executor returns what MongoDB returns, or refuses the pipeline"""
+
+import json
+
+import pytest
+
+from database.contexts import columnar
+from database.contexts.columnar import ColumnarStore, Snapshot, Unsupported
+
+TERM = {"term_id": "2242"}
+
+# Pipelines both run, as (collection, pipeline)
+PARITY = [
+    ("courses", [{"$match": TERM}, {"$project": {"_id": 0}}]),
+    ("courses", [{"$match": TERM}, {"$project": {"_id": 1}}]),
+    ("courses", [{"$match": TERM}, {"$project": {"code": 1, "name": 1}}]),
+    ("courses", [{"$match": TERM}, {"$project": {"_id": 0, "types": 0}}]),
+    ("courses", [{"$project": {"_id": 0, "label": "$name", "k": {"$literal": 1}}}]),
+    ("sections", [{"$match": {"enrolled": {"$gte": 30}}}]),
+    ("sections", [{"$match": {"enrolled": None}}, {"$project": {"code": 1}}]),
+    ("sections", [{"$match": {"enrolled": {"$ne": None, "$lt": 30}}}]),
+    ("sections", [{"$match": {"days": {"$in": ["MWF", "TR"]}}}, {"$count": "n"}]),
+    ("sections", [{"$match": {"days": {"$nin": ["MWF"]}}}, {"$count": "n"}]),
+    ("sections", [{"$match": {"code": {"$regex": "^csc", "$options": "i"}}}]),
+    ("sections", [{"$match": {"code": {"$not": {"$regex": "^CSC"}}}}]),
+    ("sections", [{"$match": {"room_id": {"$exists": True}, "instructor_id": None}}]),
+    (
+        "sections",
+        [{"$match": {"$or": [{"type": "Laboratory"}, {"enrolled": {"$lte": 12}}]}}],
+    ),
+    ("sections", [{"$match": {"$nor": [{"days": "MWF"}]}}, {"$count": "n"}]),
+    ("sections", [{"$match": {"$and": [TERM, {"days": "TR"}]}}]),
+    (
+        "sections",
+        [{"$match": {"course_id": "2242-CSC-357"}}, {"$match": {"days": "TR"}}],
+    ),
+    (
+        "sections",
+        [
+            {
+                "$group": {
+                    "_id": "$course_id",
+                    "n": {"$sum": 1},
+                    "e": {"$sum": "$enrolled"},
+                }
+            },
+            {"$sort": {"_id": 1}},
+        ],
+    ),
+    (
+        "sections",
+        [
+            {
+                "$group": {
+                    "_id": {"course": "$course_id", "type": "$type"},
+                    "avg": {"$avg": "$enrolled"},
+                    "max": {"$max": "$enrolled"},
+                    "min": {"$min": "$enrolled"},
+                    "codes": {"$push": "$code"},
+                    "days": {"$addToSet": "$days"},
+                }
+            }
+        ],
+    ),
+    ("sections", [{"$group": {"_id": None, "n": {"$sum": 1}}}]),
+    ("sections", [{"$sort": {"enrolled": -1, "_id": 1}}, {"$skip": 1}, {"$limit": 3}]),
+    (
+        "sections",
+        [{"$sort": {"days": 1, "start": 1, "_id": -1}}, {"$project": {"_id": 1}}],
+    ),
+    ("sections", [{"$match": TERM}, {"$limit": 2}, {"$project": {"code": 1}}]),
+    ("courses", [{"$unwind": "$types"}, {"$project": {"types": 1}}]),
+    (
+        "courses",
+        [{"$unwind": {"path": "$types", "preserveNullAndEmptyArrays": True}}],
+    ),
+    (
+        "sections",
+        [
+            {"$match": {"days": "TR"}},
+            {
+                "$lookup": {
+                    "from": "instructors",
+                    "localField": "instructor_id",
+                    "foreignField": "_id",
+                    "as": "instructor",
+                }
+            },
+            {"$unwind": "$instructor"},
+            {"$project": {"code": 1, "last": "$instructor.last_name"}},
+        ],
+    ),
+    (
+        "rooms",
+        [
+            {
+                "$lookup": {
+                    "from": "sections",
+                    "localField": "_id",
+                    "foreignField": "room_id",
+                    "as": "sections",
+                }
+            },
+            {"$project": {"number": 1, "sections": 1}},
+        ],
+    ),
+]
+
+# Pipelines the executor must leave to MongoDB (malformed, or not run exactly)
+REFUSED = [
+    [{"$group": {"total": {"$sum": 1}}}],
+    [{"$group": {"_id": "$code", "n": {"$median": "$enrolled"}}}],
+    [{"$match": {"$and": {"days": "TR"}}}],
+    [{"$match": {"$or": "x"}}],
+    [{"$match": {"$or": []}}],
+    [{"$match": {"code": {"$regex": 5}}}],
+    [{"$match": {"code": {"$regex": "a", "$options": "q"}}}],
+    [{"$match": {"days": {"$in": "TR"}}}],
+    [{"$match": {"enrolled": {"$gte": None}}}],
+    [{"$match": {"enrolled": {"$size": 2}}}],
+    [{"$match": {"$expr": {"$gt": ["$enrolled", 1]}}}],
+    [{"$skip": 1}, {"$match": {"days": {"$in": "TR"}}}],
+    [{"$project": {"code": 1, "x": "$$ROOT"}}],
+    [{"$project": {"code": 1, "x": ["$days"]}}],
+    [{"$project": {"code": 1, "enrolled": 0}}],
+    [{"$project": {"instructor": {"last_name": 1}}}],
+    [{"$project": {}}],
+    [{"$limit": 0}],
+    [{"$limit": "3"}],
+    [{"$skip": -1}],
+    [{"$sort": {}}],
+    [{"$sort": {"code": True}}],
+    [{"$count": "$n"}],
+    [{"$unwind": {}}],
+    [{"$unwind": "days"}],
+    [{"$unwind": {"path": "$days", "includeArrayIndex": "i"}}],
+    [{"$lookup": {"from": "rooms", "localField": 5, "foreignField": "_id", "as": "r"}}],
+    [
+        {
+            "$lookup": {
+                "from": "rooms",
+                "localField": "room_id",
+                "foreignField": "x.y",
+                "as": "r",
+            }
+        }
+    ],
+    [{"$lookup": {"from": "rooms", "pipeline": [], "as": "r"}}],
+    [{"$addFields": {"x": 1}}],
+    ["$match"],
+]
+
+
+def normalized(docs: list[dict], ordered: bool) -> list[str]:
+    texts = [json.dumps(doc, sort_keys=True) for doc in docs]
+    return texts if ordered else sorted(texts)
+
+
+@pytest.mark.parametrize("collection,pipeline", PARITY)
+def test_matches_mongodb(db, collection, pipeline):
+    expected = list(db[collection].aggregate(pipeline))
+    found = Snapshot(db).run(collection, pipeline)
+    ordered = any("$sort" in stage for stage in pipeline)
+    assert normalized(found, ordered) == normalized(expected, ordered)
+
+
+@pytest.mark.parametrize("pipeline", REFUSED)
+def test_refuses(db, pipeline):
+    with pytest.raises(Unsupported):
+        Snapshot(db).run("sections", pipeline)
+
+
+def test_unloaded_collection(db):
+    with pytest.raises(Unsupported):
+        Snapshot(db).run("archive_sections", [])
+
+
+def test_row_budget(db):
+    lookup = {
+        "$lookup": {
+            "from": "sections",
+            "localField": "term_id",
+            "foreignField": "term_id",
+            "as": "all",
+        }
+    }
+    snapshot = Snapshot(db)
+    assert len(snapshot.run("sections", [lookup], max_rows=100)) == 7
+    with pytest.raises(Unsupported):
+        snapshot.run("sections", [lookup], max_rows=20)
+    with pytest.raises(Unsupported):
+        snapshot.run("sections", [lookup, {"$unwind": "$all"}], max_rows=48)
+
+
+class Served:
+    """The parts of `DB` the columnar store reads"""
+
+    def __init__(self, db) -> None:
+        self.db = db
+        self.generation = 1
+        self.refreshed_at = 0.0
+
+    def stamp(self) -> tuple:
+        return (self.db.name, self.generation, self.refreshed_at)
+
+
+def test_enrollment_refresh_patches_the_snapshot(db, monkeypatch):
+    monkeypatch.setattr(columnar, "STAMP_TTL", 0.0)
+    served = Served(db)
+    store = ColumnarStore(served)
+    before = store.get()
+    pipeline = [{"$match": {"_id": "2242-CSC-349-02"}}, {"$project": {"enrolled": 1}}]
+    assert before.run("sections", pipeline) == [
+        {"_id": "2242-CSC-349-02", "enrolled": None}
+    ]
+
+    db.sections.update_one({"_id": "2242-CSC-349-02"}, {"$set": {"enrolled": 7}})
+    served.refreshed_at = 1.0
+    after = store.get()
+    assert after.run("sections", pipeline) == [
+        {"_id": "2242-CSC-349-02", "enrolled": 7}
+    ]
+    assert after.run("sections", [{"$match": {"enrolled": 7}}, {"$count": "n"}]) == [
+        {"n": 1}
+    ]
+    # Only the enrollment tables were re-read
+    assert after.tables["courses"] is before.tables["courses"]
+    assert before.run("sections", pipeline) == [
+        {"_id": "2242-CSC-349-02", "enrolled": None}
+    ]
+
+    db.courses.delete_many({})
+    served.generation = 2
+    assert store.get().run("courses", []) == []
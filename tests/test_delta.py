@@ -0,0 +1,92 @@
+"""Incremental scrapes write only what changed, and keep what vanished"""
+
+import pytest
+
+from database.contexts.delta import (
+    GENERATIONS,
+    HASHES,
+    TOMBSTONES,
+    DeltaWriter,
+)
+
+from tests.conftest import TERM, sample_documents
+
+COLLECTIONS = ["terms", "courses", "sections"]
+
+
+@pytest.fixture
+def target(client):
+    return client["cpsync_delta"]
+
+
+def scrape(target, docs: dict[str, list[dict]], tombstone: bool = True) -> dict:
+    """Stage documents as a scrape would, and commit them"""
+    delta = DeltaWriter(target, COLLECTIONS)
+    for collection in COLLECTIONS:
+        for doc in docs[collection]:
+            delta.stage(collection, dict(doc))
+    return delta.commit(tombstone)
+
+
+def test_first_scrape_writes_everything(target):
+    docs = sample_documents()
+    stats = scrape(target, docs)
+    assert stats["sections"] == {"unchanged": 0, "upserted": 7, "removed": 0}
+    assert target.sections.count_documents({}) == 7
+    assert target[HASHES].count_documents({"collection": "sections"}) == 7
+    [generation] = target[GENERATIONS].find()
+    assert (generation["_id"], generation["terms"]) == (1, [TERM])
+
+
+def test_unchanged_documents_are_skipped(target):
+    docs = sample_documents()
+    scrape(target, docs)
+    docs["sections"][0]["enrolled"] = 34
+    stats = scrape(target, docs)
+    assert stats["sections"] == {"unchanged": 6, "upserted": 1, "removed": 0}
+    assert stats["courses"] == {"unchanged": 3, "upserted": 0, "removed": 0}
+    assert (
+        target.sections.find_one({"_id": docs["sections"][0]["_id"]})["enrolled"] == 34
+    )
+    latest = target[GENERATIONS].find_one({"_id": 2})
+    assert latest["changed_terms"] == [TERM]
+
+
+def test_vanished_documents_are_tombstoned(target):
+    docs = sample_documents()
+    scrape(target, docs)
+    gone = docs["sections"].pop()
+    stats = scrape(target, docs)
+    assert stats["sections"]["removed"] == 1
+    assert target.sections.find_one({"_id": gone["_id"]}) is None
+    assert target[HASHES].find_one({"doc_id": gone["_id"]}) is None
+    grave = target[TOMBSTONES].find_one({"doc_id": gone["_id"]})
+    assert (grave["generation"], grave["doc"]) == (2, gone)
+
+
+def test_partial_scrape_keeps_unseen_documents(target):
+    docs = sample_documents()
+    scrape(target, docs)
+    docs["sections"].pop()
+    stats = scrape(target, docs, tombstone=False)
+    assert stats["sections"]["removed"] == 0
+    assert target.sections.count_documents({}) == 7
+    assert target[TOMBSTONES].count_documents({}) == 0
+
+
+def test_merged_sets_hash_the_same_in_any_order(target):
+    term = sample_documents()["terms"][0]
+    instructor = {"_id": "2242-jdoe", "term_id": TERM}
+    for order in (["2242-MATH", "2242-CSC"], ["2242-CSC", "2242-MATH"]):
+        delta = DeltaWriter(target, ["terms", "instructors"])
+        delta.stage("terms", term)
+        for subject in order:
+            delta.merge(
+                "instructors",
+                {**instructor, "subjects": [subject]},
+                add_to_set=("subjects",),
+            )
+        stats = delta.commit()
+    assert stats["instructors"] == {"unchanged": 1, "upserted": 0, "removed": 0}
+    doc = target.instructors.find_one()
+    assert doc["subjects"] == ["2242-CSC", "2242-MATH"]
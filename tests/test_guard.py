@@ -0,0 +1,98 @@
+"""Only read-only, affordable pipelines on known collections are admitted"""
+
+import pytest
+
+from database.contexts.guard import PipelineGuard, PipelineRejected, leading_match
+
+LOOKUP_ROOMS = {
+    "$lookup": {
+        "from": "rooms",
+        "localField": "room_id",
+        "foreignField": "_id",
+        "as": "room",
+    }
+}
+
+# Pipelines rejected before they reach the database, as (collection, pipeline, reason)
+REJECTED = [
+    ("users", [], "Unknown collection 'users'"),
+    ("sections", {"$match": {}}, "JSON array of stage documents"),
+    ("sections", ["$match"], "JSON array of stage documents"),
+    ("sections", [{"$match": {}, "$limit": 1}], "exactly one key"),
+    ("sections", [{"$out": "sections"}], "$out stage is not allowed"),
+    ("sections", [{"$merge": {"into": "courses"}}], "$merge stage is not allowed"),
+    (
+        "sections",
+        [{"$facet": {"a": [{"$match": {}}], "b": [{"$out": "x"}]}}],
+        "$out stage is not allowed",
+    ),
+    (
+        "sections",
+        [{"$lookup": {"from": "rooms", "pipeline": [{"$merge": "x"}], "as": "r"}}],
+        "$merge stage is not allowed",
+    ),
+    (
+        "sections",
+        [{"$lookup": {**LOOKUP_ROOMS["$lookup"], "from": "system.users"}}],
+        "Unknown collection 'system.users' in $lookup",
+    ),
+    ("sections", [{"$unionWith": "secrets"}], "Unknown collection 'secrets'"),
+    ("sections", [{"$limit": "10"}], "$limit stage takes an integer"),
+    ("sections", [{"$limit": True}], "$limit stage takes an integer"),
+    ("sections", [{"$match": []}], "$match stage takes a document"),
+    ("sections", [{"$match": {"$where": "this.enrolled > 1"}}], "$where may not"),
+    (
+        "sections",
+        [{"$group": {"_id": 1, "x": {"$accumulator": {}}}}],
+        "$accumulator may not",
+    ),
+]
+
+
+@pytest.mark.parametrize("collection,pipeline,reason", REJECTED)
+def test_rejects(collection, pipeline, reason):
+    with pytest.raises(PipelineRejected, match=reason.replace("$", r"\$")):
+        PipelineGuard().check(collection, pipeline)
+
+
+def test_admits_read_only_pipelines():
+    pipeline = [
+        {"$match": {"term_id": "2242"}},
+        LOOKUP_ROOMS,
+        {"$facet": {"rooms": [{"$unwind": "$room"}], "n": [{"$count": "n"}]}},
+    ]
+    PipelineGuard().check("sections", pipeline)
+
+
+def test_leading_match():
+    assert leading_match([{"$limit": 1}, {"$match": {"a": 1}}]) == {}
+    assert leading_match([{"$match": {"a": 1}}, {"$limit": 1}]) == {"a": 1}
+    assert leading_match([{"$match": {"a": 1}}, {"$match": {"b": 2}}]) == {
+        "$and": [{"a": 1}, {"b": 2}]
+    }
+
+
+def test_indexed_lookup_costs_a_probe_per_row(db):
+    db.rooms.create_index("number")
+    guard = PipelineGuard()
+    assert guard.stages_cost(db, "sections", [LOOKUP_ROOMS], 7) == 7
+    by_number = {"$lookup": {**LOOKUP_ROOMS["$lookup"], "foreignField": "number"}}
+    assert guard.stages_cost(db, "sections", [{"$limit": 2}, by_number], 7) == 2
+
+
+def test_unindexed_lookup_over_budget_is_rejected(db):
+    scan = {"$lookup": {**LOOKUP_ROOMS["$lookup"], "foreignField": "building_id"}}
+    # Every section scans the 4 rooms
+    assert PipelineGuard().stages_cost(db, "sections", [scan], 7) == 28
+    with pytest.raises(PipelineRejected, match="building_id is not indexed"):
+        PipelineGuard(max_cost=20).stages_cost(db, "sections", [scan], 7)
+    limited = [{"$limit": 5}, scan]
+    assert PipelineGuard(max_cost=20).stages_cost(db, "sections", limited, 7) == 20
+
+
+def test_nested_pipelines_are_costed(db):
+    union = {"$unionWith": {"coll": "courses", "pipeline": [LOOKUP_ROOMS]}}
+    # The 3 courses are read, and each probes the rooms' _id index
+    assert PipelineGuard().stages_cost(db, "sections", [union], 7) == 6
+    facet = {"$facet": {"a": [LOOKUP_ROOMS], "b": [LOOKUP_ROOMS]}}
+    assert PipelineGuard().stages_cost(db, "sections", [facet], 7) == 14
@@ -0,0 +1,47 @@
+"""Names are found despite partial words, typos and missing dashes"""
+
+import pytest
+
+from database.contexts.names import NameIndex, trigrams, words
+
+from tests.conftest import TERM
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        ("foaad", "2242-khosmood"),
+        ("Khosmod", "2242-khosmood"),
+        ("eck", "2242-aeckhard"),
+        ("Jane Smith", "2242-jsmith"),
+        ("CSC357", "2242-CSC-357"),
+        ("csc 357", "2242-CSC-357"),
+        ("CSC-357", "2242-CSC-357"),
+        ("systems programing", "2242-CSC-357"),
+        ("computer science", "2242-CSC"),
+        ("pilling", "2242-014"),
+        ("baker center", "2242-180"),
+    ],
+)
+def test_best_match(db, query, expected):
+    matches = NameIndex(db, TERM).search(query)
+    assert matches[0]["_id"] == expected
+
+
+def test_kinds_and_limit(db):
+    index = NameIndex(db, TERM)
+    assert [m["kind"] for m in index.search("csc", kinds=["subject"])] == ["subject"]
+    assert len(index.search("csc", limit=2)) == 2
+    assert index.search("csc", kinds=["building"]) == []
+
+
+def test_no_match(db):
+    index = NameIndex(db, TERM)
+    assert index.search("zzzz") == []
+    assert index.search("  --  ") == []
+    assert NameIndex(db, "2238").search("foaad") == []
+
+
+def test_tokens():
+    assert words("CSC-357 Systems") == ["csc", "357", "systems"]
+    assert trigrams("ab") == {"  a", " ab", "ab "}
@@ -0,0 +1,80 @@
+"""Free rooms and utilization come from the rooms' weekly occupancy"""
+
+import pytest
+
+from database.contexts.occupancy import OccupancyMatrix
+from database.contexts.partitions import ARCHIVED_TERMS, archived
+
+from tests.conftest import TERM
+
+
+def room_ids(rooms: list[dict]) -> list[str]:
+    return [room["room_id"] for room in rooms]
+
+
+def test_free_rooms_largest_first(db):
+    occupancy = OccupancyMatrix(db, TERM)
+    # CSC-357-01 and CSC-349-01 meet MWF 09:10-10:00 AM
+    free = occupancy.free_rooms("MWF", "09:00 AM", "10:00 AM")
+    assert room_ids(free) == ["2242-014-0256", "2242-180-0102"]
+    assert free[1]["registered_location_capacity"] is None
+    # Free on Monday morning is not enough if the room is busy Tuesday
+    assert room_ids(occupancy.free_rooms("MT", "10:00 AM", "11:00 AM")) == [
+        "2242-180-0101",
+        "2242-014-0255",
+        "2242-014-0256",
+    ]
+
+
+def test_window_edges(db):
+    occupancy = OccupancyMatrix(db, TERM)
+    # CSC-349-01 ends at 10:00 AM, and MATH-248-01 starts at 10:10 AM
+    assert "2242-180-0101" in room_ids(
+        occupancy.free_rooms("M", "10:00 AM", "10:10 AM")
+    )
+    assert "2242-180-0101" not in room_ids(
+        occupancy.free_rooms("M", "09:55 AM", "10:10 AM")
+    )
+
+
+def test_free_rooms_filters(db):
+    occupancy = OccupancyMatrix(db, TERM)
+    window = ("T", "12:00 PM", "01:00 PM")
+    assert room_ids(occupancy.free_rooms(*window, building="180")) == [
+        "2242-180-0101",
+        "2242-180-0102",
+    ]
+    assert room_ids(occupancy.free_rooms(*window, min_capacity=41)) == ["2242-180-0101"]
+
+
+@pytest.mark.parametrize(
+    "days,start,end",
+    [
+        ("", "09:00 AM", "10:00 AM"),
+        ("MX", "09:00 AM", "10:00 AM"),
+        ("M", "9am", "10:00 AM"),
+        ("M", "10:00 AM", "09:00 AM"),
+    ],
+)
+def test_rejects_invalid_windows(db, days, start, end):
+    with pytest.raises(ValueError):
+        OccupancyMatrix(db, TERM).free_rooms(days, start, end)
+
+
+def test_utilization(db):
+    occupancy = OccupancyMatrix(db, TERM)
+    # Both 180 rooms, but only one 014 room, are busy 50 of these 120 minutes
+    usage = occupancy.utilization("M", "09:00 AM", "11:00 AM")
+    assert set(usage) == {"2242-014", "2242-180"}
+    assert 0 < usage["2242-014"] < usage["2242-180"] < 0.5
+    assert occupancy.utilization("SU") == {"2242-014": 0.0, "2242-180": 0.0}
+    assert set(occupancy.utilization(building="014")) == {"2242-014"}
+
+
+def test_archived_terms(db):
+    for collection in ("rooms", "sections"):
+        db[archived(collection)].insert_many(db[collection].find())
+        db[collection].delete_many({})
+    db[ARCHIVED_TERMS].insert_one({"_id": TERM})
+    free = OccupancyMatrix(db, TERM).free_rooms("MWF", "09:00 AM", "10:00 AM")
+    assert room_ids(free) == ["2242-014-0256", "2242-180-0102"]
@@ -0,0 +1,69 @@
+"""Results are compact, drop bulky fields, and are summarized past a budget"""
+
+import json
+
+from database.contexts import results
+from database.contexts.results import serialize
+
+
+def rows(n: int) -> list[dict]:
+    return [
+        {
+            "_id": f"2242-CSC-{i:03}",
+            "enrolled": i,
+            "days": "MWF" if i % 2 else "TR",
+            "url": f"https://schedules.calpoly.edu/{i}",
+        }
+        for i in range(n)
+    ]
+
+
+def test_small_results_are_returned_whole():
+    text = serialize(rows(3), [])
+    assert " " not in text
+    assert json.loads(text) == [
+        {k: v for k, v in doc.items() if k != "url"} for doc in rows(3)
+    ]
+
+
+def test_bulky_fields_are_kept_when_named():
+    assert "url" in json.loads(serialize(rows(1), [{"$project": {"url": 1}}]))[0]
+    projected = [{"$project": {"link": "$url"}}]
+    assert "url" in json.loads(serialize(rows(1), projected))[0]
+
+
+def test_truncated_by_rows():
+    result = json.loads(serialize(rows(120), [], max_rows=10))
+    assert result["truncated"] is True
+    assert (result["total"], result["returned"]) == (120, 10)
+    assert [doc["enrolled"] for doc in result["documents"]] == list(range(10))
+    assert result["omitted_fields"] == ["url"]
+    stats = result["field_stats"]
+    assert stats["enrolled"] == {
+        "present": 120,
+        "distinct": "20+",
+        "min": 0,
+        "max": 119,
+    }
+    assert stats["days"] == {"present": 120, "distinct": 2, "values": ["MWF", "TR"]}
+
+
+def test_truncated_by_size():
+    text = serialize(rows(50), [], max_rows=1000, max_bytes=200)
+    result = json.loads(text)
+    assert result["returned"] < 50
+    assert len(json.dumps(result["documents"], separators=(",", ":"))) <= 200
+
+
+def test_summary_stops_reading_at_the_scan_limit(monkeypatch):
+    monkeypatch.setattr(results, "SCAN_LIMIT", 30)
+    read = []
+
+    def cursor():
+        for doc in rows(100):
+            read.append(doc)
+            yield doc
+
+    result = json.loads(serialize(cursor(), [], max_rows=5))
+    assert result["total"] == "30+"
+    assert len(read) == 30
@@ -0,0 +1,46 @@
+"""Crawl work is run once, and failures are recorded for the caller"""
+
+import threading
+
+import pytest
+
+from scraper.scheduler import CrawlScheduler
+
+
+@pytest.mark.parametrize("workers", [0, 4])
+def test_records_failures(workers):
+    scheduler = CrawlScheduler(workers=workers, rate=0)
+
+    def fail(n):
+        raise ValueError(n)
+
+    scheduler.submit(fail, 1)
+    scheduler.submit(len, "ok")
+    failures = scheduler.join()
+    scheduler.close()
+    assert [type(e) for _, e in failures] == [ValueError]
+
+
+@pytest.mark.parametrize("workers", [0, 4])
+def test_claims_work_once_per_crawl(workers):
+    scheduler = CrawlScheduler(workers=workers, rate=0)
+    fetched = []
+    lock = threading.Lock()
+
+    def page(course_ids):
+        for course_id in course_ids:
+            if scheduler.claim(course_id):
+                scheduler.submit(sections, course_id)
+
+    def sections(course_id):
+        with lock:
+            fetched.append(course_id)
+
+    # CSC-357 is listed by both subjects, as cross-listed courses are
+    scheduler.submit(page, ["CSC-357", "CSC-101"])
+    scheduler.submit(page, ["CSC-357", "CPE-357"])
+    scheduler.join()
+    assert sorted(fetched) == ["CPE-357", "CSC-101", "CSC-357"]
+    # A later crawl (ex. a refresh) fetches them again
+    assert scheduler.claim("CSC-357")
+    scheduler.close()
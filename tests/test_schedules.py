@@ -0,0 +1,95 @@
+"""Schedules are conflict-free, ranked, and built only from valid constraints"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from database.contexts.functions import Functions
+from database.contexts.schedules import ScheduleBuilder
+
+from tests.conftest import TERM
+
+
+@pytest.mark.parametrize(
+    "constraints",
+    [
+        {"earliest_start": "9am"},
+        {"latest_end": "17:00"},
+        {"latest_end": "25:00 PM"},
+        {"days_off": "X"},
+        {"days_off": "Fri"},
+    ],
+)
+def test_rejects_invalid_constraints(db, constraints):
+    with pytest.raises(ValueError):
+        ScheduleBuilder(db).build(TERM, ["CSC-357"], **constraints)
+
+
+def test_reports_invalid_constraints_to_the_assistant(db):
+    # Only the served database of the functions is used
+    functions = SimpleNamespace(db=db)
+    text = Functions.build_schedule(functions, TERM, ["CSC-357"], latest_end="5pm")
+    assert text.startswith("Error: '5pm' is not a time")
+
+
+def aliases(schedule: dict) -> list[str]:
+    return [section["alias"] for section in schedule["sections"]]
+
+
+def test_ranks_by_days_then_gaps(db):
+    result = ScheduleBuilder(db).build(TERM, ["CSC-349", "math 248"])
+    assert result["problems"] == {}
+    schedules = result["schedules"]
+    assert [s["days"] for s in schedules] == ["MWF", "MWF", "MTWRF", "MTWRF"]
+    assert aliases(schedules[0]) == ["CSC-349-02", "MATH-248-02"]
+    assert schedules[0]["gap_minutes"] < schedules[1]["gap_minutes"]
+    assert len(ScheduleBuilder(db).build(TERM, ["CSC-349"], limit=1)["schedules"]) == 1
+
+
+def test_pairs_labs_with_their_lecture(db):
+    [schedule] = ScheduleBuilder(db).build(TERM, ["CSC-357"])["schedules"]
+    assert aliases(schedule) == ["CSC-357-02", "CSC-357-03"]
+    assert [m["days"] for s in schedule["sections"] for m in s["meetings"]] == [
+        "TR",
+        "TR",
+    ]
+
+
+def test_constraints_filter_sections(db):
+    build = ScheduleBuilder(db).build
+    early = build(TERM, ["CSC-349"], latest_end="11:00 AM")["schedules"]
+    assert [aliases(s) for s in early] == [["CSC-349-01"]]
+    late = build(TERM, ["CSC-349"], earliest_start="10:00 AM")["schedules"]
+    assert [aliases(s) for s in late] == [["CSC-349-02"]]
+    # MATH-248-02 is full
+    open_seats = build(TERM, ["MATH-248"], open_only=True)["schedules"]
+    assert [aliases(s) for s in open_seats] == [["MATH-248-01"]]
+    assert build(TERM, ["CSC-349"], days_off="w")["problems"] == {
+        "CSC-349": "no sections fit the constraints"
+    }
+
+
+def test_reports_conflicts_and_missing_courses(db):
+    db.sections.insert_one(
+        {
+            **db.sections.find_one({"_id": "2242-CSC-349-01"}),
+            "_id": "2242-CSC-101-01",
+            "course_id": "2242-CSC-101",
+            "code": "CSC-101-01",
+            "alias": "CSC-101-01",
+        }
+    )
+    build = ScheduleBuilder(db).build
+    result = build(TERM, ["CSC-101", "CSC-349"], latest_end="11:00 AM")
+    assert result == {
+        "schedules": [],
+        "problems": {"*": "every combination of sections has a conflict"},
+    }
+    assert build(TERM, ["CSC-999"])["problems"] == {
+        "CSC-999": "no sections are offered this term"
+    }
+
+
+def test_search_budget(db):
+    result = ScheduleBuilder(db, max_visited=1).build(TERM, ["CSC-349", "MATH-248"])
+    assert result["problems"]["*"].startswith("too many combinations")
@@ -0,0 +1,86 @@
+"""Snapshots round-trip into a new version, or leave no partial version behind"""
+
+import gzip
+import json
+import os
+import zipfile
+
+import bson
+import pytest
+
+from database.contexts.snapshots import (
+    MANIFEST,
+    SnapshotError,
+    export_snapshot,
+    import_snapshot,
+    summarize,
+    verify,
+)
+
+from tests.conftest import sample_documents
+
+
+def dump_directory(path, docs: dict[str, list[dict]]) -> str:
+    """Write documents like a `mongodump` directory"""
+    for collection, collection_docs in docs.items():
+        with open(os.path.join(path, f"{collection}.bson"), "wb") as file:
+            file.write(b"".join(bson.encode(doc) for doc in collection_docs))
+    return str(path)
+
+
+def test_failed_insert_drops_the_staged_version(versions, tmp_path):
+    docs = sample_documents()
+    docs["sections"].append(docs["sections"][0])
+    before = versions.versions()
+    with pytest.raises(SnapshotError, match="sections of term\\(s\\) 2242"):
+        import_snapshot(versions, dump_directory(tmp_path, docs))
+    assert versions.versions() == before
+    assert versions.db.name == versions.serving()["name"]
+
+
+def contents(db) -> dict[str, list[dict]]:
+    return {
+        collection: sorted(db[collection].find(), key=lambda doc: doc["_id"])
+        for collection in ("terms", "rooms", "instructors", "courses", "sections")
+    }
+
+
+def test_round_trip(versions, tmp_path):
+    served = versions.db
+    path = export_snapshot(versions, str(tmp_path / "snapshot.zip"))
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read(MANIFEST))
+    assert manifest["database"] == served.name
+    assert manifest["collections"]["sections"]["terms"]["2242"]["count"] == 7
+
+    assert import_snapshot(versions, path) == []
+    # The import is staged beside the served version until it is promoted
+    assert versions.db.name != served.name
+    assert versions.serving()["name"] == served.name
+    assert contents(versions.db) == contents(served)
+
+
+def test_damaged_snapshot_is_refused(versions, tmp_path):
+    path = export_snapshot(versions, str(tmp_path / "snapshot.zip"))
+    damaged = str(tmp_path / "damaged.zip")
+    with zipfile.ZipFile(path) as source, zipfile.ZipFile(damaged, "w") as target:
+        for name in source.namelist():
+            data = source.read(name)
+            if name == "sections.bson.gz":
+                data = gzip.compress(gzip.decompress(data)[:-1])
+            target.writestr(name, data)
+    before = versions.versions()
+    with pytest.raises(SnapshotError, match="sections does not match its checksum"):
+        import_snapshot(versions, damaged)
+    assert versions.versions() == before
+
+
+def test_verify_reports_missing_and_changed_documents(db):
+    expected = {c: summarize(c, list(db[c].find())) for c in ("courses", "sections")}
+    assert verify(db, expected) == []
+    db.courses.update_one({"_id": "2242-CSC-357"}, {"$set": {"name": "Systems"}})
+    db.sections.delete_one({"_id": "2242-CSC-357-01"})
+    assert verify(db, expected) == [
+        "courses of 2242: content hash mismatch",
+        "sections of 2242: 6 documents imported, 7 expected",
+    ]
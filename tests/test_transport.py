@@ -0,0 +1,110 @@
+"""Transient failures are retried within a global budget, honoring Retry-After"""
+
+import io
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from scraper import transport as transport_module
+from scraper.transport import RetryBudget, Transport, parse_retry_after
+
+URL = "https://schedules.calpoly.edu/index_curr.htm"
+
+
+class FakeSession:
+    """Answers requests with queued statuses (or exceptions) instead of the network"""
+
+    def __init__(self, answers: list) -> None:
+        self.answers = list(answers)
+        self.requests = 0
+
+    def get(self, url, headers=None, timeout=None) -> requests.Response:
+        self.requests += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        status, headers = answer if isinstance(answer, tuple) else (answer, {})
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response.url = url
+        response.raw = io.BytesIO(b"")
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    """The delays the transport waited, instead of waiting them"""
+    delays: list[float] = []
+    monkeypatch.setattr(transport_module.time, "sleep", delays.append)
+    return delays
+
+
+def answered(answers: list, **kwargs) -> Transport:
+    transport = Transport(**kwargs)
+    transport.session = FakeSession(answers)
+    return transport
+
+
+def test_budget_scales_with_requests():
+    budget = RetryBudget(ratio=0.5, minimum=1)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    for _ in range(4):
+        budget.record_request()
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+
+
+def test_retries_transient_statuses(sleeps):
+    transport = answered([503, requests.ConnectionError("reset"), 200])
+    assert transport.get(URL).status_code == 200
+    assert transport.session.requests == 3
+    assert len(sleeps) == 2
+    assert all(0 <= delay <= transport.max_backoff for delay in sleeps)
+
+
+def test_does_not_retry_client_errors(sleeps):
+    transport = answered([404])
+    assert transport.get(URL).status_code == 404
+    assert sleeps == []
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    transport = answered([500, 500, 500], max_attempts=3)
+    assert transport.get(URL).status_code == 500
+    assert transport.session.requests == 3
+
+    transport = answered([requests.Timeout("slow")] * 2, max_attempts=2)
+    with pytest.raises(requests.Timeout):
+        transport.get(URL)
+
+
+def test_stops_retrying_when_the_budget_is_spent(sleeps):
+    transport = answered([503, 503, 200], budget=RetryBudget(ratio=0, minimum=1))
+    assert transport.get(URL).status_code == 503
+    assert transport.session.requests == 2
+    assert transport.budget.retries == 1
+
+
+def test_waits_as_long_as_retry_after_says(sleeps):
+    transport = answered([(429, {"Retry-After": "7"}), 200])
+    assert transport.get(URL).status_code == 200
+    assert sleeps == [7.0]
+
+    transport = answered([(503, {"Retry-After": "3600"}), 200], max_backoff=30)
+    transport.get(URL)
+    assert sleeps[-1] == 30
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(" 120 ") == 120.0
+    assert parse_retry_after("soon") is None
+    later = parse_retry_after(formatdate(time.time() + 60, usegmt=True))
+    assert later is not None and 55 <= later <= 60
+    assert parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.0
@@ -0,0 +1,42 @@
+"""Buffered writes are flushed by size, by age and on close"""
+
+import time
+
+from pymongo import InsertOne
+
+from database.contexts.database import WriteBuffer
+
+
+def test_flushes_full_batches(client):
+    db = client["cpsync_buffer"]
+    buffer = WriteBuffer(db, batch_size=2, flush_interval=0)
+    buffer.add("rooms", InsertOne({"_id": 1}))
+    assert db.rooms.count_documents({}) == 0
+    buffer.add("rooms", InsertOne({"_id": 2}))
+    assert db.rooms.count_documents({}) == 2
+    assert buffer.flusher is None
+
+
+def test_flushes_aged_queues_without_further_writes(client):
+    db = client["cpsync_buffer"]
+    buffer = WriteBuffer(db, batch_size=100, flush_interval=0.05)
+    buffer.add("rooms", InsertOne({"_id": 1}))
+    deadline = time.time() + 2
+    while db.rooms.count_documents({}) == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert db.rooms.count_documents({}) == 1
+    buffer.close()
+    assert not buffer.flusher.is_alive()
+
+
+def test_close_flushes_and_reports_failed_writes(client):
+    db = client["cpsync_buffer"]
+    db.rooms.insert_one({"_id": 1})
+    buffer = WriteBuffer(db, batch_size=100, flush_interval=60)
+    buffer.add("rooms", InsertOne({"_id": 1}))
+    buffer.add("rooms", InsertOne({"_id": 2}))
+    buffer.close()
+    assert db.rooms.count_documents({}) == 2
+    [batch] = buffer.errors
+    assert (batch["collection"], batch["written"]) == ("rooms", 1)
+    assert [failed["code"] for failed in batch["failed"]] == [11000]